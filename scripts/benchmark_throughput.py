@@ -0,0 +1,52 @@
+"""Throughput benchmark for a running instance of the API
+
+Sends a fixed number of GET requests with a fixed concurrency to an endpoint and prints
+the achieved requests / second and latency percentiles.
+
+usage: uv run python scripts/benchmark_throughput.py [url] [requests] [concurrency]
+"""
+
+import asyncio
+import sys
+import time
+
+import httpx
+
+
+async def worker(client: httpx.AsyncClient, url: str, count: int, latencies: list[float]) -> None:
+    """Send count sequential requests and record each latency"""
+    for _ in range(count):
+        start = time.perf_counter()
+        resp = await client.get(url)
+        resp.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+
+async def main(url: str, requests: int, concurrency: int) -> None:
+    """Run the benchmark and print the results"""
+    latencies: list[float] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits) as client:
+        await client.get(url)  # open the first connection outside of the measurement
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(client, url, requests // concurrency, latencies) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{len(latencies)} requests in {elapsed:.2f}s -> {len(latencies) / elapsed:.0f} req/s")
+    print(
+        f"p50 {latencies[len(latencies) // 2] * 1000:.1f}ms "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000/version",
+            int(sys.argv[2]) if len(sys.argv) > 2 else 10000,
+            int(sys.argv[3]) if len(sys.argv) > 3 else 50,
+        )
+    )
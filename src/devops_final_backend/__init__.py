@@ -5,18 +5,69 @@ It is a stateless FastAPI app that generates devops related configuration
 files using configured LLM integrations
 """
 
+from importlib import import_module
+from importlib.util import find_spec
+from typing import Any
+
 from uvicorn import run
 
-from devops_final_backend.api import app  # noqa: F401
+from devops_final_backend.services.telemetry import logger
 from devops_final_backend.settings import settings  # noqa: F401
 
 
+def __getattr__(name: str) -> Any:
+    """Import the FastAPI app on first access (by uvicorn), so that the processes only importing a module of the
+    package (like the YAML offload pool workers, see yaml_worker) do not build the app
+
+    Args:
+        name (str): the attribute name
+
+    Raises:
+        AttributeError: the attribute is not the app
+
+    Returns:
+        Any: the FastAPI app
+    """
+
+    if name == "app":
+        return import_module("devops_final_backend.api").app
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def main() -> None:
     """
     Start the FastAPI app as uvicorn application in either debug or production environtment
     Used by the UV project-script `devops_final_backend`
+
+    In debug mode a single auto-reloading process is started. In production mode the app is served by
+    `app_workers` processes (default the CPUs available to the container, see Settings.server_workers), each running
+    uvloop / httptools if they are installed, with the keep-alive, backlog and worker recycling limits taken from
+    settings. A single worker is never recycled: uvicorn only replaces the workers of several processes, the single
+    process would exit and stop the server
     """
-    run("devops_final_backend:app", host="0.0.0.0", port=settings.app_port, reload=settings.debug)
+
+    if settings.debug:
+        run("devops_final_backend:app", host="0.0.0.0", port=settings.app_port, reload=True)
+        return
+
+    workers = settings.server_workers()
+    limit_max_requests = settings.app_limit_max_requests
+    if limit_max_requests and workers == 1:
+        logger.warning("APP_LIMIT_MAX_REQUESTS ignored, a single worker is not recycled")
+        limit_max_requests = None
+
+    run(
+        "devops_final_backend:app",
+        host="0.0.0.0",
+        port=settings.app_port,
+        workers=workers,
+        loop="uvloop" if find_spec("uvloop") else "asyncio",
+        http="httptools" if find_spec("httptools") else "h11",
+        timeout_keep_alive=settings.app_keep_alive,
+        backlog=settings.app_backlog,
+        limit_max_requests=limit_max_requests,
+    )
 
 
 if __name__ == "__main__":
@@ -15,9 +15,12 @@ page (otherwise will return a 404 Not Found error)
 The errors encoutered (or intentionally thrown) during the exection of the api call flow can be intercepted
 by declaring a handler lambda function in the error.py file (but for each endpoint, you must declare in the
 responses attribute the response codes you anticipate can be returned)
+
+Per-worker startup and shutdown logic is declared in the lifespan.py file and each request is logged
+(with its request id and the context added by the services) by the middleware of the request_log.py file
 """
 
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 
@@ -25,6 +28,8 @@ from devops_final_backend.services.auth import get_current_user
 from devops_final_backend.settings import settings
 
 from .errors import HANDLERS
+from .lifespan import lifespan
+from .request_log import RequestLogMiddleware
 from .v_next import router as router_v_next
 
 __all__ = ["app"]
@@ -35,6 +40,7 @@ app = FastAPI(
     docs_url="/docs" if settings.debug else None,
     redoc_url="/redoc" if settings.debug else None,
     openapi_url="/openapi.json" if settings.debug else None,
+    lifespan=lifespan,
 )
 
 
@@ -45,6 +51,7 @@ app.add_middleware(
     allow_headers=["*"],
     allow_credentials=True,
 )
+app.add_middleware(RequestLogMiddleware)
 
 
 for error_type, handler in HANDLERS.items():
@@ -82,5 +89,23 @@ async def get_version() -> str:
     return settings.app_version
 
 
+@app.get(
+    "/ready",
+    tags=["Version"],
+    responses={
+        status.HTTP_200_OK: {"description": "the worker is ready to serve generation requests"},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "the model warm-up has not completed yet"},
+    },
+)
+async def get_ready(request: Request) -> str:
+    """
+    Readiness endpoint for load balancers, it reports the worker as ready only after the LLM model warm-up completed
+    """
+    if not getattr(request.app.state, "ready", False):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Model warm-up in progress")
+
+    return "ready"
+
+
 if settings.debug or settings.app_version == "vNext":
     app.include_router(router_v_next, prefix="/vNext", tags=["vNext"], dependencies=[Depends(get_current_user)])
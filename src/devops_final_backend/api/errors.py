@@ -3,21 +3,37 @@
 These lamba functions transform known error types into http exception with dedicated error codes
 """
 
+from math import ceil
+
 from fastapi import status
 from fastapi.responses import JSONResponse
 
+from devops_final_backend.services.deadline import DeadlineExceeded
 from devops_final_backend.services.llm_generator import errors as llm_errors
 
 HANDLERS = {
     llm_errors.ModelFailedToRespond: lambda _, exc: JSONResponse(
         content={"detail": exc.message}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE
     ),
+    llm_errors.ModelUnavailable: lambda _, exc: JSONResponse(
+        content={"detail": exc.message},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(ceil(exc.retry_after))},
+    ),
+    # 499 (client closed request) is never read by the client, it marks the cancelled generation in the access log
+    llm_errors.GenerationCancelled: lambda _, exc: JSONResponse(content={"detail": exc.message}, status_code=499),
     llm_errors.InvalidModelParameters: lambda _, exc: JSONResponse(
         content={"detail": exc.message}, status_code=status.HTTP_422_UNPROCESSABLE_CONTENT
     ),
     llm_errors.InvalidModelResponse: lambda _, exc: JSONResponse(
         content={"detail": exc.message}, status_code=status.HTTP_424_FAILED_DEPENDENCY
     ),
+    llm_errors.TierTimedOut: lambda _, exc: JSONResponse(
+        content={"detail": exc.message}, status_code=status.HTTP_504_GATEWAY_TIMEOUT
+    ),
+    DeadlineExceeded: lambda _, exc: JSONResponse(
+        content={"detail": exc.message}, status_code=status.HTTP_504_GATEWAY_TIMEOUT
+    ),
     Exception: lambda _, exc: JSONResponse(
         content={"detail": str(exc)}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
     ),
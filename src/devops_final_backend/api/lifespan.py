@@ -0,0 +1,95 @@
+"""API Lifespan
+
+Startup and shutdown hooks of the FastAPI app, executed once per uvicorn worker process
+
+The worker reports itself as ready (see the `/ready` endpoint) only after the LLM model was warmed up,
+so that a load balancer never routes generation requests to an instance that still has to load the model
+"""
+
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+
+from anyio import to_thread
+from fastapi import FastAPI
+
+from devops_final_backend.services.image_catalog import image_catalog
+from devops_final_backend.services.llm_generator import ComposeGenerator, errors
+from devops_final_backend.services.llm_generator.cassette import cassette
+from devops_final_backend.services.llm_generator.offload import yaml_offload
+from devops_final_backend.services.pregeneration import pregenerator
+from devops_final_backend.services.telemetry import log_pipeline, logger
+from devops_final_backend.settings import settings
+
+__all__ = ["lifespan"]
+
+WARMUP_RETRY_INTERVAL = 5
+
+
+async def keep_model_warm(app: FastAPI) -> None:
+    """Warm up the model, retrying until it responds, then mark the app as ready.
+    If a keep-alive interval is configured, keep pinging the model so it stays resident
+
+    Args:
+        app (FastAPI): the application whose state receives the ready flag
+    """
+
+    while True:
+        try:
+            await ComposeGenerator.warmup()
+        except errors.ModelFailedToRespond:
+            if not app.state.ready:
+                await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+                continue
+
+        if not app.state.ready:
+            logger.info("model warm-up completed")
+
+        app.state.ready = True
+        if not settings.llm_keep_alive_interval:
+            return
+
+        await asyncio.sleep(settings.llm_keep_alive_interval)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Prepare the worker before it starts serving requests
+
+    - start the structured logging pipeline (its listener thread writes the records queued by the requests)
+    - resize the threadpool used by FastAPI to run sync dependencies (like the rate limit checks)
+    - load the image catalog index (building it if outdated) in a thread, before the first validation needs it
+    - read the cassette of the replay provider in a thread, before the first replay needs it
+    - warm up the LLM model in the background (skipped in dry run, with the replay provider or if disabled in settings)
+    - pre-generate the most requested compose stacks in the background (if enabled in settings)
+    - stop the YAML offload pool on shutdown (created by the first large document)
+
+    Args:
+        app (FastAPI): the application instance
+
+    Yields:
+        None: control back to the server for the lifetime of the worker
+    """
+
+    log_pipeline.start()
+    to_thread.current_default_thread_limiter().total_tokens = settings.app_threadpool_size
+    if settings.image_catalog:
+        await to_thread.run_sync(image_catalog.index)
+    if settings.llm_provider == "replay":
+        await to_thread.run_sync(cassette.load)
+
+    # the replay provider has no model to load
+    app.state.ready = settings.llm_dry_run or not settings.llm_warmup or settings.llm_provider == "replay"
+    warmup_task = None if app.state.ready else asyncio.create_task(keep_model_warm(app))
+    pregen_task = asyncio.create_task(pregenerator.run_forever()) if pregenerator.enabled() else None
+
+    yield
+
+    for task in (warmup_task, pregen_task):
+        if task:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    yaml_offload.shutdown()
+    log_pipeline.stop()
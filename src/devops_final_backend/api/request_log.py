@@ -0,0 +1,73 @@
+"""API Request Log
+
+ASGI middleware opening the log context of each request (see telemetry.logs) and logging the request once
+completed with its status, duration and the context completed by the services (user, generator, stage timings).
+
+The request id is taken from the X-Request-ID header (if it is a safe token) or generated, and returned in the
+X-Request-ID response header so that the client can quote it
+"""
+
+import logging
+import re
+import time
+import uuid
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from devops_final_backend.services.telemetry import end_request, logger, start_request
+
+__all__ = ["RequestLogMiddleware"]
+
+REQUEST_ID_REGEX = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestLogMiddleware:  # pylint: disable=too-few-public-methods
+    """Pure ASGI middleware (no extra task or response buffering on the request path)"""
+
+    def __init__(self, app: ASGIApp):
+        """Wrap the application
+
+        Args:
+            app (ASGIApp): the wrapped application
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Serve a request within its log context
+
+        Args:
+            scope (Scope): the connection scope
+            receive (Receive): the request messages channel
+            send (Send): the response messages channel
+        """
+
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        request_id = header if REQUEST_ID_REGEX.fullmatch(header) else uuid.uuid4().hex
+        token = start_request(request_id=request_id, method=scope["method"], path=scope["path"])
+        status_code, exc_info, start = 500, False, time.monotonic()
+
+        async def send_with_request_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except Exception:
+            exc_info = True
+            raise
+        finally:
+            level = logging.ERROR if status_code >= 500 else logging.WARNING if status_code >= 400 else logging.INFO
+            logger.log(
+                level,
+                "request completed",
+                exc_info=exc_info,
+                extra={"status": status_code, "seconds": round(time.monotonic() - start, 4)},
+            )
+            end_request(token)
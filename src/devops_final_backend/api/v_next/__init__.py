@@ -8,13 +8,26 @@ complex application then the router would have included sub-routers)
 Within this package there are the model definitions which are versioned as well
 """
 
-from fastapi import APIRouter, Body, status
+from typing import Any
 
-from devops_final_backend.services.llm_generator import ComposeGenerator
+from fastapi import APIRouter, Body, Depends, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+
+from devops_final_backend.services.auth import require_admin
+from devops_final_backend.services.deadline import Deadline, request_deadline
+from devops_final_backend.services.llm_generator import (
+    GenerationContext,
+    cancel_on_disconnect,
+    compose_generator,
+    pipeline,
+)
 from devops_final_backend.services.llm_generator import models as llm_models
-from devops_final_backend.settings import settings
+from devops_final_backend.services.llm_generator.usage import TokenUsage, usage_ledger
+from devops_final_backend.services.pregeneration import pregenerator
+from devops_final_backend.services.rate_limit import enforce_rate_limit, rate_limiter
+from devops_final_backend.services.telemetry import metrics
 
-from .models import ComposeGenerationParameters
+from .models import ComposeGenerationParameters, ComposeUpdateParameters, PipelineGenerationParameters
 
 __all__ = ["router"]
 
@@ -28,18 +41,193 @@ router = APIRouter()
         status.HTTP_401_UNAUTHORIZED: {"description": "Failed Bearer Token Authentification"},
         status.HTTP_422_UNPROCESSABLE_CONTENT: {"description": "Failed Parameters Validation"},
         status.HTTP_424_FAILED_DEPENDENCY: {"description": "Failed Response Validation"},
+        status.HTTP_429_TOO_MANY_REQUESTS: {"description": "User request rate or LLM token quota exceeded"},
         status.HTTP_500_INTERNAL_SERVER_ERROR: {"description": "Server Side Logic Error"},
         status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Model Failed to generate response"},
+        status.HTTP_504_GATEWAY_TIMEOUT: {"description": "Request deadline expired"},
     },
 )
-async def generate_compose(params: ComposeGenerationParameters = Body(...)) -> list[llm_models.LLMResponse]:
+async def generate_compose(
+    request: Request,
+    response: Response,
+    params: ComposeGenerationParameters = Body(...),
+    user_info: dict = Depends(enforce_rate_limit),
+    deadline: Deadline = Depends(request_deadline),
+) -> list[llm_models.LLMResponse]:
     """Api Endpoint for generating Docker Compose Files
 
+    The LLM tokens consumed by the generation are returned in the X-LLM-Usage header,
+    aggregated in the metrics and charged to the user's token quota.
+    The generation is cancelled if the client disconnects before it completes or bounded by the request deadline.
+    For the users and services selected in settings, several candidates are generated concurrently.
+    The stacks pre-generated in the background because they are often requested are served from storage
+    (X-Pregenerated header) without consuming LLM tokens
+
     Args:
+        request (Request): the request whose connection is watched
+        response (Response): the response whose usage header is set
         params (ComposeGenerationParameters): generation parameters as expected from request
+        user_info (dict): the rate limited user, charged with the LLM tokens consumed by the generation
+        deadline (Deadline): the request deadline (shared with the authentication)
 
     Returns:
         list[LLMResponse]: the generated file contents
     """
 
-    return ComposeGenerator(settings.llm_dry_run).run(params.model_dump())
+    context = GenerationContext(
+        deadline=deadline, candidates=compose_generator.speculative_candidates(params.services, user_info)
+    )
+    if pregenerator.enabled() and (files := await run_in_threadpool(pregenerator.serve, params.model_dump())):
+        response.headers["X-LLM-Usage"] = context.usage.header()
+        response.headers["X-Pregenerated"] = "true"
+        return files
+
+    try:
+        with pregenerator.live():
+            return await cancel_on_disconnect(
+                compose_generator.run(params.model_dump(), context),
+                request.is_disconnected,
+                type(compose_generator).__name__,
+            )
+    finally:
+        response.headers["X-LLM-Usage"] = context.usage.header()
+        usage_ledger.record(user_info["sub"], type(compose_generator).__name__, params.usage_pattern(), context.usage)
+        await rate_limiter.charge(user_info, context.usage.total_tokens)
+
+
+@router.post(
+    "/gen/compose/update",
+    responses={
+        status.HTTP_200_OK: {"description": "Returned LLM Response"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "Failed Bearer Token Authentification"},
+        status.HTTP_422_UNPROCESSABLE_CONTENT: {"description": "Failed Parameters Validation"},
+        status.HTTP_424_FAILED_DEPENDENCY: {"description": "Failed Response Validation"},
+        status.HTTP_429_TOO_MANY_REQUESTS: {"description": "User request rate or LLM token quota exceeded"},
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {"description": "Server Side Logic Error"},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Model Failed to generate response"},
+        status.HTTP_504_GATEWAY_TIMEOUT: {"description": "Request deadline expired"},
+    },
+)
+async def update_compose(
+    request: Request,
+    response: Response,
+    params: ComposeUpdateParameters = Body(...),
+    user_info: dict = Depends(enforce_rate_limit),
+    deadline: Deadline = Depends(request_deadline),
+) -> list[llm_models.LLMResponse]:
+    """Api Endpoint for updating an existing Docker Compose File
+
+    Only the added services are generated, so the LLM tokens and the latency scale with the change instead of
+    the stack size. The usage, cancellation and deadline rules are the ones of the compose generation
+
+    Args:
+        request (Request): the request whose connection is watched
+        response (Response): the response whose usage header is set
+        params (ComposeUpdateParameters): the existing files and the services to add and remove
+        user_info (dict): the rate limited user, charged with the LLM tokens consumed by the generation
+        deadline (Deadline): the request deadline (shared with the authentication)
+
+    Returns:
+        list[LLMResponse]: the updated file contents
+    """
+
+    context = GenerationContext(
+        deadline=deadline, candidates=compose_generator.speculative_candidates(params.services, user_info)
+    )
+    try:
+        with pregenerator.live():
+            return await cancel_on_disconnect(
+                compose_generator.update(params.model_dump(), context),
+                request.is_disconnected,
+                type(compose_generator).__name__,
+            )
+    finally:
+        response.headers["X-LLM-Usage"] = context.usage.header()
+        usage_ledger.record(user_info["sub"], type(compose_generator).__name__, params.usage_pattern(), context.usage)
+        await rate_limiter.charge(user_info, context.usage.total_tokens)
+
+
+@router.post(
+    "/gen/pipeline",
+    responses={
+        status.HTTP_200_OK: {"description": "Outcome, duration and files of each artifact generation stage"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "Failed Bearer Token Authentification"},
+        status.HTTP_422_UNPROCESSABLE_CONTENT: {"description": "Failed Parameters Validation"},
+        status.HTTP_429_TOO_MANY_REQUESTS: {"description": "User request rate or LLM token quota exceeded"},
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {"description": "Server Side Logic Error"},
+    },
+)
+async def generate_pipeline(
+    response: Response,
+    params: PipelineGenerationParameters = Body(...),
+    user_info: dict = Depends(enforce_rate_limit),
+    deadline: Deadline = Depends(request_deadline),
+) -> list[llm_models.PipelineStageResult]:
+    """Api Endpoint for generating multiple artifacts (compose, helm, terraform) concurrently
+
+    A failing artifact (including a stage that did not complete before the request deadline) is reported
+    in its own stage result without affecting the other artifacts.
+    The LLM tokens consumed by all the stages are returned in the X-LLM-Usage header
+
+    Args:
+        response (Response): the response whose usage header is set
+        params (PipelineGenerationParameters): generation parameters and artifacts as expected from request
+        user_info (dict): the rate limited user, charged with the LLM tokens consumed by all the stages
+        deadline (Deadline): the request deadline shared by all the stages
+
+    Returns:
+        list[PipelineStageResult]: the result of each stage in the requested order
+    """
+
+    contexts: dict[str, GenerationContext] = {
+        artifact: GenerationContext(deadline=deadline) for artifact in params.artifacts
+    }
+    try:
+        with pregenerator.live():
+            return await pipeline.run(params.model_dump(exclude={"artifacts"}), contexts)
+    finally:
+        usage = TokenUsage()
+        for artifact, context in contexts.items():
+            generator = type(pipeline.generators[artifact]).__name__
+            usage_ledger.record(user_info["sub"], generator, params.usage_pattern(), context.usage)
+            usage.merge(context.usage)
+
+        response.headers["X-LLM-Usage"] = usage.header()
+        await rate_limiter.charge(user_info, usage.total_tokens)
+
+
+@router.get(
+    "/metrics",
+    responses={
+        status.HTTP_200_OK: {"description": "Metrics of the worker that served the request"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "Failed Bearer Token Authentification"},
+    },
+)
+async def get_metrics() -> dict[str, Any]:
+    """Api Endpoint exposing the in-process metrics (counters, timings, llm backends state, llm token usage
+    per generator and parameter pattern) of the worker that served the request
+
+    Returns:
+        dict[str, Any]: the metrics snapshot
+    """
+
+    return metrics.snapshot()
+
+
+@router.get(
+    "/metrics/usage",
+    dependencies=[Depends(require_admin)],
+    responses={
+        status.HTTP_200_OK: {"description": "LLM token usage per user of the worker that served the request"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "Failed Bearer Token Authentification"},
+        status.HTTP_403_FORBIDDEN: {"description": "The user does not hold the admin role"},
+    },
+)
+async def get_usage_metrics() -> dict[str, Any]:
+    """Admin Api Endpoint exposing the LLM token usage per user (Keycloak subject) of the worker that served the request
+
+    Returns:
+        dict[str, Any]: the usage totals per user
+    """
+
+    return usage_ledger.stats(("user",))
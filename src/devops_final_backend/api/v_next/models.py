@@ -5,14 +5,21 @@ return http status 422 if requirements are not met
 """
 
 import re
-from typing import Annotated
+from typing import Annotated, Any, Literal
 
-from pydantic import BaseModel, Field, StrictBool, field_validator
+from pydantic import BaseModel, Field, StrictBool, field_validator, model_validator
+from yaml import YAMLError, safe_load
+
+from devops_final_backend.services.llm_generator.compose_validator import compose_validator
 
 IMAGE_REGEX = re.compile(
     r"^(?:[a-z0-9._-]+(?:/[a-z0-9._-]+)*)"  # multi-level repo
     r"(?:[:][a-zA-Z0-9._-]+)?$"  # optional tag
 )
+SERVICE_NAME_REGEX = re.compile(r"^[a-zA-Z0-9._-]{1,64}$")
+
+# the YAML documents of an update are parsed on the event loop, their size bounds the parsing time
+YAML_MAX_LENGTH = 64 * 1024
 
 
 class ComposeGenerationParameters(BaseModel, extra="forbid"):
@@ -66,3 +73,122 @@ class ComposeGenerationParameters(BaseModel, extra="forbid"):
             raise ValueError(f"Invalid network name: {v}")
 
         return v
+
+    def usage_pattern(self) -> str:
+        """Pattern of the parameters used to aggregate the LLM token usage
+
+        Returns:
+            str: the number of services and the network and volume modes
+        """
+
+        return f"services={len(self.services)},network_exists={self.network_exists},volume_mount={self.volume_mount}"
+
+
+class PipelineGenerationParameters(ComposeGenerationParameters):
+    """
+    Multi-artifact generation parameters: the compose parameters and the artifacts to generate from them
+    """
+
+    artifacts: list[Literal["compose", "helm", "terraform"]] = Field(
+        ["compose", "helm", "terraform"],
+        description="Artifacts generated concurrently from the same parameters",
+        min_length=1,
+    )
+
+
+class ComposeUpdateParameters(ComposeGenerationParameters):
+    """
+    Docker Compose File update parameters: an existing configuration with its environment files,
+    the services to add (generated by ComposeGenerator) and the services to remove
+    """
+
+    services: list[Annotated[str, Field(max_length=64, pattern=r"^[a-zA-Z0-9._\-:+]+$")]] = Field(
+        [],
+        description="Services to add as 'name:version'. Allowed chars: a-z, A-Z, 0-9, [., _, -, :, +].",
+    )
+    remove: list[Annotated[str, Field(max_length=64)]] = Field(
+        [], description="Names of the services of the existing configuration to remove"
+    )
+    compose: dict[str, Any] = Field(..., description="The existing compose file, as YAML string or JSON object")
+    env_files: dict[Annotated[str, Field(pattern=r"^\.env\..+$")], dict[str, Any]] = Field(
+        {},
+        description="The existing environment files by file name ('.env.<service>'), as YAML strings or JSON objects",
+    )
+
+    @field_validator("compose", mode="before")
+    @classmethod
+    def parse_compose(cls, v: Any) -> Any:
+        """
+        Parse the YAML compose file and check it against the compose schema. The service names and images
+        are injected in the prompt of the added services, they are checked like the services input
+        """
+        if isinstance(v, str):
+            if len(v) > YAML_MAX_LENGTH:
+                raise ValueError(f"compose exceeds {YAML_MAX_LENGTH} characters")
+
+            try:
+                v = safe_load(v)
+            except YAMLError as err:
+                raise ValueError("compose is not a valid YAML document") from err
+
+        if not isinstance(v, dict) or not isinstance(v.get("services"), dict) or not v["services"]:
+            raise ValueError("compose must declare services")
+
+        if violations := compose_validator.schema_violations(v):
+            raise ValueError("; ".join(violations))
+
+        for name, values in v["services"].items():
+            if not SERVICE_NAME_REGEX.fullmatch(name):
+                raise ValueError(f"Invalid service name: {name}")
+
+            image = values.get("image") if isinstance(values, dict) else None
+            if image is not None and not (isinstance(image, str) and len(image) <= 64 and IMAGE_REGEX.fullmatch(image)):
+                raise ValueError(f"Invalid image of the service {name}: {image}")
+
+        return v
+
+    @field_validator("env_files", mode="before")
+    @classmethod
+    def parse_env_files(cls, v: Any) -> Any:
+        """
+        Parse the YAML environment files
+        """
+        if not isinstance(v, dict):
+            raise ValueError("env_files must be a mapping")
+
+        if any(isinstance(data, str) and len(data) > YAML_MAX_LENGTH for data in v.values()):
+            raise ValueError(f"env_files exceed {YAML_MAX_LENGTH} characters")
+
+        try:
+            return {name: safe_load(data) if isinstance(data, str) else data for name, data in v.items()}
+        except YAMLError as err:
+            raise ValueError("env_files must be valid YAML documents") from err
+
+    @model_validator(mode="after")
+    def check_changes(self) -> "ComposeUpdateParameters":
+        """
+        Require a change and the removed services to exist in the compose file
+        """
+        if not self.services and not self.remove:
+            raise ValueError("no services to add or remove")
+
+        if unknown := [name for name in self.remove if name not in self.compose["services"]]:
+            raise ValueError(f"unknown services to remove: {', '.join(unknown)}")
+
+        if not self.services and set(self.compose["services"]) <= set(self.remove):
+            raise ValueError("all the services would be removed")
+
+        return self
+
+    def usage_pattern(self) -> str:
+        """Pattern of the parameters used to aggregate the LLM token usage
+
+        Returns:
+            str: the number of added, removed and existing services and the network and volume modes
+        """
+
+        return (
+            f"update,services={len(self.services)},remove={len(self.remove)},"
+            f"existing={len(self.compose['services'])},network_exists={self.network_exists},"
+            f"volume_mount={self.volume_mount}"
+        )
@@ -0,0 +1,292 @@
+"""Generation Benchmark
+
+Runs a corpus of compose generation requests (corpus.yaml: small to very large stacks, internal and external
+networks, both volume modes) against the configured provider, or the replay cassette, and reports per case
+the outcome, latency, attempts, token usage and validation error, with a summary per run.
+
+The report carries the provider, the models and a fingerprint of the compose prompts, so that two reports
+(like before and after a change of ComposeGenerator.SYSTEM_PROMPT or TASK_PROMPT_TEMPLATE) can be compared:
+
+    uv run devops-final-benchmark --output baseline.json
+    uv run devops-final-benchmark --baseline baseline.json --output candidate.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+from yaml import safe_load
+
+from devops_final_backend.api.v_next.models import ComposeGenerationParameters
+from devops_final_backend.services.deadline import Deadline, DeadlineExceeded
+from devops_final_backend.services.llm_generator import ComposeGenerator, GenerationContext
+from devops_final_backend.services.llm_generator.cassette import cassette
+from devops_final_backend.services.llm_generator.errors import InvalidModelResponse, LLMError
+from devops_final_backend.settings import settings
+
+__all__ = ["BenchmarkRunner", "CaseResult", "compare", "main", "render"]
+
+CORPUS_PATH = Path(__file__).parent / "corpus.yaml"
+SUMMARY_METRICS = ["valid_rate", "first_attempt_rate", "latency_p50", "latency_p95", "attempts_mean", "tokens_mean"]
+
+
+@dataclass
+class CaseResult:
+    """Outcome of a corpus case run
+
+    Attributes:
+        case (str): the corpus case name
+        services (int): the number of requested services
+        outcome (str): valid (first attempt), regenerated (valid after a regeneration or escalation),
+            invalid (failed validation after the regeneration), timeout (request deadline) or failed (model error)
+        latency (float): the generation duration in seconds
+        usage (dict[str, int]): the attempts and the prompt, completion and regeneration tokens (see TokenUsage)
+        reason (str | None): the validation error of the first attempt, or the error of a failed case
+    """
+
+    case: str
+    services: int
+    outcome: str
+    latency: float
+    usage: dict[str, int]
+    reason: str | None = None
+
+
+class BenchmarkRunner:
+    """Runner of the corpus cases on a compose generator"""
+
+    def __init__(self, generator: ComposeGenerator | None = None, concurrency: int = 1, repeat: int = 1):
+        """Init the runner
+
+        Args:
+            generator (ComposeGenerator | None): the generator to benchmark, a new one calling the model if not given
+            concurrency (int): the cases run at once, 1 to measure the latency without contention
+            repeat (int): the runs of each case
+        """
+
+        self.generator = generator or ComposeGenerator(dry_run=False)
+        self.concurrency = concurrency
+        self.repeat = repeat
+
+    @staticmethod
+    def load_corpus(path: str | Path = CORPUS_PATH, names: list[str] | None = None) -> dict[str, Any]:
+        """Load and validate the corpus cases as API requests
+
+        Args:
+            path (str | Path): the corpus file
+            names (list[str] | None): the cases to keep, all if not given
+
+        Raises:
+            KeyError: a requested case is not in the corpus
+
+        Returns:
+            dict[str, Any]: the validated parameters of each case
+        """
+
+        with open(path, encoding="utf-8") as file:
+            cases = safe_load(file)
+
+        if unknown := set(names or []) - set(cases):
+            raise KeyError(f"unknown benchmark cases: {', '.join(sorted(unknown))}")
+
+        return {
+            name: ComposeGenerationParameters.model_validate(values)
+            for name, values in cases.items()
+            if not names or name in names
+        }
+
+    async def run_case(self, name: str, params: ComposeGenerationParameters) -> CaseResult:
+        """Generate a case like the compose endpoint does, bounded by the default request deadline
+
+        Args:
+            name (str): the case name
+            params (ComposeGenerationParameters): the case parameters
+
+        Returns:
+            CaseResult: the outcome of the generation
+        """
+
+        context = GenerationContext(deadline=Deadline(settings.request_timeout_default))
+        outcome, reason = "valid", None
+        start = time.monotonic()
+        try:
+            await self.generator.run(params.model_dump(), context)
+            if context.first_error:
+                outcome, reason = "regenerated", context.first_error
+        except InvalidModelResponse as err:
+            outcome, reason = "invalid", err.message
+        except DeadlineExceeded as err:
+            outcome, reason = "timeout", err.message
+        except LLMError as err:
+            outcome, reason = "failed", err.message
+
+        return CaseResult(
+            case=name,
+            services=len(params.services),
+            outcome=outcome,
+            latency=round(time.monotonic() - start, 3),
+            usage={**asdict(context.usage), "total_tokens": context.usage.total_tokens},
+            reason=reason,
+        )
+
+    async def run(self, corpus: dict[str, Any]) -> dict[str, Any]:
+        """Run the cases of a corpus
+
+        Args:
+            corpus (dict[str, Any]): the validated parameters of each case (see load_corpus)
+
+        Returns:
+            dict[str, Any]: the report: run metadata, summary and case results in corpus order
+        """
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(name: str, params: ComposeGenerationParameters) -> CaseResult:
+            async with semaphore:
+                return await self.run_case(name, params)
+
+        started = datetime.now(UTC).isoformat(timespec="seconds")
+        results = await asyncio.gather(
+            *[bounded(name, params) for _ in range(self.repeat) for name, params in corpus.items()]
+        )
+
+        return {
+            "metadata": {**self.metadata(), "started": started, "repeat": self.repeat},
+            "summary": self.summarize(results),
+            "cases": [asdict(result) for result in results],
+        }
+
+    def metadata(self) -> dict[str, Any]:
+        """Describe what is benchmarked: provider, models, output modes and prompts
+
+        Returns:
+            dict[str, Any]: the run metadata
+        """
+
+        generator = type(self.generator)
+        prompts = "\n".join([generator.SYSTEM_PROMPT, generator.TASK_PROMPT_TEMPLATE, generator.TASK_PROMPT_RETRY])
+        return {
+            "provider": settings.llm_provider,
+            "models": generator.model_tiers(),
+            "structured_output": generator.structured_output(),
+            "output_budget": settings.llm_output_budget,
+            "prompt_fingerprint": hashlib.sha256(prompts.encode()).hexdigest()[:12],
+            "concurrency": self.concurrency,
+        }
+
+    @staticmethod
+    def summarize(results: list[CaseResult]) -> dict[str, Any]:
+        """Aggregate the case results
+
+        Args:
+            results (list[CaseResult]): the case results
+
+        Returns:
+            dict[str, Any]: the outcome counts, rates, latency percentiles (nearest rank) and mean attempts and tokens
+        """
+
+        if not results:
+            return {}
+
+        latencies = sorted(result.latency for result in results)
+        outcomes = [result.outcome for result in results]
+        return {
+            "runs": len(results),
+            "outcomes": {outcome: outcomes.count(outcome) for outcome in sorted(set(outcomes))},
+            "valid_rate": round(sum(o in ("valid", "regenerated") for o in outcomes) / len(results), 3),
+            "first_attempt_rate": round(outcomes.count("valid") / len(results), 3),
+            "latency_p50": latencies[max(round(0.5 * len(latencies)) - 1, 0)],
+            "latency_p95": latencies[max(round(0.95 * len(latencies)) - 1, 0)],
+            "attempts_mean": round(statistics.mean(result.usage["attempts"] for result in results), 2),
+            "tokens_mean": round(statistics.mean(result.usage["total_tokens"] for result in results), 1),
+        }
+
+
+def render(report: dict[str, Any]) -> str:
+    """Render a report as a text table of the cases followed by the summary
+
+    Args:
+        report (dict[str, Any]): the report
+
+    Returns:
+        str: the table
+    """
+
+    lines = [f"{'case':<32} {'svc':>3} {'outcome':<11} {'latency':>8} {'att':>3} {'tokens':>7}  reason"]
+    for result in report["cases"]:
+        usage = result["usage"]
+        lines.append(
+            f"{result['case']:<32} {result['services']:>3} {result['outcome']:<11} {result['latency']:>8.2f} "
+            f"{usage['attempts']:>3} {usage['total_tokens']:>7}  {(result['reason'] or '')[:80]}"
+        )
+
+    lines.append("")
+    lines.extend(f"{key}: {value}" for key, value in {**report["metadata"], **report["summary"]}.items())
+    return "\n".join(lines)
+
+
+def compare(baseline: dict[str, Any], report: dict[str, Any]) -> str:
+    """Compare the summaries of two reports
+
+    Args:
+        baseline (dict[str, Any]): the reference report
+        report (dict[str, Any]): the new report
+
+    Returns:
+        str: the baseline and new value of each summary metric with the difference, and the changed metadata
+    """
+
+    lines = [f"{'metric':<20} {'baseline':>10} {'current':>10} {'delta':>10}"]
+    for metric in SUMMARY_METRICS:
+        before, after = baseline["summary"].get(metric), report["summary"].get(metric)
+        delta = f"{after - before:+.3f}" if before is not None and after is not None else "n/a"
+        lines.append(f"{metric:<20} {before!s:>10} {after!s:>10} {delta:>10}")
+
+    for key, value in report["metadata"].items():
+        if key != "started" and baseline["metadata"].get(key) != value:
+            lines.append(f"changed {key}: {baseline['metadata'].get(key)} -> {value}")
+
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run the benchmark from the command line
+    Used by the UV project-script `devops-final-benchmark`
+
+    Args:
+        argv (list[str] | None): the command line arguments, sys.argv if not given
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the compose generation on a corpus of requests")
+    parser.add_argument("--corpus", default=str(CORPUS_PATH), help="corpus file (default: the bundled corpus)")
+    parser.add_argument("--case", action="append", dest="cases", help="run only this case (repeatable)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs of each case")
+    parser.add_argument("--concurrency", type=int, default=1, help="cases run at once")
+    parser.add_argument("--replay", metavar="CASSETTE", help="replay the calls of a cassette instead of a provider")
+    parser.add_argument("--record", action="store_true", help="record the model calls to the cassette")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare the summary with this JSON report")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        settings.llm_provider = "replay"
+        cassette.path = Path(args.replay)
+    settings.llm_record = args.record
+
+    runner = BenchmarkRunner(concurrency=args.concurrency, repeat=args.repeat)
+    report = asyncio.run(runner.run(runner.load_corpus(args.corpus, args.cases)))
+    print(render(report))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.baseline:
+        print()
+        print(compare(json.loads(Path(args.baseline).read_text(encoding="utf-8")), report))
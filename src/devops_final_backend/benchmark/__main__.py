@@ -0,0 +1,5 @@
+"""Run the generation benchmark: python -m devops_final_backend.benchmark"""
+
+from devops_final_backend.benchmark import main
+
+main()
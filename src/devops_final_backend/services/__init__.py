@@ -1,3 +1,4 @@
 """Business Logic Layer
-This Package contains the LLM Generator Service and the Auth Provider Integration
+This Package contains the LLM Generator Service, the Auth Provider Integration, the per user Rate Limit,
+the offline Image Catalog, the Pre-Generation of the popular stacks and the Telemetry (metrics) of the application
 """
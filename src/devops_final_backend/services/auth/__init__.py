@@ -2,16 +2,22 @@
 
 This package encapsulates the the interaction with the application's auth provider (Keycloak).
 
-It exposes methods for obtaining a token and validating it using keycloak's introspect endpoint
+It exposes methods for obtaining a token and validating it using keycloak's introspect endpoint,
+the validation being bounded by the request deadline (its duration and the user are added to the request log context),
+and the dependency restricting the administration endpoints to the users of the admin realm role
 """
 
+import time
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from keycloak import KeycloakOpenID
 
+from devops_final_backend.services.deadline import Deadline, DeadlineExceeded, request_deadline
+from devops_final_backend.services.telemetry import bind, timing
 from devops_final_backend.settings import settings
 
-__all__ = ["get_current_user", "get_user_tokens"]
+__all__ = ["get_current_user", "get_user_tokens", "require_admin"]
 
 keycloak_openid = KeycloakOpenID(
     server_url=settings.keycloak_url,
@@ -27,24 +33,55 @@ oauth2_scheme = OAuth2PasswordBearer(
 )
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
-    """Validate incoming auht tokens against keycloak auth provider
+async def get_current_user(token: str = Depends(oauth2_scheme), deadline: Deadline = Depends(request_deadline)) -> dict:
+    """Validate incoming auht tokens against keycloak auth provider within the request deadline
+
+    Args:
+        token (str): the bearer token
+        deadline (Deadline): the request deadline, the introspection is cancelled once it expires
 
     Raises:
+        DeadlineExceeded: the deadline expired before keycloak answered
         HTTPException: 401 if keycloak does not recognize token or the user info does not contain a subject id
 
     Returns:
         dict: user info dictionary
     """
 
+    start = time.monotonic()
     try:
-        user_info = keycloak_openid.introspect(token)
+        async with deadline.bound("authentication"):
+            user_info = await keycloak_openid.a_introspect(token)
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token") from e
+    finally:
+        timing("authentication", time.monotonic() - start)
 
     if not user_info.get("sub"):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
+    bind(user=user_info["sub"])
+    return user_info
+
+
+def require_admin(user_info: dict = Depends(get_current_user)) -> dict:
+    """Restrict an endpoint to the users holding the KEYCLOAK_ADMIN_ROLE realm role
+
+    Args:
+        user_info (dict): the authenticated user
+
+    Raises:
+        HTTPException: 403 if the user does not hold the admin role
+
+    Returns:
+        dict: user info dictionary
+    """
+
+    if settings.keycloak_admin_role not in user_info.get("realm_access", {}).get("roles", []):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin role required")
+
     return user_info
 
 
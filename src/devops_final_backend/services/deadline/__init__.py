@@ -0,0 +1,126 @@
+"""Request Deadlines
+
+This package bounds the overall time of a request. It exposes
+
+- the request deadline dependency, reading the client time budget (X-Request-Timeout header or request_timeout
+  query parameter, in seconds) with a server default and cap
+- the deadline whose remaining budget bounds the auth provider call, each LLM attempt and the retry decision
+- the error raised once the budget is exhausted (answered with 504)
+"""
+
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from fastapi import Header, Query
+
+from devops_final_backend.services.telemetry import metrics
+from devops_final_backend.settings import settings
+
+__all__ = ["Deadline", "DeadlineExceeded", "request_deadline"]
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request deadline expired (or would expire) before a stage of the request completed"""
+
+    def __init__(self, stage: str, detail: str | None = None):
+        """Init with a pre-formated message
+
+        Args:
+            stage (str): the stage that could not complete in time (auth, generation, retry)
+            detail (str | None): additional context, like the validation error of a skipped retry
+        """
+        self.stage = stage
+        self.message = f"The request deadline expired during {stage}" + (f": {detail}" if detail else "")
+        super().__init__(self.message)
+
+
+@dataclass
+class Deadline:
+    """Absolute expiry of a request on the monotonic clock
+
+    Attributes:
+        timeout (float): the granted time budget in seconds
+        expires (float): the monotonic time at which the budget is exhausted
+    """
+
+    timeout: float
+    expires: float = field(init=False)
+
+    def __post_init__(self) -> None:
+        """Start the budget"""
+        self.expires = time.monotonic() + self.timeout
+
+    def remaining(self) -> float:
+        """Time left until the deadline
+
+        Returns:
+            float: the remaining seconds, 0 once expired
+        """
+
+        return max(self.expires - time.monotonic(), 0.0)
+
+    def check(self, stage: str, needed: float = 0, detail: str | None = None) -> None:
+        """Fail if the remaining budget does not cover a stage
+
+        Args:
+            stage (str): the stage about to start
+            needed (float): the expected duration of the stage (like the duration of the previous attempt)
+            detail (str | None): additional context of the error
+
+        Raises:
+            DeadlineExceeded: the stage cannot complete in time
+        """
+
+        if self.remaining() <= needed:
+            metrics.inc("request_deadline_exceeded_total", stage=stage)
+            raise DeadlineExceeded(stage, detail)
+
+    @asynccontextmanager
+    async def bound(self, stage: str) -> AsyncIterator[None]:
+        """Cancel the enclosed operation when the deadline expires. The operation is cancelled rather than failed,
+        so that an expired client budget is not recorded as a failure of the backends (the circuit breaker
+        guarding the bound records the DeadlineExceeded raised once cancelled)
+
+        Args:
+            stage (str): the enclosed stage
+
+        Raises:
+            TimeoutError: a timeout of the operation itself, unrelated to the deadline
+            DeadlineExceeded: the deadline expired before the operation completed
+
+        Yields:
+            None: control to the operation
+        """
+
+        self.check(stage)
+        timeout = asyncio.timeout(self.remaining())
+        try:
+            async with timeout:
+                yield
+        except TimeoutError as err:
+            if not timeout.expired():
+                raise
+
+            metrics.inc("request_deadline_exceeded_total", stage=stage)
+            raise DeadlineExceeded(stage) from err
+
+
+def request_deadline(
+    x_request_timeout: float | None = Header(default=None, gt=0, description="Request time budget in seconds"),
+    request_timeout: float | None = Query(default=None, gt=0, description="Request time budget in seconds"),
+) -> Deadline:
+    """Start the deadline of the request from the client time budget, capped by the server maximum
+
+    Args:
+        x_request_timeout (float | None): the time budget header
+        request_timeout (float | None): the time budget query parameter, used if the header is missing
+
+    Returns:
+        Deadline: the request deadline
+    """
+
+    timeout = x_request_timeout or request_timeout or settings.request_timeout_default
+    return Deadline(min(timeout, settings.request_timeout_max))
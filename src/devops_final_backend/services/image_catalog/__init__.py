@@ -0,0 +1,328 @@
+"""Image Catalog
+
+Offline catalog of known image repositories, versions and variants (catalog.yaml, versioned) used to validate
+and normalize the images of the generated configurations without contacting a registry.
+
+The catalog is compiled into a SQLite index file (rebuilt when the catalog version changes) which each worker loads
+once in memory (at startup, see the API lifespan), so that the lookups never block the event loop
+"""
+
+import os
+import re
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
+
+from yaml import BaseLoader, load
+
+from devops_final_backend.settings import settings
+
+__all__ = ["CatalogIndex", "ImageCatalog", "image_catalog"]
+
+CATALOG_PATH = Path(__file__).parent / "catalog.yaml"
+TAG_REGEX = re.compile(r"^v?(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:-(.+))?$")
+DEFAULT_REGISTRY_PREFIXES = ("docker.io/library/", "index.docker.io/library/", "docker.io/", "library/")
+
+
+@dataclass
+class CatalogIndex:
+    """Contents of the index file, loaded in memory
+
+    Attributes:
+        repositories (set[str]): the catalog repository names
+        aliases (dict[str, str]): the repository of each alias
+        versions (dict[str, list[list[int]]]): the known version components of each repository, newest first
+        variants (dict[str, set[str]]): the known variants of each repository
+    """
+
+    repositories: set[str] = field(default_factory=set)
+    aliases: dict[str, str] = field(default_factory=dict)
+    versions: dict[str, list[list[int]]] = field(default_factory=dict)
+    variants: dict[str, set[str]] = field(default_factory=dict)
+
+
+class ImageCatalog:
+    """Lookup of image references in the compiled catalog index"""
+
+    def __init__(self, catalog_path: str | Path, index_path: str | Path):
+        """Init the catalog, the index is built on first use
+
+        Args:
+            catalog_path (str | Path): the catalog yaml file
+            index_path (str | Path): the SQLite index file
+        """
+
+        self.catalog_path = Path(catalog_path)
+        self.index_path = Path(index_path)
+        self._lock = Lock()
+        self._ready = False
+        self._index: CatalogIndex | None = None
+
+    @classmethod
+    def from_settings(cls) -> "ImageCatalog":
+        """Build the catalog as configured in settings
+
+        Returns:
+            ImageCatalog: the catalog
+        """
+
+        return cls(settings.image_catalog_path or CATALOG_PATH, settings.image_catalog_index_path)
+
+    def index(self) -> CatalogIndex:
+        """Get the catalog index, building the index file if missing or outdated and loading it once per worker
+        (the lookups then run in memory, without blocking I/O)
+
+        Returns:
+            CatalogIndex: the loaded index
+        """
+
+        if self._index is None:
+            self.build_index()
+            with self._lock:
+                if self._index is None:
+                    self._index = self.load_index()
+
+        return self._index
+
+    def load_index(self) -> CatalogIndex:
+        """Read the index file
+
+        Returns:
+            CatalogIndex: the repositories, aliases, versions and variants of the index
+        """
+
+        index = CatalogIndex()
+        with sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True) as conn:
+            for (name,) in conn.execute("SELECT name FROM repositories"):
+                index.repositories.add(name)
+            for alias, repository in conn.execute("SELECT alias, repository FROM aliases"):
+                index.aliases[alias] = repository
+            for repository, *parts in conn.execute("SELECT repository, major, minor, patch FROM versions"):
+                index.versions.setdefault(repository, []).append([part for part in parts if part is not None])
+            for repository, variant in conn.execute("SELECT repository, variant FROM variants"):
+                index.variants.setdefault(repository, set()).add(variant)
+        conn.close()
+
+        for versions in index.versions.values():
+            versions.sort(reverse=True)
+
+        return index
+
+    def build_index(self) -> None:
+        """Compile the catalog into the index file unless the file was already built from the same catalog version.
+        The index is written to a temporary file and renamed so that concurrent workers never read a partial index
+        """
+
+        with self._lock:
+            if self._ready:
+                return
+
+            with open(self.catalog_path, encoding="utf-8") as file:
+                # every scalar is loaded as string, versions like 1.20 must not become floats
+                catalog = load(file, Loader=BaseLoader)
+
+            version = f"{catalog['version']}:{self.catalog_path.resolve()}"
+            if self.index_version() != version:
+                self.index_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+                tmp_path.unlink(missing_ok=True)
+                with sqlite3.connect(tmp_path) as conn:
+                    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+                    conn.execute("CREATE TABLE repositories (name TEXT PRIMARY KEY)")
+                    conn.execute(
+                        "CREATE TABLE versions (repository TEXT, major INTEGER, minor INTEGER, patch INTEGER, "
+                        "PRIMARY KEY (repository, major, minor, patch))"
+                    )
+                    conn.execute(
+                        "CREATE TABLE variants (repository TEXT, variant TEXT, PRIMARY KEY (repository, variant))"
+                    )
+                    conn.execute("CREATE TABLE aliases (alias TEXT PRIMARY KEY, repository TEXT)")
+                    conn.execute("INSERT INTO meta VALUES ('version', ?)", (version,))
+                    for name, entry in catalog["repositories"].items():
+                        conn.execute("INSERT INTO repositories VALUES (?)", (name,))
+                        conn.executemany(
+                            "INSERT OR IGNORE INTO versions VALUES (?, ?, ?, ?)",
+                            [(name, *self.version_parts(version)) for version in entry.get("versions") or []],
+                        )
+                        conn.executemany(
+                            "INSERT INTO variants VALUES (?, ?)",
+                            [(name, variant) for variant in entry.get("variants") or []],
+                        )
+                        conn.executemany(
+                            "INSERT INTO aliases VALUES (?, ?)", [(alias, name) for alias in entry.get("aliases") or []]
+                        )
+                conn.close()
+                tmp_path.replace(self.index_path)
+
+            self._ready = True
+
+    def index_version(self) -> str | None:
+        """Read the catalog version the index was built from
+
+        Returns:
+            str | None: the version, None if the index is missing or unreadable
+        """
+
+        try:
+            with sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True) as conn:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            conn.close()
+        except sqlite3.Error:
+            return None
+
+        return row[0] if row else None
+
+    @staticmethod
+    def version_parts(version: str) -> tuple[int | None, int | None, int | None]:
+        """Split a version into its major, minor and patch components
+
+        Args:
+            version (str): the version (like 7, 7.2 or 7.2.5)
+
+        Returns:
+            tuple[int | None, int | None, int | None]: the components, None for the missing ones
+        """
+
+        parts: list[int | None] = [int(part) for part in version.split(".")[:3]]
+        parts += [None] * (3 - len(parts))
+        return parts[0], parts[1], parts[2]
+
+    @staticmethod
+    def split(image: str) -> tuple[str, str | None]:
+        """Split an image reference into its normalized repository and its tag
+        (docker hub registry and library prefixes are removed, digests are left to the tag)
+
+        Args:
+            image (str): the image reference
+
+        Returns:
+            tuple[str, str | None]: the repository and the tag (None if not specified)
+        """
+
+        repository, tag = image.strip(), None
+        if "@" in repository:
+            repository, tag = repository.split("@", 1)[0], "@" + repository.split("@", 1)[1]
+        elif ":" in repository.rsplit("/", 1)[-1]:
+            repository, tag = repository.rsplit(":", 1)
+
+        repository = repository.lower()
+        for prefix in DEFAULT_REGISTRY_PREFIXES:
+            if repository.startswith(prefix):
+                repository = repository.removeprefix(prefix)
+                break
+
+        return repository, tag
+
+    def resolve(self, repository: str) -> str | None:
+        """Resolve a repository or one of its aliases (mirrors under another path) to its catalog name
+
+        Args:
+            repository (str): the normalized repository
+
+        Returns:
+            str | None: the catalog name, None for unknown repositories
+        """
+
+        index = self.index()
+        return repository if repository in index.repositories else index.aliases.get(repository)
+
+    def normalize(self, image: str) -> str:
+        """Normalize an image reference (like docker.io/library/redis:7 to redis:7),
+        known aliases are replaced with the catalog repository
+
+        Args:
+            image (str): the image reference
+
+        Returns:
+            str: the normalized reference
+        """
+
+        repository, tag = self.split(image)
+        repository = self.resolve(repository) or repository
+        if tag is None:
+            return repository
+
+        return f"{repository}{tag}" if tag.startswith("@") else f"{repository}:{tag}"
+
+    def check(self, image: str) -> str | None:
+        """Check an image reference against the catalog. The catalog is a snapshot that cannot list every image
+        nor every release, so the finding is a violation only in strict mode (see ComposeValidator)
+
+        Args:
+            image (str): the image reference
+
+        Returns:
+            str | None: the finding (unknown image, with the known repositories of the same name as suggestions,
+                or unknown tag of a known image, with its latest known versions), None if the image is known
+        """
+
+        repository, tag = self.split(image)
+        index = self.index()
+        if not (name := self.resolve(repository)):
+            short_name, namespace = repository.rsplit("/", 1)[-1], repository.split("/", 1)[0]
+            similar = sorted(
+                name
+                for name in index.repositories
+                if name == short_name or name.endswith(f"/{short_name}") or name.startswith(f"{namespace}/")
+            )[:3]
+            return f"unknown image {repository}" + (f", did you mean {' or '.join(similar)}" if similar else "")
+
+        if tag is None or tag == "latest" or tag.startswith("@") or self.has_tag(name, tag):
+            return None
+
+        known = [".".join(str(part) for part in version) for version in index.versions.get(name, [])[:3]]
+        return f"unknown tag {tag} for image {name}" + (f" (known versions: {', '.join(known)})" if known else "")
+
+    def has_tag(self, repository: str, tag: str) -> bool:
+        """Check a tag: a variant, or a version prefix of a known version optionally followed by a known variant.
+        The catalog lists the latest release of each line (like 7.2.7 or 16.9), so the older releases of the same
+        line are accepted as well (7.2.5 or 16.4)
+
+        Args:
+            repository (str): the known repository
+            tag (str): the tag
+
+        Returns:
+            bool: the tag is known (always True for repositories without versions)
+        """
+
+        index = self.index()
+        if not (versions := index.versions.get(repository)):
+            return True
+
+        variants = index.variants.get(repository, set())
+        if tag in variants:
+            return True
+
+        if not (match := TAG_REGEX.match(tag)):
+            return False
+
+        *parts, variant = match.groups()
+        if variant and variant not in variants:
+            return False
+
+        tag_version = [int(part) for part in parts if part is not None]
+        return any(self.same_line(tag_version, known) for known in versions if known[0] == tag_version[0])
+
+    @staticmethod
+    def same_line(version: list[int], known: list[int]) -> bool:
+        """Check if a version (or version prefix) belongs to the release line of a known version:
+        all the components but the last one of the known version are equal and the last one is not newer
+
+        Args:
+            version (list[int]): the version components
+            known (list[int]): the known version components
+
+        Returns:
+            bool: the version is part of the known release line
+        """
+
+        if len(version) > len(known):
+            return False
+
+        last = len(known) - 1
+        return all(part == known[i] if i < last else part <= known[i] for i, part in enumerate(version))
+
+
+image_catalog = ImageCatalog.from_settings()
@@ -2,15 +2,30 @@
 
 This package allows for definition of specialized single-task LLM generators starting from an abstract generator.
 It exposes
-- the specialized generators (currently just the Composer Generator)
+- the specialized generators (Compose, Helm and Terraform Generators)
+- the shared generator and pipeline instances and the request-local generation context
+- the pipeline generating multiple artifacts concurrently
+- the cancellation of the generations whose client disconnected
 - the llm response model
 - the errors that can occur during the generation process
 """
 
-from .compose_generator import ComposeGenerator
+from .cancellation import cancel_on_disconnect
+from .compose_generator import ComposeGenerator, compose_generator
+from .context import GenerationContext
+from .helm_generator import HelmGenerator
+from .pipeline import Pipeline, pipeline
+from .terraform_generator import TerraformGenerator
 
 __all__ = [
     "ComposeGenerator",
+    "HelmGenerator",
+    "TerraformGenerator",
+    "Pipeline",
+    "GenerationContext",
+    "compose_generator",
+    "pipeline",
+    "cancel_on_disconnect",
     "models",
     "errors",
 ]
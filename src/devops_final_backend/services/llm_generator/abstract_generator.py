@@ -1,19 +1,56 @@
 """Abstract generator from which all inherit"""
 
+import asyncio
+import time
 from abc import ABC, abstractmethod
-from typing import Any
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, ClassVar
 
+import httpx
 from langchain.chat_models import init_chat_model
 from langchain.prompts import ChatPromptTemplate
+from langchain_core.language_models import BaseChatModel
 from langchain_core.runnables import Runnable
+from pydantic import BaseModel
 
+from devops_final_backend.services.deadline import Deadline
+from devops_final_backend.services.telemetry import bind, logger, metrics, timing
 from devops_final_backend.settings import settings
 
-from .errors import InvalidModelParameters
+from .cassette import ReplayChatModel, cassette
+from .circuit_breaker import circuit_breaker
+from .context import GenerationContext
+from .errors import (
+    InvalidModelParameters,
+    InvalidModelResponse,
+    ModelFailedToRespond,
+    TierTimedOut,
+    ValidationError,
+)
+from .hedging import hedge_policy
 from .models import LLMResponse, ResponseType
+from .routing import Backend, backend_pool
 
 
-class AbstractGenerator(ABC):
+@dataclass(frozen=True)
+class ChainOptions:
+    """Selection of the chain invoked by a generation attempt
+
+    Attributes:
+        structured (bool): use the structured output chain
+        max_tokens (int | None): the output token budget, None for the model's default limit
+        candidate (int): the speculative candidate, sampled at a higher temperature after the first one
+        tier (int): the model tier (see LLM_MODEL_TIERS), 0 for the fastest model
+    """
+
+    structured: bool = False
+    max_tokens: int | None = None
+    candidate: int = 0
+    tier: int = 0
+
+
+class AbstractGenerator(ABC):  # pylint: disable=too-many-public-methods
     """An abstraction of the LLM Generator that contains common or required methods
 
     Class Constants:
@@ -24,6 +61,12 @@ class AbstractGenerator(ABC):
     - TASK_PROMPT_PARAMS (list[str]): variables required for the prompt
     - TASK_PROMPT_RETRY (str): templated instruction to use when attempting to regenerate a bad response
     - NO_RESPONSE (list[LLMResponse]): A dummy response list for situations where no generation is wanted
+    - WARMUP_PROMPT (str): minimal prompt used to load the model in the provider's memory
+    - OUTPUT_SCHEMA (type[BaseModel] | None): schema of the structured output mode, None if only text is supported
+    - STRUCTURED_OUTPUT_METHODS (dict[str, str]): structured output method per provider,
+      the other providers use tool calling if they support it
+    - STOP_SEQUENCES (list[str]): sequences ending a text generation that drifted into commentary
+    - OUTPUT_BUDGET_SCALE (float): multiplier of the output token budget for verbose artifacts
     """
 
     TEMPERATURE: int = 0
@@ -39,43 +82,510 @@ class AbstractGenerator(ABC):
             data="Lorem Ipsum",
         )
     ]
+    WARMUP_PROMPT: str = "Reply with OK"
+    OUTPUT_SCHEMA: type[BaseModel] | None = None
+    STRUCTURED_OUTPUT_METHODS: dict[str, str] = {"ollama": "json_schema", "openai": "function_calling"}
+    STOP_SEQUENCES: list[str] = ["\n\nExplanation", "\n\nNote:", "\n\nThis configuration"]
+    OUTPUT_BUDGET_SCALE: float = 1
+
+    _models: ClassVar[dict[tuple[type, str | None, int], BaseChatModel]] = {}
+    _chains: ClassVar[dict[tuple[type, str | None, bool, int | None, int, int], Runnable]] = {}
+    _structured_support: ClassVar[dict[type, bool]] = {}
 
     @classmethod
-    def get_chain(cls) -> Runnable:
-        """Initializes a chat template, a model and an overall invokeable chain
+    def model_tiers(cls) -> list[str]:
+        """List the models of the cascade from the fastest to the strongest
 
         Returns:
-            Runnable: invokeable LLM entity
+            list[str]: the LLM_MODEL_TIERS, or the single LLM_MODEL if no tiers are configured
+        """
+
+        return settings.llm_model_tiers or [settings.llm_model]
+
+    @classmethod
+    def get_model(cls, base_url: str | None = None, tier: int = 0) -> BaseChatModel:
+        """Initializes the chat model as configured in settings, once per generator class, backend and model tier.
+        The connect and read timeouts are passed to the http client of the providers that support them.
+        The replay provider serves the calls recorded in the cassette
+
+        Args:
+            base_url (str | None): the backend serving the model, None for the provider's default endpoint
+            tier (int): the model tier, 0 for the fastest model
+
+        Returns:
+            BaseChatModel: the invokeable chat model
         """
 
+        if (cls, base_url, tier) in cls._models:
+            return cls._models[(cls, base_url, tier)]
+
+        model_name = cls.model_tiers()[tier]
+        timeout = httpx.Timeout(settings.llm_read_timeout, connect=settings.llm_connect_timeout)
+
         match settings.llm_provider:
             case "ollama":
-                chain = init_chat_model(
-                    model=settings.llm_model,
+                model = init_chat_model(
+                    model=model_name,
                     model_provider=settings.llm_provider,
                     temperature=cls.TEMPERATURE,
-                    base_url=settings.llm_base_url,
+                    base_url=base_url,
+                    client_kwargs={"timeout": timeout},
                 )
 
             case "openai":
-                chain = init_chat_model(
-                    model=settings.llm_model,
+                model = init_chat_model(
+                    model=model_name,
                     model_provider=settings.llm_provider,
                     temperature=cls.TEMPERATURE,
                     api_key=settings.llm_secret,
+                    base_url=base_url,
+                    timeout=timeout,
+                )
+
+            case "replay":
+                model = ReplayChatModel(
+                    cassette=cassette, latency_scale=settings.llm_replay_latency_scale, model=model_name
                 )
 
             case _:
-                chain = init_chat_model(
-                    model=settings.llm_model,
+                model = init_chat_model(
+                    model=model_name,
                     model_provider=settings.llm_provider,
                     temperature=cls.TEMPERATURE,
                 )
 
-        return (
-            ChatPromptTemplate.from_messages([("system", cls.SYSTEM_PROMPT), ("user", cls.TASK_PROMPT_TEMPLATE)])
-            | chain
+        cls._models[(cls, base_url, tier)] = model
+        return model
+
+    @classmethod
+    def get_chain(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        cls,
+        base_url: str | None = None,
+        structured: bool = False,
+        max_tokens: int | None = None,
+        candidate: int = 0,
+        tier: int = 0,
+    ) -> Runnable:
+        """Initializes a chat template, a model and an overall invokeable chain.
+        The chain is built once per generator class, backend, output mode, output budget and model tier and reused
+        by all the requests (the budgeted models share the http client of the backend model)
+
+        Args:
+            base_url (str | None): the backend serving the model, None for the provider's default endpoint
+            structured (bool): bind the OUTPUT_SCHEMA to the model, the chain then returns a dict with
+                the raw message, the parsed output and the parsing error
+            max_tokens (int | None): the output token budget, None for the model's default limit
+            candidate (int): the speculative candidate, the candidates after the first sample at higher temperatures
+            tier (int): the model tier, 0 for the fastest model
+
+        Returns:
+            Runnable: invokeable LLM entity
+        """
+
+        key = (cls, base_url, structured, max_tokens, candidate, tier)
+        if key not in cls._chains:
+            chat_model = cls.get_model(base_url, tier)
+            if candidate:
+                chat_model = cls.sample_model(chat_model, candidate)
+            if max_tokens is not None:
+                chat_model = cls.budget_model(chat_model, max_tokens, structured)
+
+            model: Runnable = chat_model
+            if structured and cls.OUTPUT_SCHEMA is not None:
+                method = cls.STRUCTURED_OUTPUT_METHODS.get(settings.llm_provider)
+                model = chat_model.with_structured_output(
+                    cls.OUTPUT_SCHEMA, include_raw=True, **({"method": method} if method else {})
+                )
+
+            cls._chains[key] = cls.prompt_template() | model
+
+        return cls._chains[key]
+
+    @classmethod
+    def prompt_template(cls) -> ChatPromptTemplate:
+        """Build the chat template of the generator
+
+        Returns:
+            ChatPromptTemplate: the system and task prompts
+        """
+
+        return ChatPromptTemplate.from_messages([("system", cls.SYSTEM_PROMPT), ("user", cls.TASK_PROMPT_TEMPLATE)])
+
+    @classmethod
+    def sample_model(cls, model: BaseChatModel, candidate: int) -> BaseChatModel:
+        """Copy the model with the sampling temperature of a speculative candidate, so that the candidates differ
+
+        Args:
+            model (BaseChatModel): the backend model
+            candidate (int): the candidate index
+
+        Returns:
+            BaseChatModel: the model of the candidate (unchanged for the providers without temperature)
+        """
+
+        if "temperature" not in type(model).model_fields:
+            return model
+
+        temperature = cls.TEMPERATURE + candidate * settings.llm_speculative_temperature_step
+        return model.model_copy(update={"temperature": min(temperature, 1.0)})
+
+    @classmethod
+    def budget_model(cls, model: BaseChatModel, max_tokens: int, structured: bool) -> BaseChatModel:
+        """Copy the model with an output token limit and, in text mode, the STOP_SEQUENCES
+        (num_predict for Ollama, max_tokens for OpenAI and the providers using the same field)
+
+        Args:
+            model (BaseChatModel): the backend model
+            max_tokens (int): the output token budget
+            structured (bool): the model is used for structured output, which must not be cut by stop sequences
+
+        Returns:
+            BaseChatModel: the budgeted model
+        """
+
+        fields = type(model).model_fields
+        update: dict[str, Any] = {name: max_tokens for name in ("num_predict", "max_tokens") if name in fields}
+        if not structured and "stop" in fields:
+            update["stop"] = cls.STOP_SEQUENCES
+
+        return model.model_copy(update=update)
+
+    @classmethod
+    def output_budget(cls, services: list[str] | str) -> int | None:
+        """Compute the output token budget of a generation from the number of requested services
+
+        Args:
+            services (list[str] | str): the requested services, or their prompt injectable string
+
+        Returns:
+            int | None: the budget, None if output budgets are disabled in settings
+        """
+
+        if not settings.llm_output_budget:
+            return None
+
+        count = len(services) if isinstance(services, list) else max(services.count("["), 1)
+        budget = cls.OUTPUT_BUDGET_SCALE * (
+            settings.llm_output_tokens_base + settings.llm_output_tokens_per_service * count
+        )
+        return min(int(budget), settings.llm_output_tokens_max)
+
+    def check_output_budget(self, message: Any, max_tokens: int | None) -> None:
+        """Reject a response cut by the output budget so that it follows the retry or error path
+
+        Args:
+            message (Any): the raw model response
+            max_tokens (int | None): the output budget of the generation
+
+        Raises:
+            ValidationError: the model stopped because the budget was exhausted
+        """
+
+        metadata = getattr(message, "response_metadata", None) or {}
+        if max_tokens is None or "length" not in (metadata.get("finish_reason"), metadata.get("done_reason")):
+            return
+
+        metrics.inc("llm_output_budget_exceeded_total", generator=type(self).__name__)
+        raise ValidationError(f"the response exceeded the output budget of {max_tokens} tokens")
+
+    @classmethod
+    def structured_output(cls) -> bool:
+        """Check if the generation uses the structured output mode: enabled in settings, an OUTPUT_SCHEMA
+        is declared and the provider supports structured output (checked once, falling back to text otherwise)
+
+        Returns:
+            bool: the structured output mode is used
+        """
+
+        if not settings.llm_structured_output or cls.OUTPUT_SCHEMA is None:
+            return False
+
+        if cls not in cls._structured_support:
+            try:
+                cls.get_chain(None, True)
+                cls._structured_support[cls] = True
+            except NotImplementedError:
+                cls._structured_support[cls] = False
+                metrics.inc("llm_structured_output_unsupported_total", generator=cls.__name__)
+
+        return cls._structured_support[cls]
+
+    @staticmethod
+    def response_content(resp: Any, structured: bool) -> str | dict[str, Any]:
+        """Extract the content to validate from a model response
+
+        Args:
+            resp (Any): the chain output, a message in text mode or the raw and parsed dict in structured mode
+            structured (bool): the response was produced in structured output mode
+
+        Raises:
+            ValidationError: the structured output does not match the schema
+
+        Returns:
+            str | dict[str, Any]: the text to parse or the already parsed output
+        """
+
+        if not structured:
+            return resp.text()
+
+        if resp.get("parsed") is None:
+            raise ValidationError(f"the output did not match the schema: {resp.get('parsing_error')}")
+
+        parsed = resp["parsed"]
+        return parsed.model_dump(exclude_none=True) if isinstance(parsed, BaseModel) else dict(parsed)
+
+    def count_attempt(self, structured: bool, retry: bool) -> None:
+        """Count a generation attempt per output mode, the retry rate of a mode being its retried attempts
+        over its first attempts
+
+        Args:
+            structured (bool): the attempt uses the structured output mode
+            retry (bool): the attempt regenerates a response that failed validation
+        """
+
+        metrics.inc(
+            "llm_generation_attempts_total",
+            generator=type(self).__name__,
+            mode="structured" if structured else "text",
+            retry=retry,
+        )
+
+    def prepare_retry(self, context: GenerationContext, error: ValidationError, attempt_seconds: float) -> None:
+        """Mark the context for the regeneration of a response that failed validation, unless it already is
+        a regeneration or it cannot complete before the request deadline (it is expected to take as long as
+        the attempt it replaces).
+
+        Below the strongest model tier, the regeneration escalates to the next tier instead
+
+        Args:
+            context (GenerationContext): the request-local state
+            error (ValidationError): the validation error of the attempt
+            attempt_seconds (float): the duration of the attempt
+
+        Raises:
+            InvalidModelResponse: the response of the regeneration failed validation as well
+            DeadlineExceeded: the remaining budget is shorter than the attempt
+        """
+
+        self.log_rejected(context, error.message, attempt_seconds)
+        escalate = context.tier < len(self.model_tiers()) - 1
+        if context.retry and not escalate:
+            raise InvalidModelResponse(error.message) from error
+
+        if context.deadline:
+            context.deadline.check("regeneration", attempt_seconds, error.message)
+
+        if escalate:
+            self.escalate(context, "invalid")
+
+        context.error = error.message
+        context.first_error = context.first_error or error.message
+
+    def prepare_escalation(self, context: GenerationContext, error: TierTimedOut, attempt_seconds: float) -> None:
+        """Mark the context for the next model tier after the tier timed out, unless it cannot complete before
+        the request deadline. The attempt is not a regeneration, as the next tier has no response to fix
+
+        Args:
+            context (GenerationContext): the request-local state
+            error (TierTimedOut): the timeout of the tier (only raised below the strongest tier)
+            attempt_seconds (float): the duration of the attempt
+
+        Raises:
+            DeadlineExceeded: the remaining budget is shorter than the attempt
+        """
+
+        self.log_rejected(context, error.message, attempt_seconds)
+        if context.deadline:
+            context.deadline.check("escalation", attempt_seconds, error.message)
+
+        self.escalate(context, "timeout")
+        context.first_error = context.first_error or error.message
+
+    def escalate(self, context: GenerationContext, reason: str) -> None:
+        """Move the context to the next model tier and count the escalation
+
+        Args:
+            context (GenerationContext): the request-local state, below the strongest tier
+            reason (str): invalid (the response failed validation) or timeout (the tier did not respond in time)
+        """
+
+        context.tier += 1
+        metrics.inc(
+            "llm_tier_escalations_total",
+            generator=type(self).__name__,
+            tier=self.model_tiers()[context.tier],
+            reason=reason,
+        )
+
+    def log_rejected(self, context: GenerationContext, error: str, attempt_seconds: float) -> None:
+        """Log a rejected generation attempt with its duration
+
+        Args:
+            context (GenerationContext): the request-local state
+            error (str): why the attempt was rejected
+            attempt_seconds (float): the duration of the attempt
+        """
+
+        generator = type(self).__name__
+        bind(generator=generator)
+        timing("generation", attempt_seconds)
+        logger.info(
+            "generation attempt rejected",
+            extra={
+                "generator": generator,
+                "attempt": context.usage.attempts,
+                "tier": self.model_tiers()[context.tier],
+                "seconds": round(attempt_seconds, 4),
+                "error": error,
+            },
+        )
+
+    def record_tier(self, context: GenerationContext, attempt_seconds: float) -> None:
+        """Count the generation as resolved by the model tier of its last attempt, with the latency of the attempt
+        and the tokens of the whole generation (the attempts of the lower tiers included), and log it
+
+        Args:
+            context (GenerationContext): the request-local state of the completed generation
+            attempt_seconds (float): the duration of the last attempt
+        """
+
+        generator, tier = type(self).__name__, self.model_tiers()[context.tier]
+        metrics.inc("llm_tier_resolved_total", generator=generator, tier=tier)
+        metrics.observe("llm_tier_seconds", attempt_seconds, generator=generator, tier=tier)
+        metrics.inc("llm_tier_tokens_total", context.usage.total_tokens, generator=generator, tier=tier)
+
+        bind(generator=generator)
+        timing("generation", attempt_seconds)
+        logger.info(
+            "generation completed",
+            extra={
+                "generator": generator,
+                "attempt": context.usage.attempts,
+                "tier": tier,
+                "seconds": round(attempt_seconds, 4),
+                "tokens": context.usage.total_tokens,
+            },
+        )
+
+    async def invoke_chain(
+        self, prompt_params: dict[str, Any], options: ChainOptions = ChainOptions(), deadline: Deadline | None = None
+    ) -> Any:
+        """Invoke the chain on the LLM backends pool, hedging slow attempts if enabled in settings.
+        The invocation is guarded by the circuit breaker which fails fast while the provider is down
+        and is cancelled once the request deadline expires, or the tier timeout below the strongest model tier.
+        Both timeouts are recorded by the breaker as failures (a hanging provider opens the circuit),
+        a cancellation (the client disconnected) is not
+
+        Args:
+            prompt_params (dict[str, Any]): the prompt params
+            options (ChainOptions): the output mode, budget, speculative candidate and model tier of the chain
+            deadline (Deadline | None): the request deadline, unbounded if None
+
+        Raises:
+            TimeoutError: a timeout of the invocation itself, unrelated to the tier timeout
+            TierTimedOut: the model tier did not respond within LLM_TIER_TIMEOUT
+            DeadlineExceeded: the request deadline expired before or during the invocation
+
+        Returns:
+            Any: the model response message, or the raw and parsed dict in structured mode
+        """
+
+        if deadline:
+            # an exhausted budget fails before the breaker, without a call to record
+            deadline.check("generation")
+
+        tier_timeout = settings.llm_tier_timeout if options.tier < len(self.model_tiers()) - 1 else None
+        try:
+            with circuit_breaker.guard():
+                async with asyncio.timeout(tier_timeout):
+                    async with deadline.bound("generation") if deadline else nullcontext():
+                        return await hedge_policy.run(lambda: self.invoke_backends(prompt_params, options))
+        except TimeoutError as err:
+            if tier_timeout is None:
+                raise
+
+            raise TierTimedOut(self.model_tiers()[options.tier], tier_timeout) from err
+
+    async def invoke_backends(self, prompt_params: dict[str, Any], options: ChainOptions = ChainOptions()) -> Any:
+        """Invoke the chain on the backend chosen by the routing strategy,
+        failing over to the other backends of the pool on errors or empty responses
+
+        Args:
+            prompt_params (dict[str, Any]): the prompt params
+            options (ChainOptions): the output mode, budget, speculative candidate and model tier of the chain
+
+        Raises:
+            ModelFailedToRespond: none of the backends produced a response
+
+        Returns:
+            Any: the model response message, or the raw and parsed dict in structured mode
+        """
+
+        error: Exception | None = None
+        for backend in backend_pool.candidates():
+            try:
+                with backend_pool.track(backend):
+                    resp = await self.call_model(backend.url, prompt_params, options)
+                    if not resp or not (resp.get("raw") if options.structured else resp.text()):
+                        raise ModelFailedToRespond()
+
+                return resp
+            except Exception as ex:  # pylint: disable=broad-exception-caught
+                error = ex
+
+        raise ModelFailedToRespond() from error
+
+    async def call_model(self, base_url: str | None, prompt_params: dict[str, Any], options: ChainOptions) -> Any:
+        """Invoke the chain of a backend, appending the call to the cassette in record mode
+
+        Args:
+            base_url (str | None): the backend serving the model
+            prompt_params (dict[str, Any]): the prompt params
+            options (ChainOptions): the output mode, budget, speculative candidate and model tier of the chain
+
+        Returns:
+            Any: the model response message, or the raw and parsed dict in structured mode
+        """
+
+        chain = self.get_chain(base_url, options.structured, options.max_tokens, options.candidate, options.tier)
+        if not settings.llm_record or settings.llm_provider == "replay":
+            return await chain.ainvoke(prompt_params)
+
+        messages = self.prompt_template().format_messages(**prompt_params)
+        key = cassette.key(messages, self.model_tiers()[options.tier], options.max_tokens, options.structured)
+        start = time.monotonic()
+        try:
+            resp = await chain.ainvoke(prompt_params)
+        except Exception as err:
+            await asyncio.to_thread(cassette.record, type(self).__name__, key, time.monotonic() - start, err)
+            raise
+
+        outcome = resp["raw"] if options.structured else resp
+        await asyncio.to_thread(cassette.record, type(self).__name__, key, time.monotonic() - start, outcome)
+        return resp
+
+    @classmethod
+    async def warmup(cls) -> None:
+        """Build the chains and send a tiny prompt to the models (all the tiers) on each backend so that
+        the providers load them in memory (also used as keep-alive ping).
+        Backends failing the warm-up are tracked as failed requests
+
+        Raises:
+            ModelFailedToRespond: none of the backends could be reached or responded
+        """
+
+        async def warmup_backend(backend: Backend) -> None:
+            with backend_pool.track(backend):
+                for tier in range(len(cls.model_tiers())):
+                    cls.get_chain(backend.url, tier=tier)
+                    if not await cls.get_model(backend.url, tier).ainvoke(cls.WARMUP_PROMPT):
+                        raise ModelFailedToRespond()
+
+        results = await asyncio.gather(
+            *[warmup_backend(backend) for backend in backend_pool.backends], return_exceptions=True
         )
+        if all(isinstance(result, Exception) for result in results):
+            raise ModelFailedToRespond()
 
     @classmethod
     def validate_params(cls, prompt_params: dict[str, Any]):
@@ -99,11 +609,13 @@ class AbstractGenerator(ABC):
         return
 
     @abstractmethod
-    def run(self, prompt_params: dict[str, Any]) -> list[LLMResponse]:
-        """LLM Generator interface, ensures the params are sent as a dynamic dictionary
+    async def run(self, prompt_params: dict[str, Any], context: GenerationContext | None = None) -> list[LLMResponse]:
+        """LLM Generator interface, ensures the params are sent as a dynamic dictionary.
+        The generators are shared between requests, any per-request state belongs in the context
 
         Args:
             prompt_params (dict[str, Any]): the params
+            context (GenerationContext | None): the request-local state, a new one if not given
 
         Returns:
             list[LLMResponse]: the generated files
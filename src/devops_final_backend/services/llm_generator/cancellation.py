@@ -0,0 +1,65 @@
+"""Client Disconnect Cancellation
+
+A generation whose client went away (closed browser, proxy timeout) is cancelled instead of running to completion.
+Cancelling the generation task propagates into the provider call, which closes the provider connection
+(stopping the model generation), skips the pending regeneration attempt and releases the backend, hedging and
+circuit breaker slots held by the attempt
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from typing import TypeVar
+
+from devops_final_backend.services.telemetry import metrics
+from devops_final_backend.settings import settings
+
+from .errors import GenerationCancelled
+
+T = TypeVar("T")
+
+
+async def cancel_on_disconnect(
+    generation: Awaitable[T],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    generator: str,
+    poll_interval: float | None = None,
+) -> T:
+    """Await the generation while polling the client connection, cancelling the generation once the client is gone
+
+    Args:
+        generation (Awaitable[T]): the generation coroutine
+        is_disconnected (Callable[[], Awaitable[bool]]): check of the client connection (like Request.is_disconnected)
+        generator (str): the generator name, used as metric label
+        poll_interval (float | None): seconds between the connection checks, the configured interval if None
+            (the connection is not checked if 0)
+
+    Raises:
+        GenerationCancelled: the client disconnected before the generation completed
+
+    Returns:
+        T: the generation result
+    """
+
+    interval = settings.llm_disconnect_poll_interval if poll_interval is None else poll_interval
+    task = asyncio.ensure_future(generation)
+    if interval <= 0:
+        return await task
+
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=interval)
+            if done:
+                return task.result()
+
+            if await is_disconnected():
+                break
+    finally:
+        # the request handler itself may be cancelled, the generation must not outlive it
+        task.cancel()
+
+    with suppress(asyncio.CancelledError):
+        await task
+
+    metrics.inc("llm_generation_cancelled_total", generator=generator)
+    raise GenerationCancelled()
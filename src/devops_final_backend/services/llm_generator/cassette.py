@@ -0,0 +1,282 @@
+"""LLM Record / Replay
+
+In record mode (LLM_RECORD) each model call of the generators is appended to a cassette (in a thread, off the event
+loop): a gzip compressed JSON lines file holding, per call, the key of the prompt messages and of the call options
+(model tier, output budget and output mode), the response message (content, token usage, finish reason) or the
+provider error, and the call latency.
+
+The replay provider (LLM_PROVIDER=replay) serves the recorded calls back from the cassette, waiting the recorded
+latency scaled by LLM_REPLAY_LATENCY_SCALE, so that benchmarks run on realistic model output without a model.
+A call is only replayed for the same prompt and options, and the calls recorded several times are replayed in turn
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+from collections import defaultdict
+from collections.abc import Sequence
+from pathlib import Path
+from threading import Lock
+from typing import Any
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel, ConfigDict
+
+from devops_final_backend.services.telemetry import metrics
+from devops_final_backend.settings import settings
+
+
+class ReplayMiss(LookupError):
+    """Raised by the replay provider for a prompt missing from the cassette"""
+
+
+class ReplayedError(RuntimeError):
+    """Raised by the replay provider for a call that failed when it was recorded"""
+
+
+class Cassette:
+    """On-disk record of the model calls, loaded on first replay"""
+
+    def __init__(self, path: str | Path):
+        """Init the cassette
+
+        Args:
+            path (str | Path): the cassette file
+        """
+
+        self.path = Path(path)
+        self._lock = Lock()
+        self._entries: dict[str, list[dict[str, Any]]] | None = None
+        self._cursors: defaultdict[str, int] = defaultdict(int)
+
+    @staticmethod
+    def key(messages: Sequence[BaseMessage], model: str, max_tokens: int | None, structured: bool) -> str:
+        """Identify a call by its prompt messages and the options changing the response
+
+        Args:
+            messages (Sequence[BaseMessage]): the prompt messages sent to the model
+            model (str): the model of the tier
+            max_tokens (int | None): the output token budget, None for the model's default limit
+            structured (bool): the call uses the structured output mode
+
+        Returns:
+            str: the call key
+        """
+
+        content = json.dumps(
+            {
+                "messages": [(message.type, message.content) for message in messages],
+                "model": model,
+                "max_tokens": max_tokens,
+                "structured": structured,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def record(self, generator: str, key: str, latency: float, outcome: AIMessage | Exception) -> None:
+        """Append a model call to the cassette (blocking, run in a thread)
+
+        Args:
+            generator (str): the generator that made the call
+            key (str): the call key (see key)
+            latency (float): the call duration in seconds
+            outcome (AIMessage | Exception): the response message, or the provider error if the call failed
+        """
+
+        entry: dict[str, Any] = {"key": key, "generator": generator, "latency": round(latency, 4)}
+        if isinstance(outcome, Exception):
+            entry["error"] = f"{type(outcome).__name__}: {outcome}"
+        else:
+            data = message_to_dict(outcome)
+            entry["message"] = {**data, "data": {k: v for k, v in data["data"].items() if v or k == "content"}}
+
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # each call is a gzip member of its own, the concatenated members read as a single stream
+            with open(self.path, "ab") as file:
+                file.write(gzip.compress(line))
+
+            if self._entries is not None:
+                self._entries[entry["key"]].append(entry)
+
+        metrics.inc("llm_cassette_recorded_total", generator=generator)
+
+    def load(self) -> dict[str, list[dict[str, Any]]]:
+        """Read the recorded calls, grouped by prompt key
+
+        Returns:
+            dict[str, list[dict[str, Any]]]: the calls of each prompt in recording order
+        """
+
+        with self._lock:
+            if self._entries is None:
+                entries: dict[str, list[dict[str, Any]]] = defaultdict(list)
+                if self.path.exists():
+                    with gzip.open(self.path, "rt", encoding="utf-8") as file:
+                        for line in file:
+                            entry = json.loads(line)
+                            entries[entry["key"]].append(entry)
+
+                self._entries = entries
+
+            return self._entries
+
+    def next(self, key: str) -> dict[str, Any]:
+        """Select the recorded call to replay, cycling through the calls recorded with the same key
+
+        Args:
+            key (str): the call key (see key)
+
+        Raises:
+            ReplayMiss: the prompt was never recorded with these options
+
+        Returns:
+            dict[str, Any]: the recorded call
+        """
+
+        if not (calls := self.load().get(key)):
+            metrics.inc("llm_replay_miss_total")
+            raise ReplayMiss(f"prompt {key[:12]} is not recorded in {self.path}")
+
+        with self._lock:
+            index = self._cursors[key] % len(calls)
+            self._cursors[key] += 1
+
+        return calls[index]
+
+
+class ReplayChatModel(BaseChatModel):
+    """Chat model answering from a cassette instead of a provider"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    cassette: Cassette
+    latency_scale: float = 1
+    model: str = ""
+    max_tokens: int | None = None
+    stop: list[str] | None = None
+    structured: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        """Provider name used by the langchain callbacks
+
+        Returns:
+            str: the provider name
+        """
+
+        return "replay"
+
+    def replay(self, messages: list[BaseMessage]) -> tuple[float, dict[str, Any]]:
+        """Select the recorded call of the prompt and options of the model
+        (blocking on the first call, which reads the cassette)
+
+        Args:
+            messages (list[BaseMessage]): the prompt messages
+
+        Returns:
+            tuple[float, dict[str, Any]]: the scaled latency to wait and the recorded call
+        """
+
+        call = self.cassette.next(self.cassette.key(messages, self.model, self.max_tokens, self.structured))
+        return call["latency"] * self.latency_scale, call
+
+    @staticmethod
+    def result(call: dict[str, Any]) -> ChatResult:
+        """Build the result of a recorded call
+
+        Args:
+            call (dict[str, Any]): the recorded call
+
+        Raises:
+            ReplayedError: the recorded call failed
+
+        Returns:
+            ChatResult: the recorded response
+        """
+
+        if "error" in call:
+            raise ReplayedError(call["error"])
+
+        return ChatResult(generations=[ChatGeneration(message=messages_from_dict([call["message"]])[0])])
+
+    def _generate(
+        self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        """Replay a call, blocking for its latency (the sync interface, the generators only use the async one)
+
+        Args:
+            messages (list[BaseMessage]): the prompt messages
+            stop (list[str] | None): ignored, the recorded response was already stopped
+            run_manager (Any): ignored
+            **kwargs (Any): ignored
+
+        Returns:
+            ChatResult: the recorded response
+        """
+
+        latency, call = self.replay(messages)
+        time.sleep(latency)
+        return self.result(call)
+
+    async def _agenerate(
+        self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        """Replay a call, waiting for its latency. The cassette is read in a thread
+
+        Args:
+            messages (list[BaseMessage]): the prompt messages
+            stop (list[str] | None): ignored, the recorded response was already stopped
+            run_manager (Any): ignored
+            **kwargs (Any): ignored
+
+        Returns:
+            ChatResult: the recorded response
+        """
+
+        latency, call = await asyncio.to_thread(self.replay, messages)
+        await asyncio.sleep(latency)
+        return self.result(call)
+
+    def with_structured_output(
+        self, schema: dict | type, *, include_raw: bool = False, **kwargs: Any
+    ) -> Runnable[Any, Any]:
+        """Parse the recorded responses of the structured output mode (tool call arguments or JSON content)
+
+        Args:
+            schema (dict | type): the pydantic output schema
+            include_raw (bool): return the raw message, the parsed output and the parsing error
+            **kwargs (Any): ignored, the output method was applied when recording
+
+        Returns:
+            Runnable[Any, Any]: the model followed by the parser
+        """
+
+        def parse(message: AIMessage) -> Any:
+            parsed, error = None, None
+            try:
+                data = message.tool_calls[0]["args"] if message.tool_calls else json.loads(str(message.content))
+                parsed = (
+                    schema.model_validate(data) if isinstance(schema, type) and issubclass(schema, BaseModel) else data
+                )
+            except ValueError as err:
+                error = err
+
+            if include_raw:
+                return {"raw": message, "parsed": parsed, "parsing_error": error}
+            if error is not None:
+                raise error
+
+            return parsed
+
+        return self.model_copy(update={"structured": True}) | RunnableLambda(parse)
+
+
+cassette = Cassette(settings.llm_cassette_path)
@@ -0,0 +1,202 @@
+"""LLM Provider Circuit Breaker
+
+The breaker tracks the outcome of the recent model invocations (a call slower than the slow call threshold counts
+as a failure, as does a call failed by a timeout, while a cancelled call is not recorded). When the failure rate
+exceeds the threshold the circuit opens and the calls are rejected immediately until the open period passes,
+then a single probe call is allowed (half-open) which closes or re-opens the circuit
+"""
+
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import Enum
+from threading import Lock
+from typing import Any
+
+from devops_final_backend.services.telemetry import metrics
+from devops_final_backend.settings import settings
+
+from .errors import ModelUnavailable
+
+WINDOW = 20
+
+
+class CircuitState(Enum):
+    """States of the circuit breaker"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass(frozen=True)
+class CircuitBreakerConfig:
+    """Circuit breaker thresholds
+
+    - enabled (bool): the breaker is active
+    - failure_rate (float): share of failed recent calls that opens the circuit
+    - min_calls (int): minimum number of recent calls before the failure rate is evaluated
+    - slow_call_seconds (float | None): calls slower than this count as failures, None to ignore latency
+    - open_seconds (float): how long the circuit stays open before a probe call is allowed
+    """
+
+    enabled: bool = True
+    failure_rate: float = 0.5
+    min_calls: int = 10
+    slow_call_seconds: float | None = 90
+    open_seconds: float = 30
+
+    @classmethod
+    def from_settings(cls) -> "CircuitBreakerConfig":
+        """Read the thresholds from settings
+
+        Returns:
+            CircuitBreakerConfig: the configuration
+        """
+
+        return cls(
+            settings.llm_breaker,
+            settings.llm_breaker_failure_rate,
+            settings.llm_breaker_min_calls,
+            settings.llm_breaker_slow_call_seconds,
+            settings.llm_breaker_open_seconds,
+        )
+
+
+class CircuitBreaker:
+    """Thread-safe failure rate and latency driven circuit breaker"""
+
+    def __init__(self, config: CircuitBreakerConfig):
+        """Init the closed breaker
+
+        Args:
+            config (CircuitBreakerConfig): the breaker thresholds
+        """
+
+        self.config = config
+        self.state = CircuitState.CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self._failures: deque[bool] = deque(maxlen=WINDOW)
+        self._lock = Lock()
+
+    def transition(self, state: CircuitState) -> None:
+        """Change the state (the lock must be held by the caller)
+
+        Args:
+            state (CircuitState): the new state
+        """
+
+        self.state = state
+        self.probing = False
+        if state == CircuitState.OPEN:
+            self.opened_at = time.monotonic()
+
+        if state == CircuitState.CLOSED:
+            self._failures.clear()
+
+        metrics.inc("llm_circuit_transitions_total", state=state.value)
+
+    def acquire(self) -> bool:
+        """Allow or reject a call
+
+        Raises:
+            ModelUnavailable: the circuit is open, or half-open with the probe call already in flight
+
+        Returns:
+            bool: the call is the half-open probe, whose outcome closes or re-opens the circuit
+        """
+
+        if not self.config.enabled:
+            return False
+
+        with self._lock:
+            if self.state == CircuitState.OPEN and time.monotonic() - self.opened_at >= self.config.open_seconds:
+                self.transition(CircuitState.HALF_OPEN)
+
+            if self.state == CircuitState.CLOSED:
+                return False
+
+            if self.state == CircuitState.HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+
+            metrics.inc("llm_circuit_rejected_total")
+            raise ModelUnavailable(max(self.config.open_seconds - (time.monotonic() - self.opened_at), 1))
+
+    def record(self, failed: bool, latency: float, probe: bool = False) -> None:
+        """Record the outcome of an allowed call. Only the probe decides the state of a half-open circuit,
+        the calls allowed before the circuit opened and completing after it are ignored
+
+        Args:
+            failed (bool): the call raised an error
+            latency (float): the call duration in seconds
+            probe (bool): the call is the half-open probe (see acquire)
+        """
+
+        if not self.config.enabled:
+            return
+
+        failed = failed or (self.config.slow_call_seconds is not None and latency > self.config.slow_call_seconds)
+        with self._lock:
+            if probe:
+                if self.state == CircuitState.HALF_OPEN:
+                    self.transition(CircuitState.OPEN if failed else CircuitState.CLOSED)
+                return
+
+            if self.state != CircuitState.CLOSED:
+                return
+
+            self._failures.append(failed)
+            if (
+                self.state == CircuitState.CLOSED
+                and len(self._failures) >= self.config.min_calls
+                and sum(self._failures) / len(self._failures) >= self.config.failure_rate
+            ):
+                self.transition(CircuitState.OPEN)
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """Acquire the breaker for a call and record its outcome, an error (timeouts included) as a failure.
+        A cancelled call (the client disconnected) is not recorded, it only releases the half-open probe slot
+        if it was the probe
+
+        Yields:
+            None: control to the call
+        """
+
+        probe = self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.record(True, time.monotonic() - start, probe)
+            raise
+        except BaseException:
+            if probe:
+                with self._lock:
+                    if self.state == CircuitState.HALF_OPEN:
+                        self.probing = False
+            raise
+
+        self.record(False, time.monotonic() - start, probe)
+
+    def stats(self) -> dict[str, Any]:
+        """Metrics view of the breaker
+
+        Returns:
+            dict[str, Any]: the breaker state and recent failure rate
+        """
+
+        with self._lock:
+            return {
+                "state": self.state.value,
+                "recent_calls": len(self._failures),
+                "recent_failures": sum(self._failures),
+            }
+
+
+circuit_breaker = CircuitBreaker(CircuitBreakerConfig.from_settings())
+metrics.register_collector("llm_circuit_breaker", circuit_breaker.stats)
@@ -1,16 +1,34 @@
 """Specialized Generator for Docker Compose"""
 
+import asyncio
+import time
+from copy import deepcopy
+from dataclasses import replace
 from typing import Any
 
-from yaml import YAMLError, safe_dump, safe_load
+from yaml import YAMLError, safe_load
 
-from .abstract_generator import AbstractGenerator
-from .errors import InvalidModelParameters, InvalidModelResponse, ModelFailedToRespond, ValidationError
-from .models import LLMResponse, ResponseType
+from devops_final_backend.services.image_catalog import image_catalog
+from devops_final_backend.services.telemetry import metrics
+from devops_final_backend.settings import settings
+
+from .abstract_generator import AbstractGenerator, ChainOptions
+from .compose_merger import compose_merger
+from .compose_validator import compose_validator
+from .context import GenerationContext
+from .errors import InvalidModelParameters, InvalidModelResponse, ModelFailedToRespond, TierTimedOut, ValidationError
+from .models import ComposeFile, LLMResponse, ResponseType
+from .offload import yaml_offload
+
+# rough characters per token of the prompts, to charge the candidates cancelled before any usage was reported
+CHARS_PER_TOKEN = 4
 
 
 class ComposeGenerator(AbstractGenerator):
-    """Specialized Generator for Docker Compose files which inherits constans and methods from the abstract parent"""
+    """Specialized Generator for Docker Compose files which inherits constans and methods from the abstract parent
+
+    The instance holds no per-request state and is shared by all the requests (see GenerationContext)
+    """
 
     TEMPERATURE = 0
     SYSTEM_PROMPT = """
@@ -36,15 +54,24 @@ class ComposeGenerator(AbstractGenerator):
     {additional_instructions}
     """
     TASK_PROMPT_PARAMS = ["network_name", "network_exists", "services", "volume_mount"]
-    TASK_PROMPT_RETRY = "The previous configuration was invalid because {error}. Regenerate the entire YAML"
+    TASK_PROMPT_RETRY = (
+        "The previous configuration was invalid because {error}. Fix all of them and regenerate the entire YAML"
+    )
+    TASK_PROMPT_EXISTING = (
+        "The stack already runs the services {services}. "
+        "Do not declare them again, reference them by name when the new services depend on them"
+    )
+    OUTPUT_SCHEMA = ComposeFile
 
     def __init__(self, dry_run: bool = False):
-        """Init the abstract generator and create an empty env store"""
-        super().__init__()
-        self.env_store: dict[str, dict] = {}
+        """Init the generator
+
+        Args:
+            dry_run (bool): return the dummy response instead of calling the model
+        """
         self.dry_run = dry_run
 
-    def run(self, prompt_params: dict[str, Any]) -> list[LLMResponse]:
+    async def run(self, prompt_params: dict[str, Any], context: GenerationContext | None = None) -> list[LLMResponse]:
         """
         Generate a Docker Compose file using a Large Language Model (LLM).
 
@@ -58,174 +85,674 @@ class ComposeGenerator(AbstractGenerator):
                 otherwise, a new network definition is created.
                 - volume_mount (bool): If True, volumes are mounted in Docker's default volume directory;
                 otherwise, they are mounted relative to the compose file location.
+            context (GenerationContext | None): the request-local state (env store, retry, token usage, deadline),
+                a new one if not given
 
         Raises:
             InvalidModelParams: If any expected parameters (as defined in TASK_PROMPT_PARAMS) are missing or invalid.
             ModelFailedToRespond: If the LLM fails to produce a response.
             InvalidModelResponse: If the response from the LLM fails validation.
+            DeadlineExceeded: If the request deadline expires during an attempt or cannot fit the regeneration.
 
         Returns:
             list[LLMResponse]: A list of responses containing the generated Docker Compose file content.
         """
 
-        result = []
+        context = context or GenerationContext()
         self.validate_params(prompt_params)
-        self.assign_param_defaults(prompt_params)
+        params = self.assign_param_defaults(prompt_params, context)
 
         if self.dry_run:
             return self.NO_RESPONSE
 
-        try:
-            resp = self.get_chain().invoke(prompt_params)
-        except Exception as ex:
-            raise ModelFailedToRespond() from ex
+        return await self.build_result(await self.generate(prompt_params, params, context), context)
+
+    async def generate(
+        self, prompt_params: dict[str, Any], params: dict[str, Any], context: GenerationContext
+    ) -> dict[str, Any]:
+        """Generate the parsed configuration, fanned out per service if enabled (see fan_out), regenerating
+        or escalating the rejected attempts. The files are not rendered, so that the configurations generated
+        to be merged are never dumped and parsed again
+
+        Args:
+            prompt_params (dict[str, Any]): the request values
+            params (dict[str, Any]): the prompt injectable params of the attempt
+            context (GenerationContext): the request-local state
 
-        if not resp or not resp.text():
-            raise ModelFailedToRespond()
+        Returns:
+            dict[str, Any]: the parsed configuration, its environment variables in the env store of the context
+        """
 
+        if self.fan_out_enabled(prompt_params["services"], context):
+            return await self.fan_out(prompt_params, params, context)
+
+        options = ChainOptions(
+            self.structured_output(), self.output_budget(prompt_params["services"]), tier=context.tier
+        )
+        start = time.monotonic()
         try:
-            parsed_data = self.parse_compose_config(resp.text(), prompt_params)
+            if context.candidates > 1 and not context.retry:
+                parsed_data = await self.speculate(params, options, context)
+            else:
+                self.count_attempt(options.structured, context.retry)
+                resp = await self.invoke_chain(params, options, context.deadline)
+                parsed_data = await self.validate_response(resp, params, options, context)
+        except TierTimedOut as err:
+            self.prepare_escalation(context, err, time.monotonic() - start)
+            return await self.generate(prompt_params, self.assign_param_defaults(prompt_params, context), context)
         except ValidationError as err:
-            if prompt_params.get("retry", False):
-                raise InvalidModelResponse(err.message) from err
+            self.prepare_retry(context, err, time.monotonic() - start)
+            return await self.generate(prompt_params, self.assign_param_defaults(prompt_params, context), context)
 
-            prompt_params["retry"] = True
-            prompt_params["error"] = err.message
-            return self.run(prompt_params)
+        self.record_tier(context, time.monotonic() - start)
+        return parsed_data
+
+    @staticmethod
+    async def build_result(parsed_data: dict, context: GenerationContext) -> list[LLMResponse]:
+        """Render the environment files of the env store and the compose file (offloaded if large, see YamlOffload)
+
+        Args:
+            parsed_data (dict): the parsed configuration
+            context (GenerationContext): the request-local state holding the env store
+
+        Returns:
+            list[LLMResponse]: the environment files followed by the compose file
+        """
 
+        *env_files, compose = await yaml_offload.dump_all([*context.env_store.values(), parsed_data])
         result = [
             LLMResponse(
                 type=ResponseType.ENV_FILE,
                 name=f".env.{key}",
-                data=safe_dump(val, sort_keys=False),
+                data=data,
             )
-            for key, val in self.env_store.items()
+            for key, data in zip(context.env_store, env_files)
         ]
 
         result.append(
             LLMResponse(
                 type=ResponseType.COMPOSE_FILE,
                 name="compose.yml",
-                data=safe_dump(parsed_data, sort_keys=False),
+                data=compose,
             )
         )
 
         return result
 
-    def assign_param_defaults(self, prompt_params: dict[str, Any]) -> None:
+    @staticmethod
+    def fan_out_enabled(services: list[str] | str, context: GenerationContext) -> bool:
+        """Check if a generation is split per service: fan-out generation is enabled in settings
+        from a minimum number of requested services, regenerations are never split
+
+        Args:
+            services (list[str] | str): the requested services
+            context (GenerationContext): the request-local state
+
+        Returns:
+            bool: the services are generated by parallel calls
+        """
+
+        minimum = settings.llm_fan_out_min_services
+        return bool(minimum) and not context.retry and isinstance(services, list) and len(services) >= max(minimum, 2)
+
+    async def fan_out(
+        self, prompt_params: dict[str, Any], params: dict[str, Any], context: GenerationContext
+    ) -> dict[str, Any]:
+        """Generate the block of each requested service (with its dependencies) by concurrent generations,
+        each validated and regenerated on its own, then merge the parsed blocks (see ComposeMerger).
+        The blocks defining a service differently than the block owning it are regenerated with the conflicts.
+        When the merged configuration is invalid, the blocks whose services are invalid in it (all the blocks
+        if the violations are not specific to services) are regenerated with the violations and merged again
+
+        Args:
+            prompt_params (dict[str, Any]): the request values
+            params (dict[str, Any]): the prompt injectable params, for the validation of the merged configuration
+            context (GenerationContext): the request-local state receiving the merged env store and the usage
+                of all the generations
+
+        Raises:
+            InvalidModelResponse: the merged configuration is still invalid after the regeneration of the blocks
+            DeadlineExceeded: the remaining budget is shorter than the fan-out, for the regeneration of the blocks
+
+        Returns:
+            dict[str, Any]: the merged configuration
+        """
+
+        services = prompt_params["services"]
+        contexts = [GenerationContext(deadline=context.deadline, candidates=context.candidates) for _ in services]
+        blocks: list[dict[str, Any]] = [{} for _ in services]
+        pending = list(range(len(services)))
+
+        start = time.monotonic()
+        try:
+            while True:
+                await self.generate_blocks(prompt_params, contexts, blocks, pending)
+
+                # the merge updates the services in place, the blocks are kept as generated for a new merge
+                parsed_data, context.env_store, conflicts = compose_merger.merge(
+                    [(deepcopy(block), block_context.env_store) for block, block_context in zip(blocks, contexts)],
+                    params["network_name"],
+                    [self.owned_services(block, service) for block, service in zip(blocks, services)],
+                )
+                if not (block_errors := self.block_errors(parsed_data, conflicts, blocks, params)):
+                    break
+
+                pending = sorted(block_errors)
+                for index in pending:
+                    self.prepare_retry(contexts[index], ValidationError(block_errors[index]), time.monotonic() - start)
+        finally:
+            for block_context in contexts:
+                context.usage.merge(block_context.usage)
+                context.first_error = context.first_error or block_context.first_error
+
+        generator = type(self).__name__
+        metrics.inc("llm_fan_out_total", generator=generator)
+        metrics.inc("llm_fan_out_calls_total", len(services), generator=generator)
+        metrics.observe("llm_fan_out_seconds", time.monotonic() - start, generator=generator)
+        return parsed_data
+
+    async def generate_blocks(
+        self,
+        prompt_params: dict[str, Any],
+        contexts: list[GenerationContext],
+        blocks: list[dict[str, Any]],
+        pending: list[int],
+    ) -> None:
+        """Generate blocks concurrently, cancelling the others once one fails
+
+        Args:
+            prompt_params (dict[str, Any]): the request values
+            contexts (list[GenerationContext]): the request-local state of each block
+            blocks (list[dict[str, Any]]): the parsed blocks in the requested services order, updated in place
+            pending (list[int]): the positions of the blocks to generate
+        """
+
+        services = prompt_params["services"]
+        block_params = [{**prompt_params, "services": [services[index]]} for index in pending]
+        tasks = [
+            asyncio.create_task(
+                self.generate(values, self.assign_param_defaults(values, contexts[index]), contexts[index])
+            )
+            for index, values in zip(pending, block_params)
+        ]
+        try:
+            for index, block in zip(pending, await asyncio.gather(*tasks)):
+                blocks[index] = block
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def owned_services(block: dict[str, Any], service: str) -> set[str]:
+        """Find the services of a block defining the requested service (not one of its dependencies),
+        named like its repository or running its image
+
+        Args:
+            block (dict[str, Any]): the parsed block
+            service (str): the requested service, like "postgres:13" or "quay.io/keycloak/keycloak"
+
+        Returns:
+            set[str]: the names of the services
+        """
+
+        repository = image_catalog.split(service)[0]
+        owned = set()
+        for name, values in (block.get("services") or {}).items():
+            image = values.get("image") if isinstance(values, dict) else None
+            if name.lower() == repository.rsplit("/", 1)[-1] or (
+                isinstance(image, str) and image_catalog.split(image)[0] == repository
+            ):
+                owned.add(name)
+
+        return owned
+
+    def block_errors(
+        self, parsed_data: dict[str, Any], conflicts: dict[int, list[str]], blocks: list[dict[str, Any]], params: dict
+    ) -> dict[int, str]:
+        """Find the blocks to regenerate after a merge: the blocks whose definitions conflict with the kept ones,
+        otherwise the blocks whose services are invalid in the merged configuration (all the blocks if the
+        violations are not specific to services)
+
+        Args:
+            parsed_data (dict[str, Any]): the merged configuration
+            conflicts (dict[int, list[str]]): the conflicts of the merge per block position
+            blocks (list[dict[str, Any]]): the parsed blocks, in the requested services order
+            params (dict): the prompt injectable params
+
+        Returns:
+            dict[int, str]: the error of each block to regenerate, empty if the merged configuration is valid
+        """
+
+        if conflicts:
+            return {index: "; ".join(values) for index, values in conflicts.items()}
+
+        if not (violations := compose_validator.validate(parsed_data, params)):
+            return {}
+
+        return dict.fromkeys(
+            self.invalid_blocks(parsed_data, blocks, params) or range(len(blocks)), "; ".join(violations)
+        )
+
+    @staticmethod
+    def invalid_blocks(parsed_data: dict[str, Any], blocks: list[dict[str, Any]], params: dict[str, Any]) -> list[int]:
+        """Find the blocks whose services are invalid in the merged configuration
+
+        Args:
+            parsed_data (dict[str, Any]): the merged configuration
+            blocks (list[dict[str, Any]]): the parsed blocks, in the requested services order
+            params (dict[str, Any]): the prompt injectable params
+
+        Returns:
+            list[int]: the positions of the invalid blocks
+        """
+
+        invalid = []
+        for index, block in enumerate(blocks):
+            names = [name for name in block.get("services") or {} if name in parsed_data["services"]]
+            services = {name: parsed_data["services"][name] for name in names}
+            if names and compose_validator.validate({**parsed_data, "services": services}, params):
+                invalid.append(index)
+
+        return invalid
+
+    async def update(
+        self, prompt_params: dict[str, Any], context: GenerationContext | None = None
+    ) -> list[LLMResponse]:
+        """Update an existing Docker Compose configuration: remove services and generate only the added services
+        (told about the existing ones), then merge them into the configuration (see ComposeMerger)
+
+        Args:
+            prompt_params (dict[str, Any]): the generation parameters (see run) with the update keys:
+                - compose (dict): the parsed existing compose file
+                - env_files (dict[str, dict]): the parsed existing environment files by file name
+                - services (list[str]): the services to add, may be empty
+                - remove (list[str]): the names of the services to remove
+            context (GenerationContext | None): the request-local state receiving the merged env store and the usage
+                of the generation, a new one if not given
+
+        Raises:
+            InvalidModelParameters: an environment element of the existing configuration is invalid
+            InvalidModelResponse: the updated configuration is invalid
+
+        Returns:
+            list[LLMResponse]: the environment files of the updated services followed by the updated compose file
+        """
+
+        context = context or GenerationContext()
+        self.validate_params(prompt_params)
+        if self.dry_run:
+            return self.NO_RESPONSE
+
+        document = compose_merger.remove(deepcopy(prompt_params["compose"]), prompt_params["remove"])
+        existing = GenerationContext(
+            env_store={
+                service: dict(prompt_params["env_files"].get(f".env.{service}") or {})
+                for service in document["services"]
+                if prompt_params["env_files"].get(f".env.{service}")
+            }
+        )
+
+        for service, values in document["services"].items():
+            if isinstance(values, dict) and (environment := values.pop("environment", None)):
+                existing.env_store.pop(service, None)
+                try:
+                    self.env_vars_extract(service, environment, existing)
+                except ValidationError as err:
+                    raise InvalidModelParameters([f"compose.services.{service}.environment"]) from err
+                values["env_file"] = f".env.{service}"
+
+        if prompt_params["services"]:
+            parsed_data = await self.merge_added(prompt_params, document, existing.env_store, context)
+        else:
+            parsed_data, context.env_store, _ = compose_merger.merge(
+                [(document, existing.env_store)], prompt_params["network_name"] or "demo_network"
+            )
+
+        # a removal only generates nothing, the remaining services are left as they were
+        params = self.assign_param_defaults(prompt_params, context) if prompt_params["services"] else None
+        if params and (violations := compose_validator.validate(parsed_data, params)):
+            raise InvalidModelResponse("; ".join(violations))
+
+        metrics.inc("llm_compose_updates_total", added=len(prompt_params["services"]))
+        return await self.build_result(parsed_data, context)
+
+    async def merge_added(
+        self,
+        prompt_params: dict[str, Any],
+        document: dict[str, Any],
+        env_store: dict[str, dict],
+        context: GenerationContext,
+    ) -> dict[str, Any]:
+        """Generate the services added by an update, telling the model about the existing services, and merge them
+        into the existing configuration. The existing services are kept over the different definitions of the same
+        names, the added services are then regenerated with the conflicts
+
+        Args:
+            prompt_params (dict[str, Any]): the update parameters (see update)
+            document (dict[str, Any]): the existing configuration without the removed services
+            env_store (dict[str, dict]): the environment variables of the existing services
+            context (GenerationContext): the request-local state of the update, receiving the merged env store
+                and the usage
+
+        Raises:
+            InvalidModelResponse: the regenerated services still conflict with the existing ones
+
+        Returns:
+            dict[str, Any]: the merged configuration
+        """
+
+        added = GenerationContext(deadline=context.deadline, candidates=context.candidates)
+        params = {
+            **{key: prompt_params[key] for key in self.TASK_PROMPT_PARAMS},
+            "existing_services": [f"{name}: {values.get('image')}" for name, values in document["services"].items()],
+        }
+        start = time.monotonic()
+        try:
+            while True:
+                block = await self.generate(params, self.assign_param_defaults(params, added), added)
+                # the merge updates the services in place, the existing configuration is kept for a new merge
+                parsed_data, context.env_store, conflicts = compose_merger.merge(
+                    [(deepcopy(document), env_store), (block, added.env_store)],
+                    prompt_params["network_name"] or "demo_network",
+                    [set(document["services"]), set()],
+                )
+                if not conflicts:
+                    return parsed_data
+
+                self.prepare_retry(added, ValidationError("; ".join(conflicts[1])), time.monotonic() - start)
+        finally:
+            context.usage.merge(added.usage)
+            context.first_error = context.first_error or added.first_error
+
+    async def speculate(self, params: dict[str, Any], options: ChainOptions, context: GenerationContext) -> dict:
+        """Generate the candidates of the first attempt concurrently (each sampled at its own temperature)
+        and validate them as they arrive. The first valid candidate is used and the others are cancelled
+
+        Args:
+            params (dict[str, Any]): the prompt injectable params
+            options (ChainOptions): the output mode and budget of the attempt
+            context (GenerationContext): the request-local state
+
+        Raises:
+            ValidationError: no candidate was valid (the last validation error, for the regeneration prompt)
+            Exception: no candidate was valid or invalid, the error of the first failed candidate
+                (TierTimedOut when the candidates did not respond in time, an unavailable tier)
+
+        Returns:
+            dict: the parsed configuration of the winning candidate
+        """
+
+        async def attempt(candidate: int) -> tuple[int, Any]:
+            self.count_attempt(options.structured, False)
+            return candidate, await self.invoke_chain(params, replace(options, candidate=candidate), context.deadline)
+
+        tasks = [asyncio.create_task(attempt(candidate)) for candidate in range(context.candidates)]
+        pending: set[asyncio.Future] = set(tasks)
+        recorded = (context.usage.attempts, context.usage.prompt_tokens)
+
+        invalid: ValidationError | None = None
+        failed: Exception | None = None
+        try:
+            # the original tasks are yielded in completion order
+            async for task in asyncio.as_completed(tasks):
+                pending.discard(task)
+                try:
+                    candidate, resp = await task
+                    parsed_data = await self.validate_response(resp, params, options, context)
+                except ValidationError as err:
+                    invalid = err
+                    continue
+                except Exception as err:  # pylint: disable=broad-exception-caught
+                    failed = failed or err
+                    continue
+
+                metrics.inc(
+                    "llm_speculative_wins_total",
+                    generator=type(self).__name__,
+                    position=len(tasks) - len(pending),
+                    candidate=candidate,
+                )
+                return parsed_data
+        finally:
+            self.cancel_candidates(pending, self.candidate_prompt_tokens(params, context, recorded), options, context)
+
+        metrics.inc("llm_speculative_lost_total", generator=type(self).__name__)
+        raise invalid or failed or ModelFailedToRespond()
+
+    def candidate_prompt_tokens(
+        self, params: dict[str, Any], context: GenerationContext, recorded: tuple[int, int]
+    ) -> int:
+        """Prompt tokens of a speculative candidate, all the candidates sharing the same prompt
+
+        Args:
+            params (dict[str, Any]): the prompt injectable params
+            context (GenerationContext): the request-local state
+            recorded (tuple[int, int]): the attempts and prompt tokens recorded before the candidates were requested
+
+        Returns:
+            int: the prompt tokens reported for the recorded candidates, or estimated from the prompt length
+                when no candidate responded
+        """
+
+        attempts = context.usage.attempts - recorded[0]
+        if attempts:
+            return (context.usage.prompt_tokens - recorded[1]) // attempts
+
+        messages = self.prompt_template().format_messages(**params)
+        return sum(len(str(message.content)) for message in messages) // CHARS_PER_TOKEN
+
+    @staticmethod
+    def cancel_candidates(
+        pending: set[asyncio.Future], prompt_tokens: int, options: ChainOptions, context: GenerationContext
+    ) -> None:
+        """Cancel the speculative candidates left once the winner is picked, and charge their usage: the provider
+        already processed their prompt (the full usage of the candidates that responded meanwhile)
+
+        Args:
+            pending (set[asyncio.Future]): the candidates not consumed
+            prompt_tokens (int): the prompt tokens of a candidate
+            options (ChainOptions): the output mode of the candidates
+            context (GenerationContext): the request-local state
+        """
+
+        for task in pending:
+            if not task.done():
+                task.cancel()
+                context.usage.record_cancelled(prompt_tokens, retry=context.retry)
+            elif not task.cancelled() and task.exception() is None:
+                _, resp = task.result()
+                context.usage.record(resp["raw"] if options.structured else resp, retry=context.retry)
+
+    async def validate_response(
+        self, resp: Any, params: dict[str, Any], options: ChainOptions, context: GenerationContext
+    ) -> dict:
+        """Record the token usage of a response, then check its output budget and parse it
+        (the YAML of a large response is loaded off the event loop, see YamlOffload)
+
+        Args:
+            resp (Any): the chain output
+            params (dict[str, Any]): the prompt injectable params
+            options (ChainOptions): the output mode and budget of the attempt
+            context (GenerationContext): the request-local state
+
+        Raises:
+            ValidationError: invalid yaml
+
+        Returns:
+            dict: the parsed configuration
+        """
+
+        message = resp["raw"] if options.structured else resp
+        context.usage.record(message, retry=context.retry)
+        self.check_output_budget(message, options.max_tokens)
+
+        content = self.response_content(resp, options.structured)
+        if isinstance(content, str):
+            try:
+                content = await yaml_offload.load(content)
+            except YAMLError as err:
+                raise ValidationError("safe_load could not load this yaml string") from err
+
+        return self.check_compose_config(content, params, context)
+
+    @staticmethod
+    def speculative_candidates(services: list[str], user_info: dict) -> int:
+        """Select the number of candidates of a generation: speculative generation is enabled in settings
+        for specific users (Keycloak sub or username) and for the service sets including specific services
+
+        Args:
+            services (list[str]): the requested services
+            user_info (dict): the Keycloak introspection result
+
+        Returns:
+            int: the number of candidates, 1 if speculative generation is not enabled for the request
+        """
+
+        users = set(settings.llm_speculative_users)
+        if users & {user_info.get("sub"), user_info.get("preferred_username")}:
+            return settings.llm_speculative_candidates
+
+        names = set(settings.llm_speculative_services)
+        if any(image_catalog.split(service)[0] in names for service in services):
+            return settings.llm_speculative_candidates
+
+        return 1
+
+    def assign_param_defaults(
+        self, prompt_params: dict[str, Any], context: GenerationContext | None = None
+    ) -> dict[str, Any]:
         """Transform the values of the prompt params into LLM prompt injectable stirngs
 
         Args:
-            prompt_params (dict[str, Any]): the values to be changed
+            prompt_params (dict[str, Any]): the request values, left unchanged
+            context (GenerationContext | None): the request-local state providing the retry error
 
         Raises:
             InvalidModelParameters: the services param is empty
+
+        Returns:
+            dict[str, Any]: a copy of the values ready to be injected in the prompt
         """
 
         if not prompt_params["services"]:
             raise InvalidModelParameters(["services"])
 
-        prompt_params["services"] = (
-            prompt_params["services"]
-            if isinstance(prompt_params["services"], str)
-            else ", ".join([f"[ {x} ]" for x in prompt_params["services"]])
+        params = dict(prompt_params)
+        params["services"] = (
+            params["services"]
+            if isinstance(params["services"], str)
+            else ", ".join([f"[ {x} ]" for x in params["services"]])
         )
 
-        prompt_params["network_name"] = prompt_params["network_name"] or "demo_network"
-        prompt_params["network_exists"] = (
-            prompt_params["network_exists"]
-            if isinstance(prompt_params["network_exists"], str)
+        params["network_name"] = params["network_name"] or "demo_network"
+        params["network_exists"] = (
+            params["network_exists"]
+            if isinstance(params["network_exists"], str)
             else (
                 "is an external network and should be marked as such"
-                if prompt_params["network_exists"]
+                if params["network_exists"]
                 else "does not exist and should be created"
             )
         )
 
-        prompt_params["volume_mount"] = (
-            prompt_params["volume_mount"]
-            if isinstance(prompt_params["volume_mount"], str)
+        params["volume_mount"] = (
+            params["volume_mount"]
+            if isinstance(params["volume_mount"], str)
             else (
                 "the default docker volume folder"
-                if prompt_params["volume_mount"]
+                if params["volume_mount"]
                 else "the local ./compose/[volume_name] folder"
             )
         )
 
-        prompt_params["additional_instructions"] = (
-            "" if "retry" not in prompt_params else self.TASK_PROMPT_RETRY.format(error=prompt_params["error"])
-        )
+        instructions = []
+        if existing := params.pop("existing_services", None):
+            instructions.append(self.TASK_PROMPT_EXISTING.format(services=", ".join(f"[ {x} ]" for x in existing)))
+        if context and context.retry:
+            instructions.append(self.TASK_PROMPT_RETRY.format(error=context.error))
+        params["additional_instructions"] = "\n".join(instructions)
+
+        return params
 
-    def parse_compose_config(self, content: str, params: dict) -> dict:
+    def parse_compose_config(self, content: str | dict, params: dict, context: GenerationContext) -> dict:
         """Parse the content as a docker compose file yaml and check that required elements
         (services, network) are declared
 
         Args:
-            content (str): the raw string as generated by the LLM
+            content (str | dict): the raw string as generated by the LLM,
+                or the already parsed dict in structured output mode
             params (dict): the llm generation parameters
+            context (GenerationContext): the request-local state whose env store is filled for this attempt
 
         Raises:
-            ValidationError: one of the following criteria is met
-
-                - invalid yaml
-                - networks element missing or empty
-                - services element missing or empty
-                - service image missing or empty
-                - service environmnet extraction failed
+            ValidationError: invalid yaml, or the compose validator found violations (see check_compose_config)
 
         Returns:
             dict: the parsed docker compose yaml as dict
         """
 
-        try:
-            data: dict = safe_load(content)
-        except YAMLError as err:
-            raise ValidationError("safe_load could not load this yaml string") from err
+        if isinstance(content, dict):
+            data = content
+        else:
+            try:
+                data = safe_load(content)
+            except YAMLError as err:
+                raise ValidationError("safe_load could not load this yaml string") from err
+
+        return self.check_compose_config(data, params, context)
 
-        if not data or not isinstance(data, dict):
-            raise ValidationError("empty yaml")
+    def check_compose_config(self, data: Any, params: dict, context: GenerationContext) -> dict:
+        """Check that the loaded docker compose configuration declares the required elements (services, network),
+        then extract its environment variables into the env store
 
-        if not (networks := data.get("networks", {})):
-            raise ValidationError("missing network configuration")
+        Args:
+            data (Any): the loaded yaml
+            params (dict): the llm generation parameters
+            context (GenerationContext): the request-local state whose env store is filled for this attempt
 
-        if params["network_name"] not in networks:
-            raise ValidationError("requested network name not present")
+        Raises:
+            ValidationError: the compose validator found violations (all reported at once):
+
+                - elements not matching the compose schema
+                - networks element missing or empty, requested network missing or not marked external
+                - services element missing or empty
+                - service image missing or empty, unknown tag of a catalog image (or unknown image in strict mode)
+                - invalid list environment elements
+                - volumes declared but empty
 
-        if params["network_exists"] == "is an external network and should be marked as such" and (
-            not networks.get(params["network_name"], {})
-            or networks.get(params["network_name"], {}).get("external", {}) is not True
-        ):
-            raise ValidationError("requested external network not marked as external")
+        Returns:
+            dict: the docker compose configuration
+        """
 
-        if not (services := data.get("services", None)):
-            raise ValidationError("missing services configuration")
+        if violations := compose_validator.validate(data, params):
+            raise ValidationError("; ".join(violations))
 
-        for service, values in services.items():
-            if not values.get("image", False):
-                raise ValidationError(f"missing image for service {service}")
+        context.env_store = {}
+        for service, values in data["services"].items():
+            if settings.image_catalog:
+                values["image"] = image_catalog.normalize(values["image"])
 
             if env := values.get("environment", {}):
-                self.env_vars_extract(service, env)
+                self.env_vars_extract(service, env, context)
                 data["services"][service].pop("environment")
                 data["services"][service]["env_file"] = f".env.{service}"
 
-        if "volumes" in data:
-            if not data.get("volumes", {}):
-                raise ValidationError("volumes declared but empty")
-
-            for volume, vol_params in data.get("volumes", {}).items():
-                if vol_params is None:
-                    data["volumes"][volume] = {}
+        for volume, vol_params in data.get("volumes", {}).items():
+            if vol_params is None:
+                data["volumes"][volume] = {}
 
         return data
 
-    def env_vars_extract(self, service: str, environment: dict[str, Any] | list[str]) -> None:
-        """Extract the environment variables of the service into a global env_store
+    def env_vars_extract(
+        self, service: str, environment: dict[str, Any] | list[str], context: GenerationContext
+    ) -> None:
+        """Extract the environment variables of the service into the request env store
         that will be used to generate separate environment files
 
         Args:
             service (str): the service name that will key the env store
             environment (dict[str, Any] | list[str]): the contents of the environment element
+            context (GenerationContext): the request-local state holding the env store
 
         Raises:
             ValidationError: one of the following criteria is met
@@ -233,15 +760,15 @@ class ComposeGenerator(AbstractGenerator):
                 - invalid environment format (if applicable)
         """
 
-        if not environment or not service or service in self.env_store:
+        if not environment or not service or service in context.env_store:
             raise ValidationError("empty environment or duplicated service environment")
 
         if not isinstance(environment, dict) and not isinstance(environment, list):
             raise ValidationError("environment must be dict or list")
 
-        self.env_store[service] = {}
+        context.env_store[service] = {}
         if isinstance(environment, dict):
-            self.env_store[service].update(environment)
+            context.env_store[service].update(environment)
             return
 
         for item in environment:
@@ -249,6 +776,9 @@ class ComposeGenerator(AbstractGenerator):
                 raise ValidationError(f"invalid list environment element: {item}")
 
             k, v = item.split("=", 1)
-            self.env_store[service][k] = v
+            context.env_store[service][k] = v
 
         return
+
+
+compose_generator = ComposeGenerator(settings.llm_dry_run)
@@ -0,0 +1,311 @@
+"""Docker Compose Merger
+
+Merges compose documents into a single document (the blocks generated per service by the fan-out generation,
+or an existing document and the services added to it), deterministically, in order.
+
+A service of a later document is kept once when an earlier document already defines it: under the same name
+with the same definition, or under another name with the same definition (image, ports, volumes, environment, ...
+all equal, like a postgres dependency generated by two blocks). The other names of a deduplicated service are
+rewritten in depends_on and added as aliases on the requested network, so that the hostnames used by the dependent
+services still resolve. The services of a single document are never deduplicated, so two services of an existing
+document sharing an image (two postgres:16 databases) are both kept.
+
+Two different definitions of a service name (or of a volume or network) are a conflict, never resolved by aliasing:
+the definition of the document owning the service (the block of the requested service, the existing document
+of an update) is kept, otherwise the first one, and the other document is reported to be generated again
+"""
+
+from typing import Any
+
+from devops_final_backend.services.telemetry import metrics
+
+# elements derived from the service name, ignored when comparing the definitions
+NAME_ELEMENTS = ("env_file", "container_name", "hostname")
+
+
+class ComposeMerger:
+    """Deterministic merge of per-service compose documents and their extracted environments"""
+
+    def merge(
+        self,
+        documents: list[tuple[dict[str, Any], dict[str, dict]]],
+        network: str,
+        owned: list[set[str]] | None = None,
+    ) -> tuple[dict[str, Any], dict[str, dict], dict[int, list[str]]]:
+        """Merge the documents
+
+        Args:
+            documents (list[tuple[dict[str, Any], dict[str, dict]]]): each parsed document and the environment
+                variables extracted per service, in the requested services order
+            network (str): the requested network, receiving the aliases of the deduplicated services
+            owned (list[set[str]] | None): the services owned by each document, whose definition is kept
+                over the different definitions of the same name by the other documents
+
+        Returns:
+            tuple[dict[str, Any], dict[str, dict], dict[int, list[str]]]: the merged document, the environment
+                variables per service and the conflicts of each document whose definitions were not kept
+        """
+
+        conflicts: dict[int, list[str]] = {}
+        services, env_store, aliases = self.merge_services(documents, owned or [set() for _ in documents], conflicts)
+        self.link(services, aliases, network)
+        sections = self.merge_sections(documents, conflicts)
+
+        merged: dict[str, Any] = {"services": services, "networks": sections["networks"]}
+        if sections["volumes"]:
+            merged["volumes"] = sections["volumes"]
+
+        if conflicts:
+            metrics.inc("llm_compose_merge_conflicts_total", sum(len(values) for values in conflicts.values()))
+
+        return merged, env_store, conflicts
+
+    def merge_services(
+        self,
+        documents: list[tuple[dict[str, Any], dict[str, dict]]],
+        owned: list[set[str]],
+        conflicts: dict[int, list[str]],
+    ) -> tuple[dict[str, dict[str, Any]], dict[str, dict], dict[str, str]]:
+        """Merge the services of the documents, keeping the first definition of the duplicated services.
+        Of two different definitions of a name, the one of the owning document is kept (see merge)
+
+        Args:
+            documents (list[tuple[dict[str, Any], dict[str, dict]]]): each parsed document and its environment
+            owned (list[set[str]]): the services owned by each document
+            conflicts (dict[int, list[str]]): receives the conflicts of each document whose definition was not kept
+
+        Returns:
+            tuple[dict[str, dict[str, Any]], dict[str, dict], dict[str, str]]: the kept services, their environment
+                variables and the kept service of each deduplicated service name
+        """
+
+        services: dict[str, dict[str, Any]] = {}
+        env_store: dict[str, dict] = {}
+        aliases: dict[str, str] = {}
+        # the position of the document of each kept service and its definition
+        definitions: dict[str, tuple[int, Any]] = {}
+
+        for position, (document, env) in enumerate(documents):
+            for name, service in (document.get("services") or {}).items():
+                definition = self.definition(service, env.get(name))
+                if name in definitions and definitions[name][1] != definition:
+                    if name not in owned[position] or name in owned[definitions[name][0]]:
+                        conflicts.setdefault(position, []).append(self.conflict(f"services.{name}"))
+                        continue
+
+                    conflicts.setdefault(definitions[name][0], []).append(self.conflict(f"services.{name}"))
+                elif kept := self.duplicate_of(name, definition, position, definitions):
+                    aliases[name] = kept
+                    continue
+
+                services[name] = service
+                definitions[name] = (position, definition)
+                env_store.pop(name, None)
+                if name in env:
+                    env_store[name] = env[name]
+
+        return services, env_store, aliases
+
+    def link(self, services: dict[str, dict[str, Any]], aliases: dict[str, str], network: str) -> None:
+        """Point the other names of the deduplicated services at the kept ones
+
+        Args:
+            services (dict[str, dict[str, Any]]): the kept services, updated in place
+            aliases (dict[str, str]): the kept service of each deduplicated service name
+            network (str): the requested network, receiving the aliases of the deduplicated services
+        """
+
+        for alias, kept in aliases.items():
+            if alias != kept:
+                self.add_alias(services[kept], network, alias)
+
+        for service in services.values():
+            self.rewrite_dependencies(service, aliases)
+
+        if aliases:
+            metrics.inc("llm_fan_out_deduplicated_total", len(aliases))
+
+    def merge_sections(
+        self, documents: list[tuple[dict[str, Any], dict[str, dict]]], conflicts: dict[int, list[str]]
+    ) -> dict[str, dict[str, Any]]:
+        """Unite the networks and volumes of the documents, reporting the different definitions of a name
+
+        Args:
+            documents (list[tuple[dict[str, Any], dict[str, dict]]]): each parsed document and its environment
+            conflicts (dict[int, list[str]]): the conflicts of each document, receiving the section conflicts
+
+        Returns:
+            dict[str, dict[str, Any]]: the networks and volumes
+        """
+
+        # the documents regenerated for their services are merged last, so that their sections lose the conflicts
+        positions = sorted(range(len(documents)), key=lambda position: position in conflicts)
+        sections: dict[str, dict[str, Any]] = {"networks": {}, "volumes": {}}
+        for section, elements in sections.items():
+            for position in positions:
+                for key, value in (documents[position][0].get(section) or {}).items():
+                    if key not in elements:
+                        elements[key] = value
+                    elif elements[key] != value:
+                        conflicts.setdefault(position, []).append(self.conflict(f"{section}.{key}"))
+
+        return sections
+
+    def remove(self, document: dict[str, Any], names: list[str]) -> dict[str, Any]:
+        """Remove services from a document, with the dependencies on them and the volumes only they used
+
+        Args:
+            document (dict[str, Any]): the parsed document, left unchanged
+            names (list[str]): the services to remove
+
+        Returns:
+            dict[str, Any]: the document without the services
+        """
+
+        services = {name: service for name, service in document["services"].items() if name not in names}
+        for service in services.values():
+            self.rewrite_dependencies(service, {}, set(names))
+
+        result = {**document, "services": services}
+        if volumes := document.get("volumes"):
+            used = {volume for service in services.values() for volume in self.named_volumes(service)}
+            removed = {volume for name in names for volume in self.named_volumes(document["services"][name])}
+            result["volumes"] = {
+                name: values for name, values in volumes.items() if name in used or name not in removed
+            }
+            if not result["volumes"]:
+                result.pop("volumes")
+
+        if names:
+            metrics.inc("llm_compose_removed_services_total", len(names))
+
+        return result
+
+    @staticmethod
+    def named_volumes(service: Any) -> set[str]:
+        """List the named volumes mounted by a service (short syntax 'name:/path' or long syntax source)
+
+        Args:
+            service (Any): the service definition
+
+        Returns:
+            set[str]: the volume names
+        """
+
+        volumes = service.get("volumes") if isinstance(service, dict) else None
+        names = set()
+        for volume in volumes or []:
+            source = volume.split(":", 1)[0] if isinstance(volume, str) and ":" in volume else None
+            if isinstance(volume, dict) and volume.get("type", "volume") == "volume":
+                source = volume.get("source")
+            if source and not source.startswith((".", "/", "~", "$")):
+                names.add(source)
+
+        return names
+
+    @staticmethod
+    def definition(service: Any, environment: dict | None) -> Any:
+        """Describe a service independently of its name, to compare it with the services of other documents
+
+        Args:
+            service (Any): the service definition
+            environment (dict | None): the environment variables extracted from the service
+
+        Returns:
+            Any: the definition without the name derived elements, with the extracted environment
+        """
+
+        if not isinstance(service, dict):
+            return service
+
+        values = {key: value for key, value in service.items() if key not in NAME_ELEMENTS}
+        return {**values, "environment": environment or values.get("environment")}
+
+    @staticmethod
+    def conflict(element: str) -> str:
+        """Describe an element defined differently by two documents
+
+        Args:
+            element (str): the element path
+
+        Returns:
+            str: the violation, telling the model how to fix the document
+        """
+
+        return f"{element} conflicts with another definition of the same name: define it identically or rename it"
+
+    @staticmethod
+    def duplicate_of(name: str, definition: Any, position: int, definitions: dict[str, tuple[int, Any]]) -> str | None:
+        """Find the already merged service a service duplicates
+
+        Args:
+            name (str): the service name
+            definition (Any): the service definition (see definition)
+            position (int): the position of the document of the service
+            definitions (dict[str, tuple[int, Any]]): the document position and definition of the merged services
+
+        Returns:
+            str | None: the name of the merged service, None if the service is not a duplicate
+        """
+
+        if name in definitions:
+            # the same name and definition, the different definitions are conflicts (see merge_services)
+            return name
+
+        # the services of the same document are never deduplicated
+        return next(
+            (kept for kept, (origin, values) in definitions.items() if origin < position and values == definition),
+            None,
+        )
+
+    @staticmethod
+    def add_alias(service: dict[str, Any], network: str, alias: str) -> None:
+        """Make a service reachable under another hostname on a network
+
+        Args:
+            service (dict[str, Any]): the service definition
+            network (str): the network
+            alias (str): the hostname
+        """
+
+        networks = service.get("networks") or [network]
+        if isinstance(networks, list):
+            networks = {name: None for name in networks}
+
+        entry = dict(networks.get(network) or {})
+        entry["aliases"] = sorted({*entry.get("aliases", []), alias})
+        service["networks"] = {**networks, network: entry}
+
+    @staticmethod
+    def rewrite_dependencies(service: Any, aliases: dict[str, str], removed: set[str] | None = None) -> None:
+        """Point the dependencies of a service at the kept services, without repeating a dependency
+
+        Args:
+            service (Any): the service definition
+            aliases (dict[str, str]): the kept service of each deduplicated service name
+            removed (set[str] | None): the removed services, dropped from the dependencies
+        """
+
+        if not isinstance(service, dict) or not (depends_on := service.get("depends_on")):
+            return
+
+        removed = removed or set()
+        rewritten: list[str] | dict[str, Any]
+        if isinstance(depends_on, list):
+            rewritten = list(dict.fromkeys(aliases.get(name) or name for name in depends_on if name not in removed))
+        elif isinstance(depends_on, dict):
+            conditions: dict[str, Any] = {}
+            for name, condition in depends_on.items():
+                if name not in removed:
+                    conditions.setdefault(aliases.get(name) or name, condition)
+            rewritten = conditions
+        else:
+            return
+
+        if rewritten:
+            service["depends_on"] = rewritten
+        else:
+            service.pop("depends_on")
+
+
+compose_merger = ComposeMerger()
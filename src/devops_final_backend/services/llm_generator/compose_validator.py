@@ -0,0 +1,197 @@
+"""Docker Compose Validation Engine
+
+The generated document is checked in a single pass against a schema of the compose spec (the subset of elements
+the generator produces, compiled once by pydantic) and against the semantic rules of the generation request.
+Every violation is reported, so a single regeneration prompt can address all of them
+"""
+
+from typing import Any
+
+from pydantic import BaseModel, TypeAdapter
+from pydantic import ValidationError as SchemaError
+
+from devops_final_backend.services.image_catalog import image_catalog
+from devops_final_backend.services.telemetry import logger, metrics
+from devops_final_backend.settings import settings
+
+EnvValue = str | int | float | bool | None
+EXTERNAL_NETWORK_TEXT = "is an external network and should be marked as such"
+
+
+class ServiceSpec(BaseModel, extra="allow"):
+    """Compose service element, presence rules are checked by the semantic pass"""
+
+    image: str | None = None
+    environment: dict[str, EnvValue] | list[str] | None = None
+    env_file: str | list[str] | None = None
+    command: str | list[str] | None = None
+    ports: list[str | int | dict[str, Any]] | None = None
+    volumes: list[str | dict[str, Any]] | None = None
+    networks: list[str] | dict[str, dict[str, Any] | None] | None = None
+    depends_on: list[str] | dict[str, dict[str, Any]] | None = None
+    restart: str | None = None
+
+
+class NetworkSpec(BaseModel, extra="allow"):
+    """Compose top level network element"""
+
+    external: bool | dict[str, Any] | None = None
+    driver: str | None = None
+    name: str | None = None
+
+
+class VolumeSpec(BaseModel, extra="allow"):
+    """Compose top level volume element"""
+
+    driver: str | None = None
+    driver_opts: dict[str, str | int] | None = None
+    external: bool | dict[str, Any] | None = None
+    name: str | None = None
+
+
+class ComposeSpec(BaseModel, extra="allow"):
+    """Compose document"""
+
+    services: dict[str, ServiceSpec] | None = None
+    networks: dict[str, NetworkSpec | None] | None = None
+    volumes: dict[str, VolumeSpec | None] | None = None
+
+
+class ComposeValidator:
+    """Validation of a parsed compose document against the compiled compose schema and the request rules"""
+
+    def __init__(self) -> None:
+        """Compile the compose schema"""
+        self.schema: TypeAdapter[ComposeSpec] = TypeAdapter(ComposeSpec)
+
+    def validate(self, data: Any, params: dict[str, Any]) -> list[str]:
+        """Collect all the violations of the document
+
+        Args:
+            data (Any): the parsed document
+            params (dict[str, Any]): the llm generation parameters (prompt injectable values)
+
+        Returns:
+            list[str]: the violations, empty if the document is valid
+        """
+
+        if not data or not isinstance(data, dict):
+            return ["empty yaml"]
+
+        return self.schema_violations(data) + self.semantic_violations(data, params)
+
+    def schema_violations(self, data: dict[str, Any]) -> list[str]:
+        """Check the element types against the compose schema
+
+        Args:
+            data (dict[str, Any]): the parsed document
+
+        Returns:
+            list[str]: one violation per invalid element
+        """
+
+        try:
+            self.schema.validate_python(data)
+        except SchemaError as err:
+            # union members report one error each, deduplicated by the path of the element in the document
+            paths = {self.element_path(data, error["loc"]) for error in err.errors()}
+            return [f"invalid {path}" for path in sorted(paths)]
+
+        return []
+
+    @staticmethod
+    def element_path(data: Any, loc: tuple[int | str, ...]) -> str:
+        """Render the path of an invalid element, skipping the union member names of the schema location
+
+        Args:
+            data (Any): the parsed document
+            loc (tuple[int | str, ...]): the schema error location
+
+        Returns:
+            str: the dotted path of the element in the document
+        """
+
+        path = []
+        for part in loc:
+            if (isinstance(data, dict) and part in data) or (
+                isinstance(data, list) and isinstance(part, int) and part < len(data)
+            ):
+                data = data[part]  # type: ignore[index]
+                path.append(str(part))
+
+        return ".".join(path)
+
+    def semantic_violations(self, data: dict[str, Any], params: dict[str, Any]) -> list[str]:
+        """Check the rules of the generation request: requested network, images (against the image catalog),
+        environment and volumes
+
+        Args:
+            data (dict[str, Any]): the parsed document
+            params (dict[str, Any]): the llm generation parameters (prompt injectable values)
+
+        Returns:
+            list[str]: the violations
+        """
+
+        violations = []
+        networks = data.get("networks") or {}
+        if not isinstance(networks, dict) or not networks:
+            violations.append("missing network configuration")
+        elif params["network_name"] not in networks:
+            violations.append("requested network name not present")
+        elif params["network_exists"] == EXTERNAL_NETWORK_TEXT and (
+            not isinstance(network := networks[params["network_name"]], dict) or network.get("external") is not True
+        ):
+            violations.append("requested external network not marked as external")
+
+        services = data.get("services") or {}
+        if not isinstance(services, dict) or not services:
+            violations.append("missing services configuration")
+            services = {}
+
+        for service, values in services.items():
+            if not isinstance(values, dict):
+                continue
+
+            if not values.get("image"):
+                violations.append(f"missing image for service {service}")
+            elif settings.image_catalog and isinstance(values["image"], str):
+                if error := self.image_violation(service, values["image"]):
+                    violations.append(error)
+
+            environment = values.get("environment")
+            if isinstance(environment, list) and (
+                invalid := [str(item) for item in environment if "=" not in str(item)]
+            ):
+                violations.append(f"invalid list environment elements for service {service}: {', '.join(invalid)}")
+
+        if "volumes" in data and not data["volumes"]:
+            violations.append("volumes declared but empty")
+
+        return violations
+
+    @staticmethod
+    def image_violation(service: str, image: str) -> str | None:
+        """Check the image of a service against the image catalog. The catalog is a snapshot, so an image or tag
+        missing from it (like a release newer than the snapshot) is only logged unless IMAGE_CATALOG_STRICT is set
+
+        Args:
+            service (str): the service name
+            image (str): the image reference
+
+        Returns:
+            str | None: the violation, None if the image is known or the catalog is not strict
+        """
+
+        if not (finding := image_catalog.check(image)):
+            return None
+
+        if settings.image_catalog_strict:
+            return f"{finding} for service {service}"
+
+        metrics.inc("image_catalog_unknown_total")
+        logger.info("image not in the catalog", extra={"service": service, "finding": finding})
+        return None
+
+
+compose_validator = ComposeValidator()
@@ -0,0 +1,39 @@
+"""Request-Local Generation State
+
+The generators are shared by all the requests of a worker and hold no per-request state:
+everything a generation accumulates over its attempts lives in the context passed to run()
+"""
+
+from dataclasses import dataclass, field
+
+from devops_final_backend.services.deadline import Deadline
+
+from .usage import TokenUsage
+
+
+@dataclass
+class GenerationContext:
+    """State of a single generation request
+
+    Attributes:
+        error (str | None): the validation error of the previous attempt, set for the regeneration
+        first_error (str | None): the error that caused the first regeneration or tier escalation
+        env_store (dict[str, dict]): the environment variables extracted per service by the current attempt
+        usage (TokenUsage): the LLM tokens consumed by all the attempts
+        deadline (Deadline | None): the request deadline bounding the attempts, unbounded if None
+        candidates (int): the candidates generated concurrently by the first attempt, the first valid one is used
+        tier (int): the model tier of the current attempt (see LLM_MODEL_TIERS), escalated on failure
+    """
+
+    error: str | None = None
+    first_error: str | None = None
+    env_store: dict[str, dict] = field(default_factory=dict)
+    usage: TokenUsage = field(default_factory=TokenUsage)
+    deadline: Deadline | None = None
+    candidates: int = 1
+    tier: int = 0
+
+    @property
+    def retry(self) -> bool:
+        """The current attempt regenerates a response that failed validation"""
+        return self.error is not None
@@ -36,6 +36,27 @@ class ModelFailedToRespond(LLMError):
         super().__init__("The model failed to respond")
 
 
+class ModelUnavailable(LLMError):
+    """Raised without calling the model while the circuit breaker is open (the model recently failed too often)"""
+
+    def __init__(self, retry_after: float):
+        """Init with preformated message and the time until the model is attempted again
+
+        Args:
+            retry_after (float): seconds until the circuit breaker allows a new attempt
+        """
+        self.retry_after = retry_after
+        super().__init__("The model is temporarily unavailable")
+
+
+class GenerationCancelled(LLMError):
+    """Raised when the client disconnected before the generation completed, the generation is cancelled"""
+
+    def __init__(self):
+        """Init with preformated message"""
+        super().__init__("The client disconnected before the generation completed")
+
+
 class InvalidModelParameters(LLMError):
     """Raised when pre-generation params validation fails (like missing variables required by templates)"""
 
@@ -70,3 +91,17 @@ class ValidationError(LLMError):
             error (str): the error message produced by the validation function
         """
         super().__init__(f"The response generated failed validation: {error}")
+
+
+class TierTimedOut(LLMError):
+    """Raised when a model tier below the strongest one did not respond in time. The tier is unavailable rather
+    than its response invalid: the generation escalates to the next tier without regenerating"""
+
+    def __init__(self, model: str, timeout: float):
+        """Init with a pre-formated error description
+
+        Args:
+            model (str): the model of the tier
+            timeout (float): the tier timeout in seconds
+        """
+        super().__init__(f"the model {model} did not respond within {timeout} seconds")
@@ -0,0 +1,141 @@
+"""LLM Request Hedging
+
+If an attempt did not finish within the hedge delay (fixed, or the observed latency quantile of the recent attempts),
+a duplicate attempt is launched (the routing strategy sends it to the least loaded backend), the first successful
+result wins and the other attempt is cancelled. The share of hedged requests is capped to keep the extra load bounded
+"""
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any, TypeVar
+
+from devops_final_backend.services.telemetry import metrics
+from devops_final_backend.settings import settings
+
+T = TypeVar("T")
+
+MIN_SAMPLES = 20
+WINDOW = 200
+
+
+class HedgePolicy:
+    """Decides when a duplicate attempt is launched and runs the attempts race"""
+
+    def __init__(self, enabled: bool, delay: float | None, quantile: float, max_rate: float):
+        """Init the policy
+
+        Args:
+            enabled (bool): hedging is active
+            delay (float | None): fixed hedge delay in seconds, None to use the observed latency quantile
+            quantile (float): the latency quantile used as delay when no fixed delay is set (like 0.9 for p90)
+            max_rate (float): the maximum share of recent requests that can be hedged
+        """
+
+        self.enabled = enabled
+        self.delay = delay
+        self.quantile = quantile
+        self.max_rate = max_rate
+        self._latencies: deque[float] = deque(maxlen=WINDOW)
+        self._hedged: deque[bool] = deque(maxlen=WINDOW)
+
+    @classmethod
+    def from_settings(cls) -> "HedgePolicy":
+        """Build the policy as configured in settings
+
+        Returns:
+            HedgePolicy: the policy instance
+        """
+
+        return cls(
+            settings.llm_hedging,
+            settings.llm_hedge_delay,
+            settings.llm_hedge_quantile,
+            settings.llm_hedge_max_rate,
+        )
+
+    def hedge_delay(self) -> float | None:
+        """The time to wait for the first attempt before hedging
+
+        Returns:
+            float | None: the delay in seconds, None if there are not enough latency samples yet
+        """
+
+        if self.delay is not None:
+            return self.delay
+
+        if len(self._latencies) < MIN_SAMPLES:
+            return None
+
+        latencies = sorted(self._latencies)
+        return latencies[min(int(len(latencies) * self.quantile), len(latencies) - 1)]
+
+    def can_hedge(self) -> bool:
+        """Check the hedge rate cap over the recent requests
+
+        Returns:
+            bool: True if another hedge is allowed
+        """
+
+        return sum(self._hedged) < self.max_rate * max(len(self._hedged), 1)
+
+    async def timed(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        """Run an attempt and record its latency if it succeeds
+
+        Args:
+            attempt (Callable[[], Awaitable[T]]): the attempt factory
+
+        Returns:
+            T: the attempt result
+        """
+
+        start = time.monotonic()
+        result = await attempt()
+        self._latencies.append(time.monotonic() - start)
+        return result
+
+    async def run(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        """Run the attempt, hedging it if it is slower than the hedge delay
+
+        Args:
+            attempt (Callable[[], Awaitable[T]]): factory of the attempt coroutine, called once per attempt
+
+        Raises:
+            Exception: the error of the first attempt if all attempts failed
+
+        Returns:
+            T: the result of the first successful attempt
+        """
+
+        primary = asyncio.create_task(self.timed(attempt))
+        tasks: list[asyncio.Task[Any]] = [primary]
+
+        try:
+            delay = self.hedge_delay() if self.enabled else None
+            if delay is not None:
+                await asyncio.wait(tasks, timeout=delay)
+
+            if delay is None or primary.done() or not self.can_hedge():
+                self._hedged.append(False)
+                return await primary
+
+            self._hedged.append(True)
+            metrics.inc("llm_hedge_total")
+            tasks.append(asyncio.create_task(self.timed(attempt)))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        metrics.inc("llm_hedge_won_total", attempt="hedge" if task is not primary else "primary")
+                        return task.result()
+
+            raise primary.exception() or RuntimeError("hedged attempts failed")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+hedge_policy = HedgePolicy.from_settings()
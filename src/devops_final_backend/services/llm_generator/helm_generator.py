@@ -0,0 +1,67 @@
+"""Specialized Generator for Helm Charts"""
+
+from typing import Any
+
+from yaml import YAMLError, safe_load
+
+from .errors import ValidationError
+from .models import ResponseType
+from .multi_file_generator import MultiFileGenerator
+
+
+class HelmGenerator(MultiFileGenerator):
+    """Specialized Generator for Helm charts deploying the requested services on Kubernetes"""
+
+    TEMPERATURE = 0
+    SYSTEM_PROMPT = """
+    You are a senior DevOps engineer.
+    Always generate valid Helm charts exactly in the requested format.
+    Do not include comments, explanations, or extra text.
+    Use the latest official image for the specified software and version
+    """
+    TASK_PROMPT_TEMPLATE = """
+    Generate a Helm chart (apiVersion v2) deploying the following services: {services}
+    at the specified versions with any additional dependent services required at latest major version known
+    if not specified. The chart must contain Chart.yaml, values.yaml and a Deployment and a Service template
+    in the templates folder for each service, with the images and the environment variables declared in values.yaml.
+    Deploy all the resources in the namespace '{network_name}' which {network_exists}.
+    For the services that need persistent storage {volume_mount}.
+    {additional_instructions}
+    """
+    RESPONSE_TYPE = ResponseType.HELM_FILE
+    NETWORK_EXISTS_TEXT = ("does not exist and should be created by a Namespace template", "already exists")
+    VOLUME_MOUNT_TEXT = (
+        "declare hostPath volumes under the ./compose/[volume_name] folder",
+        "declare PersistentVolumeClaims using the default storage class",
+    )
+    OUTPUT_BUDGET_SCALE = 3
+
+    def validate_files(self, files: dict[str, str], params: dict[str, Any]) -> None:
+        """Check that the chart has a valid Chart.yaml, a values.yaml and templates
+
+        Args:
+            files (dict[str, str]): the generated files
+            params (dict[str, Any]): the llm generation parameters
+
+        Raises:
+            ValidationError: one of the following criteria is met
+
+                - Chart.yaml missing, invalid or without apiVersion, name and version
+                - values.yaml missing or invalid
+                - no template declared
+        """
+
+        try:
+            chart = safe_load(files.get("Chart.yaml", ""))
+            values = safe_load(files.get("values.yaml", ""))
+        except YAMLError as err:
+            raise ValidationError("Chart.yaml or values.yaml is not valid yaml") from err
+
+        if not isinstance(chart, dict) or not all(chart.get(key) for key in ("apiVersion", "name", "version")):
+            raise ValidationError("Chart.yaml missing or without apiVersion, name and version")
+
+        if not isinstance(values, dict):
+            raise ValidationError("values.yaml missing or not a mapping")
+
+        if not any(name.startswith("templates/") for name in files):
+            raise ValidationError("no templates declared")
@@ -5,7 +5,7 @@ These data types are abstractions of what a specialized model could return
 
 from enum import Enum, auto
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class ResponseType(Enum):
@@ -14,6 +14,8 @@ class ResponseType(Enum):
     NO_RESPONSE = auto()
     ENV_FILE = auto()
     COMPOSE_FILE = auto()
+    HELM_FILE = auto()
+    TERRAFORM_FILE = auto()
 
 
 class LLMResponse(BaseModel):
@@ -22,3 +24,56 @@ class LLMResponse(BaseModel):
     type: ResponseType
     name: str
     data: str
+
+
+class StageStatus(Enum):
+    """Outcome of a pipeline stage"""
+
+    OK = "ok"
+    FAILED = "failed"
+
+
+class PipelineStageResult(BaseModel):
+    """Result of a single artifact generation within a pipeline"""
+
+    artifact: str
+    status: StageStatus
+    duration: float
+    tokens: int = 0
+    files: list[LLMResponse] = []
+    error: str | None = None
+
+
+class ComposeService(BaseModel):
+    """Docker Compose service as requested from models with structured output"""
+
+    image: str
+    environment: dict[str, str] | None = None
+    command: str | None = None
+    ports: list[str] | None = None
+    volumes: list[str] | None = None
+    networks: list[str] = Field(..., description="Networks the service is attached to")
+    depends_on: list[str] | None = None
+    restart: str | None = None
+
+
+class ComposeNetwork(BaseModel):
+    """Docker Compose network as requested from models with structured output"""
+
+    external: bool | None = None
+    driver: str | None = None
+
+
+class ComposeVolume(BaseModel):
+    """Docker Compose volume as requested from models with structured output"""
+
+    driver: str | None = None
+    driver_opts: dict[str, str] | None = None
+
+
+class ComposeFile(BaseModel):
+    """Docker Compose file schema passed to the models with structured output (JSON schema or tool calling)"""
+
+    services: dict[str, ComposeService]
+    networks: dict[str, ComposeNetwork]
+    volumes: dict[str, ComposeVolume] | None = None
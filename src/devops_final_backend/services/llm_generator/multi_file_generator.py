@@ -0,0 +1,164 @@
+"""Abstract generator for artifacts made of multiple files (like a Helm chart or a Terraform module)
+
+The model is asked for a YAML mapping of file paths to file contents, which is parsed and validated by the
+specialized generator. An invalid response is regenerated once with the validation error in the prompt
+"""
+
+import time
+from abc import abstractmethod
+from typing import Any
+
+from yaml import YAMLError, safe_load
+
+from .abstract_generator import AbstractGenerator, ChainOptions
+from .context import GenerationContext
+from .errors import InvalidModelParameters, TierTimedOut, ValidationError
+from .models import LLMResponse, ResponseType
+
+
+class MultiFileGenerator(AbstractGenerator):
+    """Generator whose output is a set of files, sharing the generation parameters of the compose generator
+
+    Class Constants:
+
+    - RESPONSE_TYPE (ResponseType): the type of the generated files
+    - NETWORK_EXISTS_TEXT (tuple[str, str]): prompt text for a new and for an existing network
+    - VOLUME_MOUNT_TEXT (tuple[str, str]): prompt text for local and for default volume storage
+    """
+
+    RESPONSE_TYPE: ResponseType
+    NETWORK_EXISTS_TEXT: tuple[str, str]
+    VOLUME_MOUNT_TEXT: tuple[str, str]
+    FILE_MAP_INSTRUCTIONS = (
+        "Return only a YAML mapping without code blocks where each key is a file path "
+        "and each value is the full file content as a literal block scalar (|)."
+    )
+    TASK_PROMPT_PARAMS = ["network_name", "network_exists", "services", "volume_mount"]
+    TASK_PROMPT_RETRY = "The previous files were invalid because {error}. Regenerate all the files"
+
+    def __init__(self, dry_run: bool = False):
+        """Init the generator
+
+        Args:
+            dry_run (bool): return the dummy response instead of calling the model
+        """
+        self.dry_run = dry_run
+
+    async def run(self, prompt_params: dict[str, Any], context: GenerationContext | None = None) -> list[LLMResponse]:
+        """Generate the files using the LLM, regenerating once if the response fails validation
+
+        Args:
+            prompt_params (dict[str, Any]): the same parameters as the compose generator
+                (services, network_name, network_exists, volume_mount)
+            context (GenerationContext | None): the request-local state (retry, token usage, deadline),
+                a new one if not given
+
+        Raises:
+            InvalidModelResponse: If the response from the LLM fails validation after the retry
+            DeadlineExceeded: If the request deadline expires during an attempt or cannot fit the regeneration
+
+        Returns:
+            list[LLMResponse]: the generated files
+        """
+
+        context = context or GenerationContext()
+        self.validate_params(prompt_params)
+        if self.dry_run:
+            return self.NO_RESPONSE
+
+        params = self.assign_param_defaults(prompt_params, context)
+        max_tokens = self.output_budget(prompt_params["services"])
+        self.count_attempt(False, context.retry)
+        start = time.monotonic()
+        try:
+            resp = await self.invoke_chain(
+                params, ChainOptions(max_tokens=max_tokens, tier=context.tier), context.deadline
+            )
+            context.usage.record(resp, retry=context.retry)
+            self.check_output_budget(resp, max_tokens)
+            files = self.parse_files(resp.text())
+            self.validate_files(files, params)
+        except ValidationError as err:
+            self.prepare_retry(context, err, time.monotonic() - start)
+            return await self.run(prompt_params, context)
+        except TierTimedOut as err:
+            self.prepare_escalation(context, err, time.monotonic() - start)
+            return await self.run(prompt_params, context)
+
+        self.record_tier(context, time.monotonic() - start)
+        return [LLMResponse(type=self.RESPONSE_TYPE, name=name, data=data) for name, data in files.items()]
+
+    def assign_param_defaults(self, prompt_params: dict[str, Any], context: GenerationContext) -> dict[str, Any]:
+        """Transform the values of the prompt params into LLM prompt injectable strings
+
+        Args:
+            prompt_params (dict[str, Any]): the request values, left unchanged
+            context (GenerationContext): the request-local state providing the retry error
+
+        Raises:
+            InvalidModelParameters: the services param is empty
+
+        Returns:
+            dict[str, Any]: a copy of the values ready to be injected in the prompt
+        """
+
+        if not prompt_params["services"]:
+            raise InvalidModelParameters(["services"])
+
+        params = dict(prompt_params)
+        if not isinstance(params["services"], str):
+            params["services"] = ", ".join([f"[ {x} ]" for x in params["services"]])
+
+        params["network_name"] = params["network_name"] or "demo_network"
+
+        if not isinstance(params["network_exists"], str):
+            params["network_exists"] = self.NETWORK_EXISTS_TEXT[bool(params["network_exists"])]
+
+        if not isinstance(params["volume_mount"], str):
+            params["volume_mount"] = self.VOLUME_MOUNT_TEXT[bool(params["volume_mount"])]
+
+        params["additional_instructions"] = " ".join(
+            [self.FILE_MAP_INSTRUCTIONS]
+            + ([self.TASK_PROMPT_RETRY.format(error=context.error)] if context.retry else [])
+        )
+
+        return params
+
+    @staticmethod
+    def parse_files(content: str) -> dict[str, str]:
+        """Parse the response as a mapping of file paths to file contents
+
+        Args:
+            content (str): the raw string as generated by the LLM
+
+        Raises:
+            ValidationError: the content is not a yaml mapping of strings
+
+        Returns:
+            dict[str, str]: the files
+        """
+
+        try:
+            files = safe_load(content)
+        except YAMLError as err:
+            raise ValidationError("safe_load could not load the files mapping") from err
+
+        if not files or not isinstance(files, dict):
+            raise ValidationError("the response is not a mapping of files")
+
+        if not all(isinstance(name, str) and isinstance(data, str) for name, data in files.items()):
+            raise ValidationError("each file must be a path with a text content")
+
+        return files
+
+    @abstractmethod
+    def validate_files(self, files: dict[str, str], params: dict[str, Any]) -> None:
+        """Check the generated files
+
+        Args:
+            files (dict[str, str]): the generated files
+            params (dict[str, Any]): the llm generation parameters
+
+        Raises:
+            ValidationError: the files are not a valid artifact
+        """
@@ -0,0 +1,148 @@
+"""YAML Offload
+
+Parsing and dumping the YAML of large generated stacks is pure CPU work that blocks the event loop for all the
+requests of the worker. Below YAML_OFFLOAD_THRESHOLD characters the documents are processed inline (the pool
+round trip costs more than the work), above it they are processed in a thread or process pool
+(YAML_OFFLOAD_EXECUTOR) of YAML_OFFLOAD_WORKERS workers, created on first use in each worker process. The documents
+to dump are sized from their keys and values (see estimated_size), a parsed document from the length of its YAML
+string.
+
+The same PyYAML functions run in all the modes, so the results are identical. The pure Python PyYAML mostly holds
+the GIL: the thread pool lets the event loop interleave with the work, the process pool runs it in parallel at the
+cost of pickling the documents
+"""
+
+import asyncio
+import multiprocessing
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from threading import Lock
+from typing import Any
+
+from devops_final_backend.services.telemetry import metrics
+from devops_final_backend.settings import settings
+from devops_final_backend.yaml_worker import dump_all, load, timed_call
+
+# characters of YAML rendered per entry besides its key and the indentation: ": " or "- " and the line break
+ENTRY_CHARS = 3
+
+
+def estimated_size(documents: list[Any], limit: int) -> int:
+    """Estimate the YAML size of documents from the keys and scalar values of all their entries (nested ones
+    included, indented by their depth), stopping once the limit is reached so that the estimate of a large document
+    stays much cheaper than its dump
+
+    Args:
+        documents (list[Any]): the documents
+        limit (int): the size from which the estimate is not needed
+
+    Returns:
+        int: the estimated size in characters, at least the limit if the documents reach it
+    """
+
+    size = 0
+    pending: list[tuple[Any, int]] = [(document, 0) for document in documents]
+    while pending and size < limit:
+        value, depth = pending.pop()
+        if not isinstance(value, (dict, list)):
+            size += len(str(value))
+            continue
+
+        # the items of a list are rendered without a key
+        for key, item in value.items() if isinstance(value, dict) else zip(repeat(""), value):
+            if size >= limit:
+                break
+
+            size += 2 * depth + len(str(key)) + ENTRY_CHARS
+            pending.append((item, depth + 1))
+
+    return size
+
+
+class YamlOffload:
+    """Execution policy of the YAML processing: inline for small documents, pooled above the size threshold"""
+
+    def __init__(self) -> None:
+        """Init the policy, the pool is created on first use"""
+        self._lock = Lock()
+        self._executor: Executor | None = None
+
+    def executor(self) -> Executor:
+        """Get the pool of the worker process, creating it as configured in settings
+
+        Returns:
+            Executor: the thread or process pool
+        """
+
+        with self._lock:
+            if self._executor is None:
+                workers = settings.yaml_offload_workers
+                # spawned (not forked) processes, as forking the threads of the worker may deadlock the children,
+                # running the calls of the minimal yaml_worker module
+                self._executor = (
+                    ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+                    if settings.yaml_offload_executor == "process"
+                    else ThreadPoolExecutor(workers)
+                )
+
+            return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any, size: int) -> Any:
+        """Run a YAML function inline or in the pool depending on the size of the document
+
+        Args:
+            func (Callable[..., Any]): a function of the yaml_worker module (picklable without importing the app)
+            *args (Any): the function arguments
+            size (int): the size of the document in characters
+
+        Returns:
+            Any: the function result
+        """
+
+        threshold = settings.yaml_offload_threshold
+        if not threshold or size < threshold:
+            metrics.inc("yaml_offload_total", op=func.__name__, mode="inline")
+            return func(*args)
+
+        metrics.inc("yaml_offload_total", op=func.__name__, mode=settings.yaml_offload_executor)
+        loop = asyncio.get_running_loop()
+        queue_seconds, result = await loop.run_in_executor(self.executor(), timed_call, func, time.time(), *args)
+        metrics.observe("yaml_offload_queue_seconds", queue_seconds, op=func.__name__)
+        return result
+
+    async def load(self, content: str) -> Any:
+        """Parse a YAML document
+
+        Args:
+            content (str): the YAML string
+
+        Returns:
+            Any: the parsed document
+        """
+
+        return await self.run(load, content, size=len(content))
+
+    async def dump_all(self, documents: list[Any]) -> list[str]:
+        """Dump YAML documents, keeping the key order
+
+        Args:
+            documents (list[Any]): the documents, sized from their entries (see estimated_size)
+
+        Returns:
+            list[str]: the YAML strings
+        """
+
+        return await self.run(dump_all, documents, size=estimated_size(documents, settings.yaml_offload_threshold))
+
+    def shutdown(self) -> None:
+        """Stop the pool of the worker process"""
+
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+yaml_offload = YamlOffload()
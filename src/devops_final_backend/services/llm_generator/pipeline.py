@@ -0,0 +1,103 @@
+"""Multi-Artifact Generation Pipeline
+
+Generates several independent artifacts (compose, helm, terraform) from the same parameters concurrently.
+Each stage is timed on its own and a failing stage does not affect the others
+"""
+
+import asyncio
+import time
+from typing import Any
+
+from devops_final_backend.services.telemetry import metrics
+from devops_final_backend.settings import settings
+
+from .compose_generator import ComposeGenerator, compose_generator
+from .context import GenerationContext
+from .errors import LLMError
+from .helm_generator import HelmGenerator
+from .models import LLMResponse, PipelineStageResult, StageStatus
+from .multi_file_generator import MultiFileGenerator
+from .terraform_generator import TerraformGenerator
+
+GENERATORS: dict[str, type[ComposeGenerator] | type[MultiFileGenerator]] = {
+    "compose": ComposeGenerator,
+    "helm": HelmGenerator,
+    "terraform": TerraformGenerator,
+}
+
+
+class Pipeline:
+    """Concurrent generation of multiple artifacts, shared by all the requests"""
+
+    def __init__(self, dry_run: bool = False, compose: ComposeGenerator | None = None):
+        """Init a generator for each artifact
+
+        Args:
+            dry_run (bool): return the dummy response instead of calling the model
+            compose (ComposeGenerator | None): the compose generator to reuse (like the shared compose_generator),
+                a new one if None
+        """
+
+        self.generators = {artifact: generator(dry_run) for artifact, generator in GENERATORS.items()}
+        if compose is not None:
+            self.generators["compose"] = compose
+
+    async def run_stage(
+        self, artifact: str, prompt_params: dict[str, Any], context: GenerationContext
+    ) -> PipelineStageResult:
+        """Generate a single artifact, turning its errors into a failed stage
+
+        Args:
+            artifact (str): the artifact name
+            prompt_params (dict[str, Any]): the generation parameters
+            context (GenerationContext): the request-local state of the stage
+
+        Returns:
+            PipelineStageResult: the stage outcome, duration and files
+        """
+
+        start = time.monotonic()
+        files: list[LLMResponse] = []
+        error: str | None = None
+        try:
+            files = await self.generators[artifact].run(prompt_params, context)
+        except LLMError as err:
+            error = err.message
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            error = str(err)
+
+        status = StageStatus.FAILED if error is not None else StageStatus.OK
+
+        duration = time.monotonic() - start
+        metrics.observe("pipeline_stage_seconds", duration, artifact=artifact, status=status.value)
+
+        return PipelineStageResult(
+            artifact=artifact,
+            status=status,
+            duration=round(duration, 3),
+            tokens=context.usage.total_tokens,
+            files=files,
+            error=error,
+        )
+
+    async def run(
+        self, prompt_params: dict[str, Any], contexts: dict[str, GenerationContext]
+    ) -> list[PipelineStageResult]:
+        """Run all the stages concurrently
+
+        Args:
+            prompt_params (dict[str, Any]): the generation parameters shared by all the stages
+            contexts (dict[str, GenerationContext]): the request-local state of each requested artifact
+
+        Returns:
+            list[PipelineStageResult]: the stage results in the requested order
+        """
+
+        return list(
+            await asyncio.gather(
+                *[self.run_stage(artifact, prompt_params, context) for artifact, context in contexts.items()]
+            )
+        )
+
+
+pipeline = Pipeline(settings.llm_dry_run, compose_generator)
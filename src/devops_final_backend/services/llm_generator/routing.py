@@ -0,0 +1,239 @@
+"""LLM Backend Routing
+
+A pool of LLM endpoints (base urls serving the same model) with pluggable routing strategies,
+passive health tracking (a backend failing too many consecutive requests is ejected for a cooldown period)
+and an ordered list of candidates used for failover
+"""
+
+# pylint: disable=too-few-public-methods
+
+import random
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import count
+from threading import Lock
+from typing import Any
+
+from devops_final_backend.services.telemetry import metrics
+from devops_final_backend.settings import settings
+
+LATENCY_SMOOTHING = 0.2
+
+
+@dataclass(eq=False)
+class Backend:
+    """LLM endpoint and its passively tracked health"""
+
+    url: str | None
+    outstanding: int = 0
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    latency: float = 0
+    ejected_until: float = 0
+
+    @property
+    def healthy(self) -> bool:
+        """The backend is not ejected (or its ejection period has passed)"""
+        return time.monotonic() >= self.ejected_until
+
+    def stats(self) -> dict[str, Any]:
+        """Metrics view of the backend
+
+        Returns:
+            dict[str, Any]: the backend counters and state
+        """
+
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency": round(self.latency, 3),
+        }
+
+
+class RoutingStrategy(ABC):
+    """Picks the backend that should serve the next request"""
+
+    @abstractmethod
+    def pick(self, backends: list[Backend]) -> Backend:
+        """Choose a backend
+
+        Args:
+            backends (list[Backend]): the candidates (never empty)
+
+        Returns:
+            Backend: the chosen backend
+        """
+
+
+class RoundRobin(RoutingStrategy):
+    """Cycle through the backends in order"""
+
+    def __init__(self):
+        """Init the request counter"""
+        self.counter = count()
+
+    def pick(self, backends: list[Backend]) -> Backend:
+        return backends[next(self.counter) % len(backends)]
+
+
+class LeastOutstanding(RoutingStrategy):
+    """Choose the backend with the fewest in-flight requests, the fastest one on ties"""
+
+    def pick(self, backends: list[Backend]) -> Backend:
+        return min(backends, key=lambda backend: (backend.outstanding, backend.latency))
+
+
+class LatencyWeighted(RoutingStrategy):
+    """Choose a random backend weighted by the inverse of its smoothed latency"""
+
+    def pick(self, backends: list[Backend]) -> Backend:
+        fastest = min((backend.latency for backend in backends if backend.latency), default=1)
+        weights = [1 / (backend.latency or fastest) for backend in backends]
+        return random.choices(backends, weights=weights)[0]
+
+
+ROUTING_STRATEGIES: dict[str, type[RoutingStrategy]] = {
+    "round_robin": RoundRobin,
+    "least_outstanding": LeastOutstanding,
+    "latency_weighted": LatencyWeighted,
+}
+
+
+class BackendPool:
+    """Thread-safe pool of LLM backends"""
+
+    def __init__(self, urls: list[str | None], strategy: RoutingStrategy, max_failures: int, eject_seconds: float):
+        """Init the pool
+
+        Args:
+            urls (list[str | None]): the backend base urls (None for the provider's default endpoint)
+            strategy (RoutingStrategy): the routing strategy
+            max_failures (int): consecutive failures after which a backend is ejected
+            eject_seconds (float): how long an ejected backend is skipped
+        """
+
+        self.backends = [Backend(url) for url in urls]
+        self.strategy = strategy
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self._lock = Lock()
+
+    @classmethod
+    def from_settings(cls) -> "BackendPool":
+        """Build the pool as configured in settings
+
+        Returns:
+            BackendPool: the pool of `llm_base_urls` or of the single `llm_base_url`
+        """
+
+        urls: list[str | None] = list(settings.llm_base_urls) or [settings.llm_base_url]
+        return cls(
+            urls,
+            ROUTING_STRATEGIES[settings.llm_routing](),
+            settings.llm_backend_max_failures,
+            settings.llm_backend_eject_seconds,
+        )
+
+    def candidates(self) -> Iterator[Backend]:
+        """Backends in failover order: the routed pick first, then the remaining healthy ones as routed,
+        then the ejected ones (so that a fully ejected pool is still attempted instead of failing outright)
+
+        Yields:
+            Backend: the next backend to attempt
+        """
+
+        tried: list[Backend] = []
+        while len(tried) < len(self.backends):
+            with self._lock:
+                remaining = [backend for backend in self.backends if backend not in tried]
+                healthy = [backend for backend in remaining if backend.healthy]
+                backend = (
+                    self.strategy.pick(healthy)
+                    if healthy
+                    else min(remaining, key=lambda backend: backend.ejected_until)
+                )
+
+            if tried:
+                metrics.inc("llm_backend_failover_total", url=backend.url)
+
+            tried.append(backend)
+            yield backend
+
+    @contextmanager
+    def track(self, backend: Backend) -> Iterator[None]:
+        """Track an in-flight request on a backend, recording its latency or its failure
+
+        Args:
+            backend (Backend): the backend serving the request
+
+        Yields:
+            None: control to the request
+        """
+
+        with self._lock:
+            backend.outstanding += 1
+            backend.requests += 1
+
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.record_failure(backend)
+            raise
+        else:
+            self.record_success(backend, time.monotonic() - start)
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+
+    def record_success(self, backend: Backend, latency: float) -> None:
+        """Reset the failure streak and update the smoothed latency
+
+        Args:
+            backend (Backend): the backend
+            latency (float): the request duration in seconds
+        """
+
+        with self._lock:
+            backend.consecutive_failures = 0
+            backend.latency = (
+                latency
+                if not backend.latency
+                else LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * backend.latency
+            )
+
+    def record_failure(self, backend: Backend) -> None:
+        """Count the failure and eject the backend if it failed too many consecutive requests
+
+        Args:
+            backend (Backend): the backend
+        """
+
+        with self._lock:
+            backend.failures += 1
+            backend.consecutive_failures += 1
+            if backend.consecutive_failures >= self.max_failures:
+                backend.ejected_until = time.monotonic() + self.eject_seconds
+                backend.consecutive_failures = 0
+                metrics.inc("llm_backend_ejections_total", url=backend.url)
+
+    def stats(self) -> list[dict[str, Any]]:
+        """Metrics view of the pool
+
+        Returns:
+            list[dict[str, Any]]: the stats of each backend
+        """
+
+        with self._lock:
+            return [backend.stats() for backend in self.backends]
+
+
+backend_pool = BackendPool.from_settings()
+metrics.register_collector("llm_backends", backend_pool.stats)
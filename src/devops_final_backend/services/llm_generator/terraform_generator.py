@@ -0,0 +1,68 @@
+"""Specialized Generator for Terraform modules"""
+
+from typing import Any
+
+from .errors import ValidationError
+from .models import ResponseType
+from .multi_file_generator import MultiFileGenerator
+
+
+class TerraformGenerator(MultiFileGenerator):
+    """Specialized Generator for Terraform modules deploying the requested services with the docker provider"""
+
+    TEMPERATURE = 0
+    SYSTEM_PROMPT = """
+    You are a senior DevOps engineer.
+    Always generate valid Terraform configurations exactly in the requested format.
+    Do not include comments, explanations, or extra text.
+    Use the latest official image for the specified software and version
+    """
+    TASK_PROMPT_TEMPLATE = """
+    Generate a Terraform module using the kreuzwerker/docker provider that deploys the following services: {services}
+    at the specified versions with any additional dependent services required at latest major version known
+    if not specified. The module must contain main.tf, variables.tf and outputs.tf and declare a docker_image
+    and a docker_container resource for each service.
+    Attach every container to the docker network '{network_name}' which {network_exists}.
+    For the services that need persistent storage {volume_mount}.
+    {additional_instructions}
+    """
+    RESPONSE_TYPE = ResponseType.TERRAFORM_FILE
+    NETWORK_EXISTS_TEXT = (
+        "does not exist and should be created as a docker_network resource",
+        "already exists and should be referenced with a docker_network data source",
+    )
+    VOLUME_MOUNT_TEXT = (
+        "bind mount host paths under the ./compose/[volume_name] folder",
+        "declare docker_volume resources",
+    )
+    OUTPUT_BUDGET_SCALE = 2
+
+    def validate_files(self, files: dict[str, str], params: dict[str, Any]) -> None:
+        """Check that the module declares containers and the requested network
+
+        Args:
+            files (dict[str, str]): the generated files
+            params (dict[str, Any]): the llm generation parameters
+
+        Raises:
+            ValidationError: one of the following criteria is met
+
+                - main.tf missing
+                - unbalanced braces in a .tf file
+                - no docker_container resource declared
+                - requested network not declared
+        """
+
+        if "main.tf" not in files:
+            raise ValidationError("main.tf missing")
+
+        for name, data in files.items():
+            if name.endswith(".tf") and data.count("{") != data.count("}"):
+                raise ValidationError(f"unbalanced braces in {name}")
+
+        code = "\n".join(data for name, data in files.items() if name.endswith(".tf"))
+        if 'resource "docker_container"' not in code:
+            raise ValidationError("no docker_container resource declared")
+
+        if params["network_name"] not in code or '"docker_network"' not in code:
+            raise ValidationError("requested network not declared")
@@ -0,0 +1,126 @@
+"""LLM Token Usage Accounting
+
+The usage metadata returned by the chat model is recorded on each generation attempt (tokens spent on
+regeneration attempts are also tracked separately) and aggregated per user, generator and parameter pattern.
+The per generator and pattern totals are part of the worker metrics, the per user totals are only exposed to admins
+"""
+
+from dataclasses import asdict, dataclass
+from threading import Lock
+from typing import Any
+
+from langchain_core.messages import BaseMessage
+
+from devops_final_backend.services.telemetry import metrics
+
+
+@dataclass
+class TokenUsage:
+    """Tokens consumed by the attempts of a single generation request"""
+
+    attempts: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retry_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        """Prompt and completion tokens of all the attempts"""
+        return self.prompt_tokens + self.completion_tokens
+
+    def record(self, message: BaseMessage, retry: bool) -> None:
+        """Add the usage metadata of a model response
+
+        Args:
+            message (BaseMessage): the model response (providers without usage metadata count as 0 tokens)
+            retry (bool): the response was produced by a regeneration attempt
+        """
+
+        usage = getattr(message, "usage_metadata", None) or {}
+        self.attempts += 1
+        self.prompt_tokens += usage.get("input_tokens", 0)
+        self.completion_tokens += usage.get("output_tokens", 0)
+        if retry:
+            self.retry_tokens += usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+    def record_cancelled(self, prompt_tokens: int, retry: bool) -> None:
+        """Add an attempt cancelled before its response: the provider already processed the prompt,
+        the completion tokens generated until the cancellation are not reported
+
+        Args:
+            prompt_tokens (int): the prompt tokens of the attempt
+            retry (bool): the attempt was a regeneration attempt
+        """
+
+        self.attempts += 1
+        self.prompt_tokens += prompt_tokens
+        if retry:
+            self.retry_tokens += prompt_tokens
+
+    def merge(self, other: "TokenUsage") -> None:
+        """Add the usage of another generation (like the other stages of a pipeline)
+
+        Args:
+            other (TokenUsage): the usage to add
+        """
+
+        for field, value in asdict(other).items():
+            setattr(self, field, getattr(self, field) + value)
+
+    def header(self) -> str:
+        """Render the usage as response header value
+
+        Returns:
+            str: the usage as comma separated key=value pairs
+        """
+
+        return ", ".join(f"{key}={value}" for key, value in {**asdict(self), "total_tokens": self.total_tokens}.items())
+
+
+class UsageLedger:
+    """Thread-safe aggregation of the token usage per user, generator and parameter pattern"""
+
+    def __init__(self) -> None:
+        """Init the empty ledger"""
+        self._lock = Lock()
+        self._totals: dict[str, dict[str, dict[str, int]]] = {"user": {}, "generator": {}, "pattern": {}}
+
+    def record(self, user: str, generator: str, pattern: str, usage: TokenUsage) -> None:
+        """Add the usage of a request to its user, generator and parameter pattern totals
+
+        Args:
+            user (str): the keycloak subject
+            generator (str): the generator class name
+            pattern (str): the generation parameters pattern
+            usage (TokenUsage): the request usage
+        """
+
+        with self._lock:
+            for dimension, key in (("user", user), ("generator", generator), ("pattern", pattern)):
+                totals = self._totals[dimension].setdefault(key, dict.fromkeys(("requests", *asdict(usage)), 0))
+                totals["requests"] += 1
+                for field, value in asdict(usage).items():
+                    totals[field] += value
+
+        metrics.inc("llm_tokens_total", usage.prompt_tokens, generator=generator, kind="prompt")
+        metrics.inc("llm_tokens_total", usage.completion_tokens, generator=generator, kind="completion")
+
+    def stats(self, dimensions: tuple[str, ...] = ("generator", "pattern")) -> dict[str, Any]:
+        """Aggregated view of the usage
+
+        Args:
+            dimensions (tuple[str, ...]): the aggregations to include, the per user totals only on request
+
+        Returns:
+            dict[str, Any]: the totals per dimension (user, generator, pattern)
+        """
+
+        with self._lock:
+            return {
+                dimension: {key: dict(value) for key, value in self._totals[dimension].items()}
+                for dimension in dimensions
+            }
+
+
+usage_ledger = UsageLedger()
+metrics.register_collector("llm_usage", usage_ledger.stats)
@@ -0,0 +1,285 @@
+"""Stack Pre-Generation
+
+A small set of service combinations makes up most of the compose generation requests. This package counts the
+requests per canonical stack (the sorted, deduplicated services with the network and volume modes) with an
+exponential decay, and pre-generates the most requested stacks in the background so that their requests are served
+from storage without calling the model, including the first requests after a deploy.
+
+The scheduler of each worker pre-generates one stack at a time and only when the worker is idle (no live generation
+for PREGEN_IDLE_SECONDS); a live generation starting meanwhile cancels the pre-generation. The LLM tokens of all the
+pre-generations are bounded by PREGEN_TOKEN_BUDGET per PREGEN_BUDGET_WINDOW seconds.
+
+The storage (see store.py) is shared by the workers using the same SQLite file. A stored result is served until it is
+older than PREGEN_TTL or the compose prompts, provider, models or the settings changing the output (output mode,
+budgets, fan-out, image catalog) change.
+
+The secrets the model generated into the environment of a stored stack are replaced by random values each time it is
+served, so that the users of a stack never share credentials (see credentials.py).
+
+Only the compose generations are served from storage and counted: the updates and the pipelines depend on the files
+and artifacts of the request. All the generations are live traffic the pre-generation yields to
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any
+
+from devops_final_backend.services.deadline import Deadline
+from devops_final_backend.services.llm_generator import GenerationContext, compose_generator
+from devops_final_backend.services.llm_generator.models import LLMResponse
+from devops_final_backend.services.telemetry import logger, metrics
+from devops_final_backend.settings import settings
+
+from .credentials import randomize_secrets
+from .store import PregenerationStore
+
+__all__ = ["PreGenerator", "canonical_params", "pregenerator"]
+
+
+def canonical_params(params: dict[str, Any]) -> dict[str, Any]:
+    """Canonicalize compose generation parameters, so that the same stack requested in any order has the same key
+
+    Args:
+        params (dict[str, Any]): the compose generation parameters
+
+    Returns:
+        dict[str, Any]: the sorted unique services with the network name and the network and volume modes
+    """
+
+    return {
+        "services": sorted(set(params["services"])),
+        "network_name": params["network_name"],
+        "network_exists": params["network_exists"],
+        "volume_mount": params["volume_mount"],
+    }
+
+
+class PreGenerator:
+    """Popularity tracking, storage lookup and background pre-generation of the compose stacks"""
+
+    def __init__(self) -> None:
+        """Init the pre-generator, the storage is opened on first use"""
+        self._lock = Lock()
+        self._store: PregenerationStore | None = None
+        self._live = 0
+        self._last_live = 0.0
+        self._running: asyncio.Task | None = None
+
+    @staticmethod
+    def enabled() -> bool:
+        """Check if the pre-generation is enabled in settings
+
+        Returns:
+            bool: PREGEN_TOP_N is set (and the generators are not in dry run)
+        """
+
+        return settings.pregen_top_n > 0 and not settings.llm_dry_run
+
+    @property
+    def store(self) -> PregenerationStore:
+        """The storage, created on first use"""
+        with self._lock:
+            if self._store is None:
+                self._store = PregenerationStore(settings.pregen_path)
+
+            return self._store
+
+    @staticmethod
+    def fingerprint() -> str:
+        """Identify what a stored result was generated with, so that a change invalidates the stored results
+
+        Returns:
+            str: the fingerprint of the compose prompts, the provider, the model tiers and the settings changing
+                the generated output (output mode, budgets, fan-out and image catalog)
+        """
+
+        generator = type(compose_generator)
+        values = [
+            generator.SYSTEM_PROMPT,
+            generator.TASK_PROMPT_TEMPLATE,
+            settings.llm_provider,
+            *generator.model_tiers(),
+            json.dumps(
+                {
+                    key: getattr(settings, key)
+                    for key in (
+                        "llm_tier_timeout",
+                        "llm_structured_output",
+                        "llm_output_budget",
+                        "llm_output_tokens_base",
+                        "llm_output_tokens_per_service",
+                        "llm_output_tokens_max",
+                        "llm_fan_out_min_services",
+                        "image_catalog",
+                        "image_catalog_path",
+                        "image_catalog_strict",
+                    )
+                },
+                sort_keys=True,
+            ),
+        ]
+        return hashlib.sha256("\n".join(values).encode()).hexdigest()[:16]
+
+    @staticmethod
+    def key(params: dict[str, Any]) -> str:
+        """Key of canonical stack parameters
+
+        Args:
+            params (dict[str, Any]): the canonical parameters
+
+        Returns:
+            str: the hash of the parameters
+        """
+
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:24]
+
+    def serve(self, params: dict[str, Any]) -> list[LLMResponse] | None:
+        """Count a compose generation request and look up the stored files of its stack, served with new secrets
+        (blocking, run in a thread, see credentials.py)
+
+        Args:
+            params (dict[str, Any]): the compose generation parameters
+
+        Returns:
+            list[LLMResponse] | None: the stored files with random secrets, None if the stack has no fresh stored result
+        """
+
+        canonical = canonical_params(params)
+        key, now = self.key(canonical), time.time()
+        self.store.hit(key, json.dumps(canonical), now, settings.pregen_half_life)
+        files = self.store.get(key, self.fingerprint(), now - settings.pregen_ttl)
+
+        metrics.inc("pregen_requests_total", result="hit" if files else "miss")
+        if not files:
+            return None
+
+        return randomize_secrets([LLMResponse.model_validate(file) for file in json.loads(files)])
+
+    @contextmanager
+    def live(self) -> Iterator[None]:
+        """Mark a live generation running, cancelling the running pre-generation so that it yields to the request
+
+        Yields:
+            None: control to the live generation
+        """
+
+        self._live += 1
+        if self._running and not self._running.done():
+            self._running.cancel()
+
+        try:
+            yield
+        finally:
+            self._live -= 1
+            self._last_live = time.monotonic()
+
+    def idle(self) -> bool:
+        """Check if the worker has capacity for a pre-generation
+
+        Returns:
+            bool: no live generation is running nor ended in the last PREGEN_IDLE_SECONDS
+        """
+
+        return not self._live and time.monotonic() - self._last_live >= settings.pregen_idle_seconds
+
+    async def budget_left(self) -> int:
+        """Compute the LLM tokens the pre-generations can still consume in the budget window
+
+        Returns:
+            int: the tokens left
+        """
+
+        spent = await asyncio.to_thread(self.store.spent, time.time() - settings.pregen_budget_window)
+        return settings.pregen_token_budget - spent
+
+    async def candidates(self) -> list[tuple[str, dict[str, Any]]]:
+        """List the most requested stacks without a fresh stored result
+
+        Returns:
+            list[tuple[str, dict[str, Any]]]: the key and canonical parameters of the stacks, most requested first
+        """
+
+        now, fingerprint = time.time(), self.fingerprint()
+        top = await asyncio.to_thread(
+            self.store.top, settings.pregen_top_n, settings.pregen_min_requests, now, settings.pregen_half_life
+        )
+
+        stacks = []
+        for key, params in top:
+            if await asyncio.to_thread(self.store.get, key, fingerprint, now - settings.pregen_ttl) is None:
+                stacks.append((key, json.loads(params)))
+
+        return stacks
+
+    async def pregenerate(self, key: str, params: dict[str, Any]) -> bool:
+        """Generate and store the files of a stack, unless another worker is already generating it
+
+        Args:
+            key (str): the stack key
+            params (dict[str, Any]): the canonical parameters
+
+        Returns:
+            bool: the files were stored, False if claimed by another worker, cancelled by live traffic or failed
+        """
+
+        now = time.time()
+        if not await asyncio.to_thread(self.store.claim, key, now, now + settings.request_timeout_max):
+            return False
+
+        context = GenerationContext(deadline=Deadline(settings.request_timeout_default))
+        task = asyncio.create_task(compose_generator.run(dict(params), context))
+        self._running = task
+        try:
+            await asyncio.wait([task])
+        finally:
+            task.cancel()
+            self._running = None
+            await asyncio.to_thread(self.store.spend, context.usage.total_tokens, time.time())
+
+        if task.cancelled() or task.exception():
+            outcome = "yielded" if task.cancelled() else "failed"
+            metrics.inc("pregen_generations_total", outcome=outcome)
+            logger.info("stack pre-generation %s", outcome, extra={"stack": key, "tokens": context.usage.total_tokens})
+            await asyncio.to_thread(self.store.release, key)
+            return False
+
+        files = json.dumps([file.model_dump(mode="json") for file in task.result()])
+        await asyncio.to_thread(self.store.put, key, self.fingerprint(), files, time.time())
+        metrics.inc("pregen_generations_total", outcome="stored")
+        metrics.inc("pregen_tokens_total", context.usage.total_tokens)
+        return True
+
+    async def cycle(self) -> int:
+        """Pre-generate the most requested stacks missing from storage, one at a time while the worker is idle
+        and the budget allows it
+
+        Returns:
+            int: the number of stored stacks
+        """
+
+        stored = 0
+        for key, params in await self.candidates():
+            if not self.idle() or await self.budget_left() <= 0:
+                break
+
+            stored += await self.pregenerate(key, params)
+
+        return stored
+
+    async def run_forever(self) -> None:
+        """Run a pre-generation cycle every PREGEN_INTERVAL seconds (the worker background task)"""
+
+        while True:
+            await asyncio.sleep(settings.pregen_interval)
+            try:
+                await self.cycle()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("stack pre-generation cycle failed")
+
+
+pregenerator = PreGenerator()
@@ -0,0 +1,68 @@
+"""Credentials of the Pre-Generated Stacks
+
+A stored stack is served to every user requesting it, with the secrets the model generated into its environment files
+(the values of the variables named like passwords, secrets, tokens or keys). They are replaced by random values each
+time the stack is served, so that no two users get the same credentials. A secret is replaced wherever its value
+appears as a whole in the files (like the connection URLs of the environment or the commands of the compose file),
+unless a variable not named like a secret holds the same value (like a user name equal to the password): that value
+is kept so that the stack stays consistent
+"""
+
+import re
+import secrets
+import string
+
+from yaml import safe_load
+
+from devops_final_backend.services.llm_generator.models import LLMResponse, ResponseType
+
+SECRET_NAME = re.compile(r"pass|secret|token|(^|_)key$|salt", re.IGNORECASE)
+SECRET_MIN_LENGTH = 16
+
+
+def random_secret(length: int) -> str:
+    """Generate a random secret, starting with a letter so that it is never loaded as a YAML number
+
+    Args:
+        length (int): the length of the replaced secret, at least SECRET_MIN_LENGTH characters are generated
+
+    Returns:
+        str: the alphanumeric secret
+    """
+
+    alphabet = string.ascii_letters + string.digits
+    return secrets.choice(string.ascii_letters) + "".join(
+        secrets.choice(alphabet) for _ in range(max(length, SECRET_MIN_LENGTH) - 1)
+    )
+
+
+def randomize_secrets(files: list[LLMResponse]) -> list[LLMResponse]:
+    """Replace the secrets of the environment files by random values in all the files of a stack
+
+    Args:
+        files (list[LLMResponse]): the stored environment and compose files
+
+    Returns:
+        list[LLMResponse]: the files with new secrets
+    """
+
+    secret_values: set[str] = set()
+    public_values: set[str] = set()
+    for file in files:
+        if file.type != ResponseType.ENV_FILE:
+            continue
+
+        for name, value in (safe_load(file.data) or {}).items():
+            if value is not None:
+                (secret_values if SECRET_NAME.search(str(name)) else public_values).add(str(value))
+
+    replacements = {value: random_secret(len(value)) for value in secret_values - public_values if value}
+    if not replacements:
+        return files
+
+    # the longest values first, a secret containing another one is replaced as a whole
+    values = "|".join(re.escape(value) for value in sorted(replacements, key=len, reverse=True))
+    pattern = re.compile(rf"(?<![\w.-])({values})(?![\w.-])")
+    return [
+        file.model_copy(update={"data": pattern.sub(lambda match: replacements[match[1]], file.data)}) for file in files
+    ]
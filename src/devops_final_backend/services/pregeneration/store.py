@@ -0,0 +1,197 @@
+"""Pre-Generation Storage
+
+SQLite database shared by all the uvicorn workers (and containers) using the same file, and kept across deploys:
+
+- popularity: the decayed request count and the parameters of each canonical compose stack
+- results: the pre-generated files of a stack with the fingerprint of the prompts and models that generated them
+- claims: the stacks being pre-generated, so that a stack is generated by a single worker at a time
+- spend: the LLM tokens consumed by the pre-generations, for the budget window
+"""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+
+def decayed(score: float, updated: float, now: float, half_life: float) -> float:
+    """Compute the current value of an exponentially decayed request count
+
+    Args:
+        score (float): the count at the last update
+        updated (float): the timestamp of the last update
+        now (float): the current timestamp
+        half_life (float): seconds after which a request counts half
+
+    Returns:
+        float: the decayed count
+    """
+
+    return score * 0.5 ** (max(now - updated, 0) / half_life)
+
+
+class PregenerationStore:
+    """Popularity, results, claims and token spend of the pre-generation, each update in its own transaction"""
+
+    def __init__(self, path: str):
+        """Create the database file and its tables if missing
+
+        Args:
+            path (str): the database file path
+        """
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS popularity (key TEXT PRIMARY KEY, params TEXT, score REAL, updated REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, fingerprint TEXT, files TEXT, generated REAL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, until REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS spend (ts REAL, tokens INTEGER)")
+
+    def connect(self) -> closing[sqlite3.Connection]:
+        """Open a connection in autocommit mode (transactions are started explicitly), closed after use
+
+        Returns:
+            closing[sqlite3.Connection]: the connection context
+        """
+
+        return closing(sqlite3.connect(self.path, timeout=5, isolation_level=None))
+
+    def hit(self, key: str, params: str, now: float, half_life: float) -> None:
+        """Count a request of a stack
+
+        Args:
+            key (str): the stack key
+            params (str): the canonical parameters of the stack as JSON
+            now (float): the current timestamp
+            half_life (float): seconds after which a request counts half
+        """
+
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT score, updated FROM popularity WHERE key = ?", (key,)).fetchone()
+            score, updated = row or (0, now)
+            score = decayed(score, updated, now, half_life) + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO popularity (key, params, score, updated) VALUES (?, ?, ?, ?)",
+                (key, params, score, now),
+            )
+            conn.execute("COMMIT")
+
+    def top(self, limit: int, minimum: float, now: float, half_life: float) -> list[tuple[str, str]]:
+        """List the most requested stacks, forgetting the stacks no longer requested
+
+        Args:
+            limit (int): the number of stacks
+            minimum (float): the decayed request count a stack needs
+            now (float): the current timestamp
+            half_life (float): seconds after which a request counts half
+
+        Returns:
+            list[tuple[str, str]]: the key and JSON parameters of the stacks, most requested first
+        """
+
+        with self.connect() as conn:
+            conn.execute("DELETE FROM popularity WHERE updated < ?", (now - 16 * half_life,))
+            rows = conn.execute("SELECT key, params, score, updated FROM popularity").fetchall()
+
+        scores = [(decayed(score, updated, now, half_life), key, params) for key, params, score, updated in rows]
+        return [(key, params) for score, key, params in sorted(scores, reverse=True)[:limit] if score >= minimum]
+
+    def get(self, key: str, fingerprint: str, since: float) -> str | None:
+        """Get the stored files of a stack
+
+        Args:
+            key (str): the stack key
+            fingerprint (str): the fingerprint of the current prompts and models
+            since (float): the oldest generation timestamp still served
+
+        Returns:
+            str | None: the files as JSON, None if missing, stale or generated by other prompts or models
+        """
+
+        with self.connect() as conn:
+            row = conn.execute(
+                "SELECT files FROM results WHERE key = ? AND fingerprint = ? AND generated >= ?",
+                (key, fingerprint, since),
+            ).fetchone()
+
+        return row[0] if row else None
+
+    def put(self, key: str, fingerprint: str, files: str, now: float) -> None:
+        """Store the files of a stack and release its claim
+
+        Args:
+            key (str): the stack key
+            fingerprint (str): the fingerprint of the prompts and models that generated the files
+            files (str): the files as JSON
+            now (float): the generation timestamp
+        """
+
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, fingerprint, files, generated) VALUES (?, ?, ?, ?)",
+                (key, fingerprint, files, now),
+            )
+            conn.execute("DELETE FROM claims WHERE key = ?", (key,))
+
+    def claim(self, key: str, now: float, until: float) -> bool:
+        """Atomically claim the pre-generation of a stack (an expired claim can be taken over)
+
+        Args:
+            key (str): the stack key
+            now (float): the current timestamp
+            until (float): the expiry of the claim
+
+        Returns:
+            bool: the claim was taken
+        """
+
+        with self.connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO claims (key, until) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET until = excluded.until WHERE claims.until < ?",
+                (key, until, now),
+            )
+
+        return cursor.rowcount == 1
+
+    def release(self, key: str) -> None:
+        """Release the claim of a stack whose pre-generation did not complete
+
+        Args:
+            key (str): the stack key
+        """
+
+        with self.connect() as conn:
+            conn.execute("DELETE FROM claims WHERE key = ?", (key,))
+
+    def spend(self, tokens: int, now: float) -> None:
+        """Record the LLM tokens consumed by a pre-generation
+
+        Args:
+            tokens (int): the tokens consumed
+            now (float): the current timestamp
+        """
+
+        with self.connect() as conn:
+            conn.execute("INSERT INTO spend (ts, tokens) VALUES (?, ?)", (now, tokens))
+
+    def spent(self, since: float) -> int:
+        """Sum the LLM tokens consumed by the pre-generations of the budget window
+
+        Args:
+            since (float): the start of the budget window
+
+        Returns:
+            int: the tokens consumed
+        """
+
+        with self.connect() as conn:
+            conn.execute("DELETE FROM spend WHERE ts < ?", (since,))
+            return conn.execute("SELECT COALESCE(SUM(tokens), 0) FROM spend").fetchone()[0]
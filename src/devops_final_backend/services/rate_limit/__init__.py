@@ -0,0 +1,235 @@
+"""Rate Limit Module
+
+This package limits the usage of the generation endpoints per user (the Keycloak subject):
+
+- a token bucket limits the number of requests (bursts up to the bucket capacity, then one request per refill period)
+- a rolling quota limits the number of LLM tokens consumed in the quota window
+
+The limits are configured in settings with optional per-role overrides (the most generous policy among the user's
+realm roles applies). The state is kept in-process or in a SQLite file shared by all the uvicorn workers: as each
+worker would apply the in-process limits on its own, multiplying them by the number of workers, the SQLite file is
+used by default when the server runs several workers.
+
+It exposes the `enforce_rate_limit` dependency which answers 429 with Retry-After and X-RateLimit-* headers
+"""
+
+import time
+from dataclasses import dataclass
+from math import ceil
+
+from anyio import CancelScope, to_thread
+from fastapi import Depends, HTTPException, Response, status
+
+from devops_final_backend.services.auth import get_current_user
+from devops_final_backend.services.telemetry import logger
+from devops_final_backend.settings import settings
+
+from .backends import MemoryBackend, RateLimitBackend, SQLiteBackend
+
+__all__ = ["RateLimitPolicy", "RateLimiter", "enforce_rate_limit", "rate_limiter"]
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """Limits applied to a user
+
+    - requests (int): request bucket capacity (maximum burst)
+    - refill_seconds (float): seconds needed to refill one request in the bucket
+    - token_quota (int): LLM tokens allowed in the quota window
+    """
+
+    requests: int
+    refill_seconds: float
+    token_quota: int
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of a rate limit check"""
+
+    allowed: bool
+    policy: RateLimitPolicy
+    remaining: int
+    reset: float
+    tokens_remaining: int
+    retry_after: float = 0
+
+    def headers(self) -> dict[str, str]:
+        """Render the result as response headers
+
+        Returns:
+            dict[str, str]: the X-RateLimit-* headers (and Retry-After if the request was rejected)
+        """
+
+        headers = {
+            "X-RateLimit-Limit": str(self.policy.requests),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(ceil(self.reset)),
+            "X-RateLimit-Tokens-Limit": str(self.policy.token_quota),
+            "X-RateLimit-Tokens-Remaining": str(self.tokens_remaining),
+        }
+
+        if not self.allowed:
+            headers["Retry-After"] = str(max(ceil(self.retry_after), 1))
+
+        return headers
+
+
+class RateLimiter:
+    """Applies the request and token limits of a user on a storage backend"""
+
+    def __init__(
+        self, backend: RateLimitBackend, policy: RateLimitPolicy, roles: dict[str, RateLimitPolicy], window: float
+    ):
+        """Init the limiter
+
+        Args:
+            backend (RateLimitBackend): the state storage
+            policy (RateLimitPolicy): the default policy
+            roles (dict[str, RateLimitPolicy]): policies of the roles that override the default
+            window (float): the token quota rolling window in seconds
+        """
+
+        self.backend = backend
+        self.default_policy = policy
+        self.roles = roles
+        self.window = window
+
+    @classmethod
+    def from_settings(cls) -> "RateLimiter":
+        """Build the limiter as configured in settings, on the SQLite backend by default when the server runs
+        several workers
+
+        Returns:
+            RateLimiter: the limiter instance
+        """
+
+        default = RateLimitPolicy(
+            settings.rate_limit_requests, settings.rate_limit_refill_seconds, settings.rate_limit_token_quota
+        )
+
+        workers = settings.server_workers()
+        backend = settings.rate_limit_backend or ("sqlite" if workers > 1 else "memory")
+        if backend == "memory" and workers > 1 and settings.rate_limit:
+            logger.warning("in-memory rate limits are applied per worker, multiplied by the %d workers", workers)
+
+        return cls(
+            SQLiteBackend(settings.rate_limit_sqlite_path) if backend == "sqlite" else MemoryBackend(),
+            default,
+            {
+                role: RateLimitPolicy(
+                    int(values.get("requests", default.requests)),
+                    values.get("refill_seconds", default.refill_seconds),
+                    int(values.get("token_quota", default.token_quota)),
+                )
+                for role, values in settings.rate_limit_roles.items()
+            },
+            settings.rate_limit_quota_window,
+        )
+
+    def policy(self, user_info: dict) -> RateLimitPolicy:
+        """Select the policy of the user
+
+        Args:
+            user_info (dict): the keycloak introspection result
+
+        Returns:
+            RateLimitPolicy: the most generous policy of the user's realm roles, or the default one
+        """
+
+        roles = user_info.get("realm_access", {}).get("roles", [])
+        policies = [self.roles[role] for role in roles if role in self.roles]
+
+        return max(policies, key=lambda p: (p.requests, p.token_quota)) if policies else self.default_policy
+
+    def check(self, user_info: dict) -> RateLimitResult:
+        """Check the token quota, then take a request from the user's bucket
+
+        Args:
+            user_info (dict): the keycloak introspection result
+
+        Returns:
+            RateLimitResult: the check result
+        """
+
+        now = time.time()
+        key = user_info["sub"]
+        policy = self.policy(user_info)
+
+        events = self.backend.get_usage(key, now - self.window)
+        used = sum(tokens for _, tokens in events)
+        if used >= policy.token_quota:
+            # the quota frees up when enough of the oldest events leave the window
+            retry_after, freed = self.window, used
+            for ts, event_tokens in events:
+                freed -= event_tokens
+                if freed < policy.token_quota:
+                    retry_after = ts + self.window - now
+                    break
+
+            return RateLimitResult(False, policy, 0, 0, 0, retry_after)
+
+        allowed, tokens = self.backend.take(key, policy.requests, policy.refill_seconds, now)
+        return RateLimitResult(
+            allowed,
+            policy,
+            int(tokens),
+            (policy.requests - tokens) * policy.refill_seconds,
+            policy.token_quota - used,
+            (1 - tokens) * policy.refill_seconds,
+        )
+
+    def consume_tokens(self, user_info: dict, tokens: int) -> None:
+        """Record the LLM tokens consumed by a user's request (blocking, see charge), unless rate limiting is disabled
+
+        Args:
+            user_info (dict): the keycloak introspection result
+            tokens (int): the tokens consumed
+        """
+
+        if tokens and settings.rate_limit:
+            now = time.time()
+            self.backend.add_usage(user_info["sub"], tokens, now, now - self.window)
+
+    async def charge(self, user_info: dict, tokens: int) -> None:
+        """Record the LLM tokens consumed by a user's request from an async endpoint: the backend write runs in the
+        threadpool (the SQLite backend may wait on the database lock) and is shielded from the request cancellation,
+        so the tokens of a cancelled generation are still charged
+
+        Args:
+            user_info (dict): the keycloak introspection result
+            tokens (int): the tokens consumed
+        """
+
+        with CancelScope(shield=True):
+            await to_thread.run_sync(self.consume_tokens, user_info, tokens)
+
+
+rate_limiter = RateLimiter.from_settings()
+
+
+def enforce_rate_limit(response: Response, user_info: dict = Depends(get_current_user)) -> dict:
+    """Apply the rate limits of the authenticated user and add the X-RateLimit-* headers to the response
+
+    Args:
+        response (Response): the response whose headers are set
+        user_info (dict): the keycloak introspection result
+
+    Raises:
+        HTTPException: 429 if the user exceeded the request rate or the token quota
+
+    Returns:
+        dict: the user info, for endpoints that account the tokens they consume
+    """
+
+    if not settings.rate_limit:
+        return user_info
+
+    result = rate_limiter.check(user_info)
+    if not result.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Rate limit exceeded", headers=result.headers()
+        )
+
+    response.headers.update(result.headers())
+    return user_info
@@ -0,0 +1,165 @@
+"""Rate Limit Storage Backends
+
+The backends store the request token buckets and the LLM token usage events of each key.
+The in-process backend is local to a uvicorn worker while the SQLite backend is shared by
+all the workers (and containers) that use the same database file
+"""
+
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+
+
+def refill(tokens: float, updated: float, capacity: int, refill_seconds: float, now: float) -> float:
+    """Compute the tokens available in a bucket at a given moment
+
+    Args:
+        tokens (float): the tokens in the bucket at the last update
+        updated (float): the timestamp of the last update
+        capacity (int): the bucket capacity
+        refill_seconds (float): seconds needed to refill one token
+        now (float): the current timestamp
+
+    Returns:
+        float: the tokens currently available
+    """
+
+    return min(capacity, tokens + (now - updated) / refill_seconds)
+
+
+class RateLimitBackend(ABC):
+    """Storage of the token buckets and of the token usage events"""
+
+    @abstractmethod
+    def take(self, key: str, capacity: int, refill_seconds: float, now: float) -> tuple[bool, float]:
+        """Atomically take a token from the key's bucket (a missing bucket is full)
+
+        Args:
+            key (str): the bucket key
+            capacity (int): the bucket capacity
+            refill_seconds (float): seconds needed to refill one token
+            now (float): the current timestamp
+
+        Returns:
+            tuple[bool, float]: if a token was taken and the tokens left in the bucket
+        """
+
+    @abstractmethod
+    def add_usage(self, key: str, tokens: int, now: float, since: float) -> None:
+        """Record an LLM token usage event, dropping the events of the key that left the quota window
+
+        Args:
+            key (str): the usage key
+            tokens (int): the tokens consumed
+            now (float): the current timestamp
+            since (float): the start of the quota window
+        """
+
+    @abstractmethod
+    def get_usage(self, key: str, since: float) -> list[tuple[float, int]]:
+        """Get the usage events of a key, dropping the older ones
+
+        Args:
+            key (str): the usage key
+            since (float): the timestamp from which events are returned
+
+        Returns:
+            list[tuple[float, int]]: the (timestamp, tokens) events ordered by timestamp
+        """
+
+
+class MemoryBackend(RateLimitBackend):
+    """Thread-safe in-process backend"""
+
+    def __init__(self) -> None:
+        """Init the empty storage"""
+        self._lock = Lock()
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._usage: dict[str, deque[tuple[float, int]]] = {}
+
+    def take(self, key: str, capacity: int, refill_seconds: float, now: float) -> tuple[bool, float]:
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = refill(tokens, updated, capacity, refill_seconds, now)
+            allowed = tokens >= 1
+            tokens -= 1 if allowed else 0
+            self._buckets[key] = (tokens, now)
+
+        return allowed, tokens
+
+    def add_usage(self, key: str, tokens: int, now: float, since: float) -> None:
+        with self._lock:
+            events = self._usage.setdefault(key, deque())
+            while events and events[0][0] < since:
+                events.popleft()
+
+            events.append((now, tokens))
+
+    def get_usage(self, key: str, since: float) -> list[tuple[float, int]]:
+        with self._lock:
+            events = self._usage.get(key, deque())
+            while events and events[0][0] < since:
+                events.popleft()
+
+            return list(events)
+
+
+class SQLiteBackend(RateLimitBackend):
+    """Backend shared between processes through a SQLite database file,
+    each bucket update runs in an immediate (write locked) transaction"""
+
+    def __init__(self, path: str):
+        """Create the database file and its tables if missing
+
+        Args:
+            path (str): the database file path
+        """
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS usage (key TEXT, ts REAL, tokens INTEGER)")
+            conn.execute("CREATE INDEX IF NOT EXISTS usage_key_ts ON usage (key, ts)")
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection in autocommit mode (transactions are started explicitly) and close it after use
+
+        Yields:
+            sqlite3.Connection: the connection
+        """
+
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def take(self, key: str, capacity: int, refill_seconds: float, now: float) -> tuple[bool, float]:
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row or (capacity, now)
+            tokens = refill(tokens, updated, capacity, refill_seconds, now)
+            allowed = tokens >= 1
+            tokens -= 1 if allowed else 0
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+
+        return allowed, tokens
+
+    def add_usage(self, key: str, tokens: int, now: float, since: float) -> None:
+        with self.connect() as conn:
+            conn.execute("DELETE FROM usage WHERE key = ? AND ts < ?", (key, since))
+            conn.execute("INSERT INTO usage (key, ts, tokens) VALUES (?, ?, ?)", (key, now, tokens))
+
+    def get_usage(self, key: str, since: float) -> list[tuple[float, int]]:
+        with self.connect() as conn:
+            conn.execute("DELETE FROM usage WHERE key = ? AND ts < ?", (key, since))
+            return conn.execute("SELECT ts, tokens FROM usage WHERE key = ? ORDER BY ts", (key,)).fetchall()
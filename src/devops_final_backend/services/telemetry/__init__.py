@@ -0,0 +1,14 @@
+"""Telemetry Module
+
+This package contains the in-process instrumentation of the application. It exposes
+
+- the metrics registry (counters, timings and registered collectors) shared by all the services of a worker
+- the non-blocking structured logging pipeline and the per-request log context (request id, user, stage timings)
+
+The metrics are kept per uvicorn worker process and are exposed through the API metrics endpoint
+"""
+
+from .logs import bind, end_request, log_pipeline, logger, start_request, timing
+from .metrics import Metrics, metrics
+
+__all__ = ["Metrics", "bind", "end_request", "log_pipeline", "logger", "metrics", "start_request", "timing"]
@@ -0,0 +1,186 @@
+"""Structured Logging
+
+The application logs JSON lines without blocking the event loop: the logger only puts the records on a queue
+(QueueHandler) and a listener thread of the worker formats and writes them.
+
+Each request gets a log context (request id, method, path) that the services complete as the request goes
+(bind: user sub, generator, ...; timing: stage durations), attached to all the records logged during the request.
+A fraction of the requests (LOG_SAMPLE_RATE) is sampled: the records below WARNING of the other requests are
+dropped, so the successful requests can be sampled while the failures are always logged
+"""
+
+import copy
+import json
+import logging
+import random
+import sys
+from contextvars import ContextVar, Token
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Any, TextIO
+
+from devops_final_backend.settings import settings
+
+LOGGER_NAME = "devops_final_backend"
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "context"}
+
+logger = logging.getLogger(LOGGER_NAME)
+request_log: ContextVar[dict[str, Any] | None] = ContextVar("request_log", default=None)
+
+
+def start_request(**fields: Any) -> Token:
+    """Open the log context of a request, sampled at LOG_SAMPLE_RATE
+
+    Args:
+        **fields (Any): the initial context, like the request id
+
+    Returns:
+        Token: the token restoring the previous context (see end_request)
+    """
+
+    return request_log.set({**fields, "sampled": random.random() < settings.log_sample_rate})
+
+
+def end_request(token: Token) -> None:
+    """Close the log context of a request
+
+    Args:
+        token (Token): the token returned by start_request
+    """
+
+    request_log.reset(token)
+
+
+def bind(**fields: Any) -> None:
+    """Add fields to the log context of the current request (shared by the tasks the request spawns)
+
+    Args:
+        **fields (Any): the fields
+    """
+
+    if (context := request_log.get()) is not None:
+        context.update(fields)
+
+
+def timing(stage: str, seconds: float) -> None:
+    """Add the duration of a stage to the log context of the current request (summed if repeated)
+
+    Args:
+        stage (str): the stage name
+        seconds (float): the duration
+    """
+
+    if (context := request_log.get()) is not None:
+        timings = context.setdefault("timings", {})
+        timings[stage] = round(timings.get(stage, 0) + seconds, 4)
+
+
+def sampled(record: logging.LogRecord) -> bool:
+    """Log filter dropping the records below WARNING of the requests that are not sampled
+
+    Args:
+        record (logging.LogRecord): the record
+
+    Returns:
+        bool: the record is logged
+    """
+
+    context = request_log.get()
+    return context is None or context["sampled"] or record.levelno >= logging.WARNING
+
+
+class ContextQueueHandler(QueueHandler):
+    """Queue handler attaching the request log context to the records, all the formatting is left to the listener"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Copy the record with its message rendered, its exception as text and a snapshot of the request context
+
+        Args:
+            record (logging.LogRecord): the record
+
+        Returns:
+            logging.LogRecord: the record to enqueue
+        """
+
+        prepared = copy.copy(record)
+        prepared.msg, prepared.args = record.getMessage(), None
+        if record.exc_info:
+            prepared.exc_text, prepared.exc_info = logging.Formatter().formatException(record.exc_info), None
+
+        context = request_log.get() or {}
+        prepared.context = {
+            key: dict(value) if isinstance(value, dict) else value for key, value in context.items() if key != "sampled"
+        }
+        return prepared
+
+
+class JsonFormatter(logging.Formatter):
+    """Render the records as JSON lines: time, level, logger, message, request context and extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Render a record
+
+        Args:
+            record (logging.LogRecord): the record
+
+        Returns:
+            str: the JSON line
+        """
+
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+            **{key: value for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES},
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+
+class LogPipeline:
+    """Queue and listener thread of the worker's log records"""
+
+    def __init__(self) -> None:
+        """Init the stopped pipeline"""
+        self._listener: QueueListener | None = None
+        self._handler: ContextQueueHandler | None = None
+
+    def start(self, stream: TextIO | None = None) -> None:
+        """Route the application logger through the queue and start the listener thread
+
+        Args:
+            stream (TextIO | None): the output of the records, stderr if not given
+        """
+
+        if self._listener:
+            return
+
+        queue: SimpleQueue[logging.LogRecord] = SimpleQueue()
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter() if settings.log_json else logging.Formatter(logging.BASIC_FORMAT))
+
+        self._handler = ContextQueueHandler(queue)
+        self._handler.addFilter(sampled)
+        logger.addHandler(self._handler)
+        logger.setLevel(settings.log_level.upper())
+        logger.propagate = False
+
+        self._listener = QueueListener(queue, output)
+        self._listener.start()
+
+    def stop(self) -> None:
+        """Write the queued records and stop the listener thread"""
+
+        if not self._listener or not self._handler:
+            return
+
+        logger.removeHandler(self._handler)
+        self._listener.stop()
+        self._listener = self._handler = None
+
+
+log_pipeline = LogPipeline()
@@ -0,0 +1,97 @@
+"""In-process metrics registry
+
+Counters and timings are keyed by name and labels (rendered as `name{label=value}`) and collectors are
+callables registered by the services that own a more complex state (like the LLM backend pool)
+"""
+
+from collections import defaultdict
+from collections.abc import Callable
+from threading import Lock
+from typing import Any
+
+
+class Metrics:
+    """Thread-safe registry of counters, timings and state collectors"""
+
+    def __init__(self) -> None:
+        """Init the empty registry"""
+        self._lock = Lock()
+        self._counters: dict[str, float] = defaultdict(float)
+        self._timings: dict[str, dict[str, float]] = {}
+        self._collectors: dict[str, Callable[[], Any]] = {}
+
+    @staticmethod
+    def key(name: str, labels: dict[str, Any]) -> str:
+        """Render the metric key from its name and labels
+
+        Args:
+            name (str): the metric name
+            labels (dict[str, Any]): the metric labels
+
+        Returns:
+            str: the key as name{label=value,...} with the labels sorted
+        """
+
+        if not labels:
+            return name
+
+        return f"{name}{{{','.join(f'{k}={v}' for k, v in sorted(labels.items()))}}}"
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Increment a counter
+
+        Args:
+            name (str): the counter name
+            value (float): the increment. Defaults to 1.
+            labels (Any): the counter labels
+        """
+
+        with self._lock:
+            self._counters[self.key(name, labels)] += value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Record a timing (or any other distribution) sample
+
+        Args:
+            name (str): the timing name
+            value (float): the sample value
+            labels (Any): the timing labels
+        """
+
+        key = self.key(name, labels)
+        with self._lock:
+            timing = self._timings.setdefault(key, {"count": 0, "sum": 0, "max": 0})
+            timing["count"] += 1
+            timing["sum"] += value
+            timing["max"] = max(timing["max"], value)
+
+    def register_collector(self, name: str, collector: Callable[[], Any]) -> None:
+        """Register a callable that returns a snapshot of a service state
+
+        Args:
+            name (str): the section name in the metrics snapshot
+            collector (Callable[[], Any]): the callable invoked on each snapshot
+        """
+
+        self._collectors[name] = collector
+
+    def snapshot(self) -> dict[str, Any]:
+        """Collect the current value of all the metrics
+
+        Returns:
+            dict[str, Any]: counters, timings and the collectors sections
+        """
+
+        with self._lock:
+            result: dict[str, Any] = {
+                "counters": dict(self._counters),
+                "timings": {key: dict(timing) for key, timing in self._timings.items()},
+            }
+
+        for name, collector in self._collectors.items():
+            result[name] = collector()
+
+        return result
+
+
+metrics = Metrics()
@@ -1,9 +1,40 @@
 """Application Environment Settings"""
 
+import os
+from math import ceil
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 
+# CPU limit of the container: cgroup v2 "quota period" (quota "max" when unlimited), cgroup v1 quota (-1 when
+# unlimited) and period files
+CGROUP_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+CGROUP_V1_CPU_QUOTA = (Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"), Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us"))
+
+
+def available_cpus() -> int:
+    """Count the CPUs the process can use: its CPU affinity, bounded by the CPU quota of its cgroup (the CPU limit
+    of a container, rounded up). The CPU count of the host ignores both
+
+    Returns:
+        int: the number of CPUs, at least 1
+    """
+
+    cpus = os.process_cpu_count() or 1
+    try:
+        quota, period = CGROUP_CPU_MAX.read_text(encoding="utf-8").split()
+    except (OSError, ValueError):
+        try:
+            quota, period = (path.read_text(encoding="utf-8").strip() for path in CGROUP_V1_CPU_QUOTA)
+        except OSError:
+            return cpus
+
+    if quota in ("max", "-1"):
+        return cpus
+
+    return max(min(cpus, ceil(int(quota) / int(period))), 1)
+
 
 class Settings(BaseSettings):
     """Application Settings as retrieved fron environment (.env file if exists or shell)"""
@@ -17,20 +48,112 @@ class Settings(BaseSettings):
 
     disable_api_testing: bool = False
 
+    # Server (production mode, ignored when debug is enabled)
+    app_workers: int | None = None
+    app_keep_alive: int = 5
+    app_backlog: int = 2048
+    app_limit_max_requests: int | None = None
+    app_threadpool_size: int = 40
+
+    # Request Deadlines (seconds)
+    request_timeout_default: float = 300
+    request_timeout_max: float = 600
+
+    # Logging
+    log_level: str = "INFO"
+    log_json: bool = True
+    log_sample_rate: float = 1
+
+    # YAML Offload (documents of at least the threshold characters, 0 processes all the documents inline)
+    yaml_offload_threshold: int = 32768
+    yaml_offload_executor: Literal["thread", "process"] = "thread"
+    yaml_offload_workers: int = 2
+
     # LLM
     llm_model: str
     llm_provider: str
+    llm_model_tiers: list[str] = []
+    llm_tier_timeout: float | None = None
     llm_dry_run: bool = False
     llm_secret: str | None = None
     llm_base_url: str | None = None
+    llm_base_urls: list[str] = []
+    llm_routing: Literal["round_robin", "least_outstanding", "latency_weighted"] = "least_outstanding"
+    llm_backend_max_failures: int = 3
+    llm_backend_eject_seconds: float = 30
+    llm_hedging: bool = False
+    llm_hedge_delay: float | None = None
+    llm_hedge_quantile: float = 0.9
+    llm_hedge_max_rate: float = 0.1
+    llm_connect_timeout: float = 5
+    llm_read_timeout: float = 120
+    llm_disconnect_poll_interval: float = 0.5
+    llm_breaker: bool = True
+    llm_breaker_failure_rate: float = 0.5
+    llm_breaker_min_calls: int = 10
+    llm_breaker_slow_call_seconds: float | None = 90
+    llm_breaker_open_seconds: float = 30
+    llm_warmup: bool = True
+    llm_keep_alive_interval: int = 0
+    llm_structured_output: bool = False
+    llm_output_budget: bool = False
+    llm_output_tokens_base: int = 512
+    llm_output_tokens_per_service: int = 384
+    llm_output_tokens_max: int = 8192
+    llm_speculative_candidates: int = 3
+    llm_speculative_services: list[str] = []
+    llm_speculative_users: list[str] = []
+    llm_speculative_temperature_step: float = 0.3
+    llm_fan_out_min_services: int = 0
+    llm_record: bool = False
+    llm_cassette_path: str = ".cache/llm_cassette.jsonl.gz"
+    llm_replay_latency_scale: float = 1
+
+    # Image Catalog
+    image_catalog: bool = True
+    image_catalog_path: str | None = None
+    image_catalog_index_path: str = ".cache/image_catalog.sqlite3"
+    image_catalog_strict: bool = False
+
+    # Rate Limit
+    rate_limit: bool = True
+    # unset: sqlite when the server runs several workers (each worker keeps its own in-memory limits), memory otherwise
+    rate_limit_backend: Literal["memory", "sqlite"] | None = None
+    rate_limit_sqlite_path: str = ".cache/rate_limit.sqlite3"
+    rate_limit_requests: int = 30
+    rate_limit_refill_seconds: float = 2
+    rate_limit_token_quota: int = 500_000
+    rate_limit_quota_window: float = 3600
+    rate_limit_roles: dict[str, dict[str, float]] = {}
+
+    # Pre-Generation (of the most requested compose stacks, 0 top stacks disables it)
+    pregen_top_n: int = 0
+    pregen_min_requests: float = 3
+    pregen_half_life: float = 604_800
+    pregen_ttl: float = 86_400
+    pregen_interval: float = 60
+    pregen_idle_seconds: float = 10
+    pregen_token_budget: int = 100_000
+    pregen_budget_window: float = 3600
+    pregen_path: str = ".cache/pregeneration.sqlite3"
 
     # Keycloak
     keycloak_url: str
     keycloak_realm: str
     keycloak_client_id: str
     keycloak_client_secret: str
+    keycloak_admin_role: str = "admin"
     keycloak_test_username: str | None = None
     keycloak_test_password: str | None = None
 
+    def server_workers(self) -> int:
+        """Count the uvicorn worker processes serving the app
+
+        Returns:
+            int: 1 in debug mode, otherwise APP_WORKERS or the available CPUs (see available_cpus)
+        """
+
+        return 1 if self.debug else self.app_workers or available_cpus()
+
 
 settings = Settings.model_validate({})
@@ -2,10 +2,28 @@
 
 This folder contains:
 
-- unit tests: 01 to 09, check if logic is properly handeled
+- unit tests: 01 to 09 and from 20, check if logic is properly handeled
 
     - 01 - compose llm generator data validation and parsing
     - 02 - keycloak interface
+    - 03 - llm backend routing and failover
+    - 04 - llm request hedging
+    - 05 - llm circuit breaker
+    - 06 - per user rate limit and token quota
+    - 07 - helm and terraform generators and the multi-artifact pipeline
+    - 08 - request deadlines
+    - 09 - auth against the in-process keycloak stand-in (keycloak_stub)
+    - 20 - compose fan-out generation and merge of the service blocks
+    - 21 - compose update of an existing configuration
+    - 22 - offline image catalog
+    - 23 - generation cancellation on client disconnect
+    - 24 - model call record and replay (cassette)
+    - 25 - generation benchmark
+    - 26 - structured request logs
+    - 27 - yaml offload to the worker pool
+    - 28 - popular stack pre-generation
+    - 29 - readiness after the model warm-up
+    - 30 - server entry point (uvicorn arguments)
 
 - load tests: 10 to 19, check if app works under various stress factors
 
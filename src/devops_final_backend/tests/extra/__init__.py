@@ -1,4 +1,5 @@
 """Extra tests
 These tests should only be run manually because they depend on external factors
 like a keycloak instance and are thus not suitable for the ci / cd pipeline
+(with --keycloak-stub the in-process keycloak stand-in is served in place of the keycloak instance)
 """
@@ -0,0 +1,41 @@
+"""Extra tests fixtures"""
+
+from collections.abc import Iterator
+
+import pytest
+
+from devops_final_backend.services import auth
+from devops_final_backend.tests.keycloak_stub import KeycloakStub, StubRealm
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    """Register the option serving the in-process Keycloak stand-in
+
+    Args:
+        parser (pytest.Parser): the pytest command line parser
+    """
+
+    parser.addoption(
+        "--keycloak-stub",
+        action="store_true",
+        help="serve the in-process Keycloak stand-in in place of the configured Keycloak instance",
+    )
+
+
+@pytest.fixture(autouse=True, scope="session")
+def keycloak_stand_in(request: pytest.FixtureRequest) -> Iterator[None]:
+    """Serve the in-process Keycloak stand-in in place of the configured Keycloak instance with --keycloak-stub
+
+    Args:
+        request (pytest.FixtureRequest): the pytest request, holding the command line options
+
+    Yields:
+        None: control to the tests
+    """
+
+    if not request.config.getoption("--keycloak-stub"):
+        yield
+        return
+
+    with KeycloakStub(StubRealm.from_settings()).install(auth.keycloak_openid):
+        yield
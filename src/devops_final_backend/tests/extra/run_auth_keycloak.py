@@ -5,11 +5,14 @@ This requires keycloak to be Available or set the 'disable_api_testing` env var
 to skip over these checks
 """
 
+import asyncio
+
 import keycloak
 import pytest
 from fastapi import HTTPException
 
 from devops_final_backend.services import auth
+from devops_final_backend.services.deadline import Deadline
 from devops_final_backend.settings import settings
 
 
@@ -28,7 +31,7 @@ def test_get_current_user_fail():
         return
 
     with pytest.raises(HTTPException):
-        auth.get_current_user("invalid-token")
+        asyncio.run(auth.get_current_user("invalid-token", Deadline(settings.request_timeout_default)))
 
 
 def test_auth_flow_ok():
@@ -40,4 +43,4 @@ def test_auth_flow_ok():
     assert settings.keycloak_test_password is not None
 
     token = auth.get_user_tokens(settings.keycloak_test_username, settings.keycloak_test_password)
-    auth.get_current_user(token["access_token"])
+    asyncio.run(auth.get_current_user(token["access_token"], Deadline(settings.request_timeout_default)))
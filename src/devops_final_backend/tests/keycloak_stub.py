@@ -0,0 +1,287 @@
+"""Keycloak Stand-In
+
+In-process OIDC provider serving the token (password and refresh grants), introspection and JWKS endpoints of
+a Keycloak realm, so that the auth path can be tested and benchmarked without a Keycloak instance.
+
+The tokens are RS256 JWTs signed with a key generated per stub. Each endpoint waits the configured latency and
+fails with 503 at the configured failure rate, both can be changed while the stub is running
+"""
+
+import asyncio
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Form, HTTPException, status
+from jwcrypto import jwk, jwt  # type: ignore[import-untyped]  # no type hints published
+from keycloak import KeycloakOpenID
+
+from devops_final_backend.settings import settings
+
+
+@dataclass
+class StubRealm:
+    """Realm served by the stand-in
+
+    Attributes:
+        name (str): the realm name
+        client_id (str): the confidential client allowed to call the endpoints
+        client_secret (str): the client secret
+        users (dict[str, str]): the password of each test user
+        roles (dict[str, list[str]]): the realm roles of each test user
+        token_lifetime (int): seconds until the access tokens expire
+    """
+
+    name: str
+    client_id: str
+    client_secret: str
+    users: dict[str, str]
+    roles: dict[str, list[str]] = field(default_factory=dict)
+    token_lifetime: int = 300
+
+    @classmethod
+    def from_settings(cls, roles: dict[str, list[str]] | None = None) -> "StubRealm":
+        """Build the configured realm and client, with the configured test user
+        (test-user / test-password if not configured)
+
+        Args:
+            roles (dict[str, list[str]] | None): the realm roles of each test user
+
+        Returns:
+            StubRealm: the realm
+        """
+
+        username = settings.keycloak_test_username or "test-user"
+        return cls(
+            settings.keycloak_realm,
+            settings.keycloak_client_id,
+            settings.keycloak_client_secret,
+            {username: settings.keycloak_test_password or "test-password"},
+            roles or {},
+        )
+
+
+class KeycloakStub:
+    """Local OIDC stand-in of a realm"""
+
+    def __init__(self, realm: StubRealm, latency: float = 0, failure_rate: float = 0):
+        """Init the stand-in and its signing key
+
+        Args:
+            realm (StubRealm): the served realm
+            latency (float): seconds waited by each endpoint call
+            failure_rate (float): fraction of the endpoint calls failing with 503
+        """
+
+        self.realm = realm
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls: Counter[str] = Counter()
+        self.url = ""
+        self.key = jwk.JWK.generate(kty="RSA", size=2048, kid=uuid.uuid4().hex, alg="RS256", use="sig")
+        self.app = self.build_app()
+
+    @property
+    def issuer(self) -> str:
+        """Issuer of the tokens, the realm url
+
+        Returns:
+            str: the issuer
+        """
+
+        return f"{self.url}/realms/{self.realm.name}"
+
+    def mint(self, username: str) -> dict[str, Any]:
+        """Issue the tokens of a user, like the token endpoint does
+
+        Args:
+            username (str): the test user
+
+        Returns:
+            dict[str, Any]: the OAuth2 token response
+        """
+
+        now = int(time.time())
+        claims = {
+            "iss": self.issuer,
+            "sub": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{self.realm.name}/{username}")),
+            "azp": self.realm.client_id,
+            "preferred_username": username,
+            "realm_access": {"roles": self.realm.roles.get(username, [])},
+            "scope": "openid profile email",
+            "iat": now,
+            "exp": now + self.realm.token_lifetime,
+            "jti": uuid.uuid4().hex,
+        }
+
+        tokens = {}
+        for kind, lifetime in (("access", self.realm.token_lifetime), ("refresh", 2 * self.realm.token_lifetime)):
+            token = jwt.JWT(
+                header={"alg": "RS256", "typ": "JWT", "kid": self.key.kid},
+                claims={**claims, "typ": kind.capitalize(), "exp": now + lifetime},
+            )
+            token.make_signed_token(self.key)
+            tokens[kind] = token.serialize()
+
+        return {
+            "access_token": tokens["access"],
+            "expires_in": self.realm.token_lifetime,
+            "refresh_token": tokens["refresh"],
+            "refresh_expires_in": 2 * self.realm.token_lifetime,
+            "token_type": "Bearer",
+            "scope": claims["scope"],
+        }
+
+    def decode(self, token: str) -> dict[str, Any] | None:
+        """Verify the signature and expiration of a token issued by the stand-in
+
+        Args:
+            token (str): the serialized token
+
+        Returns:
+            dict[str, Any] | None: the claims, None if the token is invalid
+        """
+
+        try:
+            decoded = jwt.JWT(key=self.key, jwt=token, expected_type="JWS", check_claims={"exp": None})
+        except Exception:  # pylint: disable=broad-exception-caught
+            return None
+
+        return jwt.json_decode(decoded.claims)
+
+    async def inject(self, endpoint: str) -> None:
+        """Count the endpoint call, then apply the configured latency and failure rate
+
+        Args:
+            endpoint (str): the endpoint name
+
+        Raises:
+            HTTPException: 503 for the injected failures
+        """
+
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if random.random() < self.failure_rate:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="injected failure")
+
+    def check_client(self, client_id: str, client_secret: str | None) -> None:
+        """Authenticate the confidential client
+
+        Args:
+            client_id (str): the client id of the request
+            client_secret (str | None): the client secret of the request
+
+        Raises:
+            HTTPException: 401 for an unknown client or a wrong secret
+        """
+
+        if client_id != self.realm.client_id or client_secret != self.realm.client_secret:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid_client")
+
+    def build_app(self) -> FastAPI:
+        """Build the OIDC endpoints of the realm
+
+        Returns:
+            FastAPI: the stand-in application
+        """
+
+        app = FastAPI()
+        prefix = f"/realms/{self.realm.name}/protocol/openid-connect"
+
+        @app.post(f"{prefix}/token")
+        async def token(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+            grant_type: str = Form(...),
+            client_id: str = Form(...),
+            client_secret: str | None = Form(None),
+            username: str | None = Form(None),
+            password: str | None = Form(None),
+            refresh_token: str | None = Form(None),
+        ) -> dict[str, Any]:
+            await self.inject("token")
+            self.check_client(client_id, client_secret)
+
+            if grant_type == "password" and username in self.realm.users and self.realm.users[username] == password:
+                return self.mint(username)
+
+            if grant_type == "refresh_token" and refresh_token and (claims := self.decode(refresh_token)):
+                return self.mint(claims["preferred_username"])
+
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid_grant")
+
+        @app.post(f"{prefix}/token/introspect")
+        async def introspect(
+            token: str = Form(...), client_id: str = Form(...), client_secret: str | None = Form(None)
+        ) -> dict[str, Any]:
+            await self.inject("introspect")
+            self.check_client(client_id, client_secret)
+
+            claims = self.decode(token)
+            if not claims or claims.get("typ") != "Access":
+                return {"active": False}
+
+            return {**claims, "active": True, "client_id": claims["azp"], "username": claims["preferred_username"]}
+
+        @app.get(f"{prefix}/certs")
+        async def certs() -> dict[str, Any]:
+            await self.inject("certs")
+            return {"keys": [self.key.export_public(as_dict=True)]}
+
+        return app
+
+    @contextmanager
+    def serve(self, host: str = "127.0.0.1") -> Iterator[str]:
+        """Serve the stand-in on a free local port from a background thread
+
+        Args:
+            host (str): the listening address
+
+        Yields:
+            str: the server url
+        """
+
+        server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=0, log_level="warning", lifespan="off"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+
+        self.url = f"http://{host}:{server.servers[0].sockets[0].getsockname()[1]}"
+        try:
+            yield self.url
+        finally:
+            server.should_exit = True
+            thread.join()
+
+    @contextmanager
+    def install(self, openid: KeycloakOpenID) -> Iterator["KeycloakStub"]:
+        """Serve the stand-in and point a keycloak client (like the auth service client) at it
+
+        Args:
+            openid (KeycloakOpenID): the client
+
+        Yields:
+            KeycloakStub: the running stand-in
+        """
+
+        connection = openid.connection
+        base_url, async_client = connection.base_url, connection.async_s
+        with self.serve() as url:
+            connection.base_url = url
+            # pooled connections are bound to the event loop that opened them and each test runs its own loop
+            connection.async_s = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=0)
+            )
+            try:
+                yield self
+            finally:
+                connection.base_url, connection.async_s = base_url, async_client
@@ -6,13 +6,22 @@ Trigger the codded error cases
 
 # pylint: disable=redefined-outer-name
 
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
-from yaml import safe_dump
+from langchain_core.messages import AIMessage
+from langchain_ollama import ChatOllama
+from yaml import safe_dump, safe_load
 
-from devops_final_backend.services.llm_generator import ComposeGenerator, errors, models
+from devops_final_backend.services.llm_generator import ComposeGenerator, GenerationContext, errors, models
+from devops_final_backend.services.llm_generator.compose_validator import compose_validator
+from devops_final_backend.services.telemetry import metrics
+from devops_final_backend.settings import settings
 
 
 @pytest.fixture
@@ -58,7 +67,7 @@ def test_02_assign_param_first_run_negatives(generator: ComposeGenerator):
         "volume_mount": False,
     }
 
-    generator.assign_param_defaults(params)
+    params = generator.assign_param_defaults(params)
 
     assert params["services"] == "[ redis ], [ mariadb:12 ]"
     assert params["network_name"] == "demo_network"
@@ -80,7 +89,7 @@ def test_03_assign_param_first_run_positives(generator: ComposeGenerator):
         "volume_mount": True,
     }
 
-    generator.assign_param_defaults(params)
+    params = generator.assign_param_defaults(params)
 
     assert params["services"] == "[ redis ], [ mariadb:12 ]"
     assert params["network_name"] == "test_network"
@@ -102,7 +111,7 @@ def test_04_assign_param_second_run(generator: ComposeGenerator):
         "volume_mount": "the default docker volume folder",
     }
 
-    generator.assign_param_defaults(params)
+    params = generator.assign_param_defaults(params)
 
     assert params["services"] == "[ redis ], [ mariadb:12 ]"
     assert params["network_name"] == "test_network"
@@ -134,7 +143,8 @@ def test_05_parse_compose_config_first_variant(generator: ComposeGenerator):
       default:
     """
 
-    result = generator.parse_compose_config(yaml_content, params)
+    context = GenerationContext()
+    result = generator.parse_compose_config(yaml_content, params, context)
 
     assert "networks" in result
     assert "default" in result["networks"]
@@ -145,8 +155,8 @@ def test_05_parse_compose_config_first_variant(generator: ComposeGenerator):
     assert "env_file" in result["services"]["redis"]
     assert "environment" not in result["services"]["redis"]
 
-    assert "redis" in generator.env_store
-    assert "VAR1" in generator.env_store["redis"]
+    assert "redis" in context.env_store
+    assert "VAR1" in context.env_store["redis"]
 
 
 def test_06_parse_compose_config_second_variant(generator: ComposeGenerator):
@@ -176,7 +186,8 @@ def test_06_parse_compose_config_second_variant(generator: ComposeGenerator):
       redis:
     """
 
-    result = generator.parse_compose_config(yaml_content, params)
+    context = GenerationContext()
+    result = generator.parse_compose_config(yaml_content, params, context)
 
     assert "volumes" in result
     assert "redis" in result["volumes"]
@@ -206,55 +217,56 @@ def test_07_parse_compose_config_missing_values(generator: ComposeGenerator):
         "network_exists": "is an external network and should be marked as such",
         "volume_mount": "the default docker volume folder",
     }
+    context = GenerationContext()
 
     with pytest.raises(errors.ValidationError):
-        generator.parse_compose_config("invalid", params)
+        generator.parse_compose_config("invalid", params, context)
 
     with pytest.raises(errors.ValidationError):
-        generator.parse_compose_config("", params)
+        generator.parse_compose_config("", params, context)
 
     config: dict[str, Any] = {"version": 3, "services": {"redis": {"image": "redis"}}}
     with pytest.raises(errors.ValidationError):
         # missing network
-        generator.parse_compose_config(safe_dump(config), params)
+        generator.parse_compose_config(safe_dump(config), params, context)
 
     config["networks"] = {}
     with pytest.raises(errors.ValidationError):
         # empty networ
-        generator.parse_compose_config(safe_dump(config), params)
+        generator.parse_compose_config(safe_dump(config), params, context)
 
     config["networks"]["demo_network"] = {}
     with pytest.raises(errors.ValidationError):
         # requested network not in generated networks
-        generator.parse_compose_config(safe_dump(config), params)
+        generator.parse_compose_config(safe_dump(config), params, context)
 
     del config["networks"]["demo_network"]
     config["networks"]["test_network"] = {}
     with pytest.raises(errors.ValidationError):
         # requested external network exists but does not external atribute
-        generator.parse_compose_config(safe_dump(config), params)
+        generator.parse_compose_config(safe_dump(config), params, context)
 
     config["networks"]["test_network"]["external"] = False
     with pytest.raises(errors.ValidationError):
         # requested external network exists but it is not marked as external
-        generator.parse_compose_config(safe_dump(config), params)
+        generator.parse_compose_config(safe_dump(config), params, context)
 
     config["networks"]["test_network"]["external"] = True
     config["volumes"] = {}
     with pytest.raises(errors.ValidationError):
         # fails for empty volumes element
-        generator.parse_compose_config(safe_dump(config), params)
+        generator.parse_compose_config(safe_dump(config), params, context)
 
     config["services"] = {}
     del config["volumes"]
     with pytest.raises(errors.ValidationError):
         # fails for missing services
-        generator.parse_compose_config(safe_dump(config), params)
+        generator.parse_compose_config(safe_dump(config), params, context)
 
     config["services"] = {"redis": {}}
     with pytest.raises(errors.ValidationError):
         # fails for missing service image
-        generator.parse_compose_config(safe_dump(config), params)
+        generator.parse_compose_config(safe_dump(config), params, context)
 
 
 def test_08_env_vars_extract_dict(generator: ComposeGenerator):
@@ -264,9 +276,10 @@ def test_08_env_vars_extract_dict(generator: ComposeGenerator):
         generator (ComposeGenerator): instance
     """
 
+    context = GenerationContext()
     env = {"KEY": "VALUE"}
-    generator.env_vars_extract("service1", env)
-    assert generator.env_store["service1"] == env
+    generator.env_vars_extract("service1", env, context)
+    assert context.env_store["service1"] == env
 
 
 def test_09_env_vars_extract_list(generator: ComposeGenerator):
@@ -276,9 +289,10 @@ def test_09_env_vars_extract_list(generator: ComposeGenerator):
         generator (ComposeGenerator): instance
     """
 
+    context = GenerationContext()
     env = ["FOO=bar", "BAZ=qux"]
-    generator.env_vars_extract("service2", env)
-    assert generator.env_store["service2"] == {"FOO": "bar", "BAZ": "qux"}
+    generator.env_vars_extract("service2", env, context)
+    assert context.env_store["service2"] == {"FOO": "bar", "BAZ": "qux"}
 
 
 def test_10_env_vars_extract_missing_prerequisites(generator: ComposeGenerator):
@@ -288,21 +302,22 @@ def test_10_env_vars_extract_missing_prerequisites(generator: ComposeGenerator):
         generator (ComposeGenerator): instance
     """
 
+    context = GenerationContext()
     service_name = "test"
     env = {"test": "test"}
 
     with pytest.raises(errors.ValidationError):
-        generator.env_vars_extract("test", {})
+        generator.env_vars_extract("test", {}, context)
 
     with pytest.raises(errors.ValidationError):
-        generator.env_vars_extract("test", [])
+        generator.env_vars_extract("test", [], context)
 
     with pytest.raises(errors.ValidationError):
-        generator.env_vars_extract("", env)
+        generator.env_vars_extract("", env, context)
 
-    generator.env_store[service_name] = env
+    context.env_store[service_name] = env
     with pytest.raises(errors.ValidationError):
-        generator.env_vars_extract(service_name, env)
+        generator.env_vars_extract(service_name, env, context)
 
 
 def test_11_run_dry_run_returns_dummy(generator: ComposeGenerator):
@@ -319,7 +334,7 @@ def test_11_run_dry_run_returns_dummy(generator: ComposeGenerator):
         "volume_mount": False,
     }
 
-    result = generator.run(params)
+    result = asyncio.run(generator.run(params))
 
     assert result[0].type == models.ResponseType.NO_RESPONSE
     assert result[0].data == "Lorem Ipsum"
@@ -328,8 +343,8 @@ def test_11_run_dry_run_returns_dummy(generator: ComposeGenerator):
 def test_12_run_invalid_response_triggers_retry(monkeypatch):
     """Check that on retry failure ends with an invalid model response error.
 
-    This works by patching the chain.invoke method that is present in the generator object
-    with a fake invoke that returns an invalid yaml. The fake structure must be declared inside
+    This works by patching the chain.ainvoke method that is present in the generator object
+    with a fake ainvoke that returns an invalid yaml. The fake structure must be declared inside
     the test function body so that it can set the tested value of call_count
 
     Args:
@@ -339,7 +354,7 @@ def test_12_run_invalid_response_triggers_retry(monkeypatch):
     gen = ComposeGenerator(dry_run=False)
     call_count = {"count": 0}
 
-    def fake_invoke(_params):
+    async def fake_ainvoke(_params):
         call_count["count"] += 1
 
         # pylint: disable=too-few-public-methods
@@ -352,7 +367,7 @@ def test_12_run_invalid_response_triggers_retry(monkeypatch):
 
         return Resp()
 
-    monkeypatch.setattr(gen, "get_chain", lambda: MagicMock(invoke=fake_invoke))
+    monkeypatch.setattr(gen, "get_chain", lambda *_args: MagicMock(ainvoke=fake_ainvoke))
     params = {
         "services": ["redis"],
         "network_name": "net",
@@ -361,6 +376,337 @@ def test_12_run_invalid_response_triggers_retry(monkeypatch):
     }
 
     with pytest.raises(errors.InvalidModelResponse):
-        gen.run(params)
+        asyncio.run(gen.run(params))
 
     assert call_count["count"] == 2
+
+
+def test_13_run_records_token_usage(monkeypatch):
+    """Check that the usage metadata of each attempt is recorded, including the retry tokens
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator(dry_run=False)
+    resp = MagicMock(text=lambda: "invalid_yaml:", usage_metadata={"input_tokens": 100, "output_tokens": 20})
+    monkeypatch.setattr(gen, "get_chain", lambda *_args: MagicMock(ainvoke=AsyncMock(return_value=resp)))
+    params = {
+        "services": ["redis"],
+        "network_name": "net",
+        "network_exists": False,
+        "volume_mount": False,
+    }
+
+    context = GenerationContext()
+
+    with pytest.raises(errors.InvalidModelResponse):
+        asyncio.run(gen.run(params, context))
+
+    assert context.usage.attempts == 2
+    assert context.usage.total_tokens == 240
+    assert context.usage.retry_tokens == 120
+    assert "total_tokens=240" in context.usage.header()
+
+
+def test_14_shared_generator_concurrency(monkeypatch) -> None:
+    """Stress a single generator instance with concurrent requests from several threads and event loops.
+
+    Every fake response depends on the requested service and a third of the requests are first answered
+    with an invalid configuration (after an environment was extracted) to exercise the retry path.
+    Each result must contain only its own service and environment values
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator(dry_run=False)
+    state = dict(vars(gen))
+
+    async def fake_ainvoke(params):
+        service = params["services"].strip("[ ]")
+        services: dict[str, Any] = {service: {"image": service, "environment": {"OWNER": service}}}
+        if int(service.removeprefix("svc")) % 3 == 0 and not params["additional_instructions"]:
+            services["broken"] = {}
+
+        await asyncio.sleep(random.random() / 1000)
+        content = safe_dump({"services": services, "networks": {params["network_name"]: None}})
+        return MagicMock(text=lambda: content, usage_metadata={"input_tokens": 1, "output_tokens": 1})
+
+    monkeypatch.setattr(gen, "get_chain", lambda *_args: MagicMock(ainvoke=fake_ainvoke))
+
+    async def generate(index: int) -> tuple[int, list[models.LLMResponse], GenerationContext]:
+        context = GenerationContext()
+        params = {
+            "services": [f"svc{index}"],
+            "network_name": f"net{index}",
+            "network_exists": False,
+            "volume_mount": False,
+        }
+        return index, await gen.run(params, context), context
+
+    async def generate_batch(start: int) -> list[tuple[int, list[models.LLMResponse], GenerationContext]]:
+        return await asyncio.gather(*[generate(index) for index in range(start, start + 25)])
+
+    with ThreadPoolExecutor(4) as executor:
+        batches = list(executor.map(lambda start: asyncio.run(generate_batch(start)), range(0, 100, 25)))
+
+    results = [result for batch in batches for result in batch]
+    assert len(results) == 100
+    for index, files, context in results:
+        env_file, compose_file = files
+        assert env_file.name == f".env.svc{index}"
+        assert safe_load(env_file.data) == {"OWNER": f"svc{index}"}
+        assert list(safe_load(compose_file.data)["services"]) == [f"svc{index}"]
+        assert list(context.env_store) == [f"svc{index}"]
+        assert context.usage.attempts == (2 if index % 3 == 0 else 1)
+
+    assert {key: value for key, value in vars(gen).items() if key != "get_chain"} == state
+
+
+def test_15_run_structured_output(monkeypatch) -> None:
+    """Check that the structured output is validated without yaml parsing and that a schema mismatch is retried
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator(dry_run=False)
+    compose = models.ComposeFile(
+        services={"redis": models.ComposeService(image="redis", environment={"FOO": "bar"}, networks=["net"])},
+        networks={"net": models.ComposeNetwork()},
+    )
+    responses = [
+        {"raw": AIMessage(content="{}"), "parsed": None, "parsing_error": "missing services"},
+        {"raw": AIMessage(content=""), "parsed": compose, "parsing_error": None},
+    ]
+    chain = MagicMock(ainvoke=AsyncMock(side_effect=responses))
+    monkeypatch.setattr(gen, "structured_output", lambda: True)
+    monkeypatch.setattr(gen, "get_chain", lambda _url, structured, *_args: chain if structured else None)
+    params = {
+        "services": ["redis"],
+        "network_name": "net",
+        "network_exists": False,
+        "volume_mount": False,
+    }
+
+    env_file, compose_file = asyncio.run(gen.run(params))
+
+    assert chain.ainvoke.await_count == 2
+    assert safe_load(env_file.data) == {"FOO": "bar"}
+    assert safe_load(compose_file.data)["services"]["redis"] == {
+        "image": "redis",
+        "networks": ["net"],
+        "env_file": ".env.redis",
+    }
+
+
+def test_16_structured_output_fallback(monkeypatch) -> None:
+    """Check that providers without structured output support fall back to the text mode
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    def get_chain(_url, structured=False, _max_tokens=None):
+        if structured:
+            raise NotImplementedError()
+
+        return MagicMock()
+
+    monkeypatch.setattr(settings, "llm_structured_output", True)
+    monkeypatch.setattr(ComposeGenerator, "_structured_support", {})
+    monkeypatch.setattr(ComposeGenerator, "get_chain", get_chain)
+
+    assert ComposeGenerator.structured_output() is False
+
+
+def test_17_output_budget(monkeypatch) -> None:
+    """Check the budget computation, the budgeted model limits and that a response cut by the budget is retried
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    monkeypatch.setattr(settings, "llm_output_budget", True)
+    monkeypatch.setattr(settings, "llm_output_tokens_base", 100)
+    monkeypatch.setattr(settings, "llm_output_tokens_per_service", 50)
+    monkeypatch.setattr(settings, "llm_output_tokens_max", 180)
+
+    assert ComposeGenerator.output_budget(["redis"]) == 150
+    assert ComposeGenerator.output_budget("[ redis ], [ mariadb:12 ]") == 180
+
+    model = ComposeGenerator.budget_model(ChatOllama(model="llama3.1"), 150, structured=False)
+    assert isinstance(model, ChatOllama)
+    assert model.num_predict == 150
+    assert model.stop == ComposeGenerator.STOP_SEQUENCES
+
+    gen = ComposeGenerator(dry_run=False)
+    resp = AIMessage(
+        content="services:\n  redis:\n    image: redis\n    image: redis", response_metadata={"done_reason": "length"}
+    )
+    chain = MagicMock(ainvoke=AsyncMock(return_value=resp))
+    budgets: list[int | None] = []
+
+    def get_chain(_url, _structured, max_tokens, _candidate=0, _tier=0):
+        budgets.append(max_tokens)
+        return chain
+
+    monkeypatch.setattr(gen, "get_chain", get_chain)
+    params = {"services": ["redis"], "network_name": "net", "network_exists": False, "volume_mount": False}
+    exceeded = metrics.key("llm_output_budget_exceeded_total", {"generator": "ComposeGenerator"})
+    before = metrics.snapshot()["counters"].get(exceeded, 0)
+
+    with pytest.raises(errors.InvalidModelResponse) as exc:
+        asyncio.run(gen.run(params))
+
+    assert "output budget of 150 tokens" in exc.value.message
+    assert budgets == [150, 150]
+    assert metrics.snapshot()["counters"][exceeded] == before + 2
+
+
+def test_18_validator_reports_all_violations() -> None:
+    """Check that a document with several defects reports all of them in a single validation pass"""
+
+    params = {
+        "services": "[ redis ], [ mariadb ]",
+        "network_name": "test_network",
+        "network_exists": "is an external network and should be marked as such",
+        "volume_mount": "the default docker volume folder",
+    }
+    config = {
+        "services": {
+            "redis": {"environment": ["FOO=bar", "BROKEN"]},
+            "mariadb": {"image": "mariadb", "ports": {"bad": "ports"}},
+        },
+        "networks": {"test_network": {}},
+        "volumes": {},
+    }
+
+    violations = compose_validator.validate(config, params)
+
+    assert violations == [
+        "invalid services.mariadb.ports",
+        "requested external network not marked as external",
+        "missing image for service redis",
+        "invalid list environment elements for service redis: BROKEN",
+        "volumes declared but empty",
+    ]
+
+    with pytest.raises(errors.ValidationError) as exc:
+        ComposeGenerator().parse_compose_config(safe_dump(config), params, GenerationContext())
+
+    assert all(violation in exc.value.message for violation in violations)
+
+
+def test_19_speculative_candidates(monkeypatch) -> None:
+    """Check that the first valid candidate wins, the slower candidates are cancelled and charged their prompt tokens,
+    and the win is counted
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator(dry_run=False)
+    valid = safe_dump({"services": {"redis": {"image": "redis:7"}}, "networks": {"net": None}})
+    # candidate: (delay, content), the first candidate would be valid but is slower than the third one
+    behaviour = {0: (1, valid), 1: (0.01, "invalid_yaml:"), 2: (0.05, valid)}
+    cancelled = []
+
+    def get_chain(_url, _structured, _max_tokens, candidate=0, _tier=0):
+        async def ainvoke(_params):
+            delay, content = behaviour[candidate]
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(candidate)
+                raise
+
+            return MagicMock(text=lambda: content, usage_metadata={"input_tokens": 5, "output_tokens": 1})
+
+        return MagicMock(ainvoke=ainvoke)
+
+    monkeypatch.setattr(gen, "get_chain", get_chain)
+    monkeypatch.setattr(settings, "llm_speculative_services", ["redis"])
+    params = {"services": ["redis:7"], "network_name": "net", "network_exists": False, "volume_mount": False}
+    context = GenerationContext(candidates=gen.speculative_candidates(["redis:7"], {"sub": "user"}))
+    key = metrics.key("llm_speculative_wins_total", {"generator": "ComposeGenerator", "position": 2, "candidate": 2})
+    wins = metrics.snapshot()["counters"].get(key, 0)
+
+    start = time.monotonic()
+    files = asyncio.run(gen.run(params, context))
+
+    assert time.monotonic() - start < 0.5
+    assert context.candidates == settings.llm_speculative_candidates == 3
+    assert safe_load(files[-1].data)["services"] == {"redis": {"image": "redis:7"}}
+    assert cancelled == [0]
+    # the cancelled candidate is charged the prompt tokens of the candidates that responded
+    assert (context.usage.attempts, context.usage.prompt_tokens, context.usage.completion_tokens) == (3, 15, 2)
+    assert not context.retry
+    assert metrics.snapshot()["counters"][key] == wins + 1
+    assert gen.speculative_candidates(["postgres"], {"sub": "user"}) == 1
+
+
+def test_20_model_cascade(monkeypatch) -> None:
+    """Check that a generation escalates to the next model tier when the response of a tier is invalid
+    (with the regeneration instructions) or the tier times out (without them, also when all the speculative
+    candidates time out), and the tier metrics
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator(dry_run=False)
+    valid = safe_dump({"services": {"redis": {"image": "redis:7"}}, "networks": {"net": None}})
+    behaviour = {"small": (0, "invalid_yaml:"), "big": (0, valid)}
+    prompts = []
+
+    def get_chain(_url, _structured, _max_tokens, _candidate=0, tier=0):
+        async def ainvoke(params):
+            prompts.append((tier, params["additional_instructions"]))
+            delay, content = behaviour[gen.model_tiers()[tier]]
+            await asyncio.sleep(delay)
+            return MagicMock(text=lambda: content, usage_metadata={"input_tokens": 1, "output_tokens": 1})
+
+        return MagicMock(ainvoke=ainvoke)
+
+    monkeypatch.setattr(gen, "get_chain", get_chain)
+    monkeypatch.setattr(settings, "llm_model_tiers", ["small", "big"])
+    monkeypatch.setattr(settings, "llm_tier_timeout", 0.1)
+    params = {"services": ["redis:7"], "network_name": "net", "network_exists": False, "volume_mount": False}
+    counters = metrics.snapshot()["counters"]
+    resolved = metrics.key("llm_tier_resolved_total", {"generator": "ComposeGenerator", "tier": "big"})
+    escalations = {
+        reason: metrics.key(
+            "llm_tier_escalations_total", {"generator": "ComposeGenerator", "tier": "big", "reason": reason}
+        )
+        for reason in ("invalid", "timeout")
+    }
+    before = {key: counters.get(key, 0) for key in (resolved, *escalations.values())}
+
+    context = GenerationContext()
+    files = asyncio.run(gen.run(params, context))
+    assert safe_load(files[-1].data)["services"] == {"redis": {"image": "redis:7"}}
+    assert [tier for tier, _ in prompts] == [0, 1] and "invalid" in prompts[1][1]
+    assert context.tier == 1 and context.retry
+
+    behaviour["small"], prompts[:] = (1, valid), []
+    context = GenerationContext()
+    start = time.monotonic()
+    asyncio.run(gen.run(params, context))
+    assert time.monotonic() - start < 0.5
+    assert prompts == [(0, ""), (1, "")]
+    assert context.tier == 1 and not context.retry and context.usage.attempts == 1
+
+    # timed out candidates are failed, not invalid: the next tier is not a regeneration either
+    prompts[:] = []
+    context = GenerationContext(candidates=2)
+    asyncio.run(gen.run(params, context))
+    assert sorted(prompts) == [(0, ""), (0, ""), (1, ""), (1, "")]
+    assert context.tier == 1 and not context.retry
+
+    counters = metrics.snapshot()["counters"]
+    assert counters[resolved] == before[resolved] + 3
+    assert counters[escalations["invalid"]] == before[escalations["invalid"]] + 1
+    assert counters[escalations["timeout"]] == before[escalations["timeout"]] + 2
+    assert gen.model_tiers() == ["small", "big"]
@@ -0,0 +1,116 @@
+"""Test 03: LLM Backend Routing
+
+Test the routing strategies, the passive health tracking of the backends
+and the failover of the generator chain invocation
+"""
+
+# pylint: disable=redefined-outer-name
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from devops_final_backend.services.llm_generator import ComposeGenerator, errors, routing
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Get a pool of 3 backends that replaces the generators' pool
+
+    Args:
+        monkeypatch (Any): instance
+
+    Returns:
+        BackendPool: the pool instance
+    """
+
+    backend_pool = routing.BackendPool(["http://a", "http://b", "http://c"], routing.LeastOutstanding(), 2, 60)
+    monkeypatch.setattr("devops_final_backend.services.llm_generator.abstract_generator.backend_pool", backend_pool)
+    return backend_pool
+
+
+def test_01_round_robin():
+    """Check that round robin cycles through all the backends"""
+
+    backends = [routing.Backend("a"), routing.Backend("b")]
+    strategy = routing.RoundRobin()
+
+    assert [strategy.pick(backends).url for _ in range(4)] == ["a", "b", "a", "b"]
+
+
+def test_02_least_outstanding(pool: routing.BackendPool):
+    """Check that the backend with the fewest in-flight requests is picked first
+
+    Args:
+        pool (BackendPool): instance
+    """
+
+    pool.backends[0].outstanding = 2
+    pool.backends[1].outstanding = 1
+
+    assert next(pool.candidates()).url == "http://c"
+
+
+def test_03_latency_weighted():
+    """Check that the latency weighted strategy only picks from the candidates"""
+
+    backends = [routing.Backend("a", latency=0.1), routing.Backend("b", latency=10), routing.Backend("c")]
+    strategy = routing.LatencyWeighted()
+
+    assert {strategy.pick(backends).url for _ in range(20)} <= {"a", "b", "c"}
+
+
+def test_04_ejection(pool: routing.BackendPool):
+    """Check that a backend is ejected after consecutive failures and offered last for failover
+
+    Args:
+        pool (BackendPool): instance
+    """
+
+    for _ in range(2):
+        pool.record_failure(pool.backends[0])
+
+    assert not pool.backends[0].healthy
+    assert [backend.url for backend in pool.candidates()][-1] == "http://a"
+
+
+def test_05_failover(pool: routing.BackendPool, monkeypatch):
+    """Check that a failing backend is skipped in favour of the next one
+
+    Args:
+        pool (BackendPool): instance
+        monkeypatch (Any): instance
+    """
+
+    def fake_chain(base_url, *_args):
+        if base_url == "http://a":
+            return MagicMock(ainvoke=AsyncMock(side_effect=ConnectionError()))
+
+        return MagicMock(ainvoke=AsyncMock(return_value=MagicMock(text=lambda: base_url)))
+
+    gen = ComposeGenerator()
+    monkeypatch.setattr(gen, "get_chain", fake_chain)
+    pool.backends[1].outstanding = 1
+    pool.backends[2].outstanding = 1
+
+    assert asyncio.run(gen.invoke_chain({})).text() in ("http://b", "http://c")
+    assert pool.backends[0].failures == 1
+    assert all(backend.outstanding == 1 for backend in pool.backends[1:])
+
+
+def test_06_all_backends_fail(pool: routing.BackendPool, monkeypatch):
+    """Check that the model failed to respond error is raised only after all backends failed
+
+    Args:
+        pool (BackendPool): instance
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator()
+    monkeypatch.setattr(gen, "get_chain", lambda _url: MagicMock(ainvoke=AsyncMock(side_effect=ConnectionError())))
+
+    with pytest.raises(errors.ModelFailedToRespond):
+        asyncio.run(gen.invoke_chain({}))
+
+    assert all(backend.failures == 1 for backend in pool.backends)
@@ -0,0 +1,83 @@
+"""Test 04: LLM Request Hedging
+
+Test that slow attempts are hedged, that the first successful attempt wins and the other one is cancelled
+and that the hedge rate cap and the observed latency delay are respected
+"""
+
+import asyncio
+
+from devops_final_backend.services.llm_generator.hedging import MIN_SAMPLES, HedgePolicy
+
+
+def make_attempt(delays: list[float], cancelled: list[int]):
+    """Build an attempt factory whose n-th attempt sleeps delays[n] then returns n
+
+    Args:
+        delays (list[float]): the duration of each attempt
+        cancelled (list[int]): receives the index of the cancelled attempts
+
+    Returns:
+        Callable: the attempt factory
+    """
+
+    calls = {"count": 0}
+
+    def attempt():
+        index = calls["count"]
+        calls["count"] += 1
+
+        async def run():
+            try:
+                await asyncio.sleep(delays[index])
+            except asyncio.CancelledError:
+                cancelled.append(index)
+                raise
+
+            return index
+
+        return run()
+
+    return attempt
+
+
+def test_01_fast_attempt_not_hedged() -> None:
+    """Check that an attempt faster than the delay is not duplicated"""
+
+    policy = HedgePolicy(True, 0.05, 0.9, 1)
+    cancelled: list[int] = []
+
+    assert asyncio.run(policy.run(make_attempt([0, 0], cancelled))) == 0
+    assert not cancelled
+
+
+def test_02_slow_attempt_hedged() -> None:
+    """Check that a slow attempt is hedged, the hedge wins and the slow attempt is cancelled"""
+
+    policy = HedgePolicy(True, 0.01, 0.9, 1)
+    cancelled: list[int] = []
+
+    assert asyncio.run(policy.run(make_attempt([10, 0], cancelled))) == 1
+    assert cancelled == [0]
+
+
+def test_03_hedge_rate_cap() -> None:
+    """Check that once the hedge rate is reached, slow attempts are awaited without duplicates"""
+
+    policy = HedgePolicy(True, 0.01, 0.9, 0.5)
+    cancelled: list[int] = []
+
+    assert asyncio.run(policy.run(make_attempt([10, 0], cancelled))) == 1
+    assert asyncio.run(policy.run(make_attempt([0.05, 0], cancelled))) == 0
+    assert cancelled == [0]
+
+
+def test_04_observed_quantile_delay() -> None:
+    """Check that without a fixed delay, hedging starts only after enough latency samples"""
+
+    policy = HedgePolicy(True, None, 0.9, 1)
+    assert policy.hedge_delay() is None
+
+    for _ in range(MIN_SAMPLES):
+        asyncio.run(policy.run(make_attempt([0], [])))
+
+    assert policy.hedge_delay() is not None
@@ -0,0 +1,143 @@
+"""Test 05: LLM Circuit Breaker
+
+Test that the circuit opens on failures, slow calls and timeouts, rejects calls while open
+and closes or re-opens based on the half-open probe call
+"""
+
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from devops_final_backend.services.deadline import Deadline, DeadlineExceeded
+from devops_final_backend.services.llm_generator import ComposeGenerator, errors
+from devops_final_backend.services.llm_generator.abstract_generator import ChainOptions
+from devops_final_backend.services.llm_generator.circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakerConfig,
+    CircuitState,
+)
+from devops_final_backend.settings import settings
+
+
+def fail(breaker: CircuitBreaker) -> None:
+    """Run a failing call through the breaker
+
+    Args:
+        breaker (CircuitBreaker): instance
+    """
+
+    with pytest.raises(ConnectionError):
+        with breaker.guard():
+            raise ConnectionError()
+
+
+def test_01_opens_on_failure_rate() -> None:
+    """Check that the circuit opens once the failure rate is reached and then rejects calls"""
+
+    breaker = CircuitBreaker(CircuitBreakerConfig(min_calls=4))
+
+    with breaker.guard():
+        pass
+
+    for _ in range(3):
+        fail(breaker)
+
+    assert breaker.state == CircuitState.OPEN
+    with pytest.raises(errors.ModelUnavailable) as exc:
+        breaker.acquire()
+
+    assert exc.value.retry_after > 0
+
+
+def test_02_slow_calls_count_as_failures() -> None:
+    """Check that calls slower than the threshold open the circuit"""
+
+    breaker = CircuitBreaker(CircuitBreakerConfig(min_calls=2, slow_call_seconds=1))
+
+    breaker.record(False, 5)
+    breaker.record(False, 5)
+
+    assert breaker.state == CircuitState.OPEN
+
+
+def test_03_half_open_probe() -> None:
+    """Check that after the open period a single probe is allowed and its outcome decides the state"""
+
+    breaker = CircuitBreaker(CircuitBreakerConfig(min_calls=1, open_seconds=0))
+    fail(breaker)
+    assert breaker.state == CircuitState.OPEN
+
+    assert breaker.acquire()
+    assert breaker.state == CircuitState.HALF_OPEN
+    with pytest.raises(errors.ModelUnavailable):
+        breaker.acquire()
+
+    breaker.record(True, 0, probe=True)
+    assert breaker.state == CircuitState.OPEN
+
+    with breaker.guard():
+        pass
+
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_04_probe_ownership() -> None:
+    """Check that only the probe decides or releases the half-open state: a call allowed before the circuit opened
+    neither closes the circuit by succeeding nor frees the probe slot by being cancelled"""
+
+    breaker = CircuitBreaker(CircuitBreakerConfig(min_calls=1, open_seconds=0))
+    with pytest.raises(KeyboardInterrupt):
+        with breaker.guard():
+            fail(breaker)
+            assert breaker.acquire() and breaker.state == CircuitState.HALF_OPEN
+            raise KeyboardInterrupt()
+
+    assert breaker.probing
+    with pytest.raises(errors.ModelUnavailable):
+        breaker.acquire()
+
+    breaker.record(False, 0)
+    assert breaker.state == CircuitState.HALF_OPEN
+
+    breaker.record(False, 0, probe=True)
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_05_timeouts_are_failures(monkeypatch) -> None:
+    """Check that the invocations stopped by the request deadline or the tier timeout are recorded as failures,
+    so that a hanging provider opens the circuit, and that a cancelled invocation is not recorded
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    breaker = CircuitBreaker(CircuitBreakerConfig(min_calls=2, slow_call_seconds=None))
+    monkeypatch.setattr("devops_final_backend.services.llm_generator.abstract_generator.circuit_breaker", breaker)
+    monkeypatch.setattr(settings, "llm_model_tiers", ["small", "big"])
+    monkeypatch.setattr(settings, "llm_tier_timeout", 0.05)
+    gen = ComposeGenerator(dry_run=False)
+
+    async def hang(_params):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(gen, "get_chain", lambda *_args: MagicMock(ainvoke=hang))
+
+    async def cancelled() -> None:
+        task = asyncio.create_task(gen.invoke_chain({}, ChainOptions(tier=1)))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelled())
+    assert breaker.stats()["recent_calls"] == 0
+
+    with pytest.raises(errors.TierTimedOut):
+        asyncio.run(gen.invoke_chain({}, ChainOptions(tier=0)))
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(gen.invoke_chain({}, ChainOptions(tier=1), Deadline(0.05)))
+
+    assert breaker.state == CircuitState.OPEN
+    with pytest.raises(errors.ModelUnavailable):
+        asyncio.run(gen.invoke_chain({}, ChainOptions(tier=1)))
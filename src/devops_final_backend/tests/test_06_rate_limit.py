@@ -0,0 +1,122 @@
+"""Test 06: Rate Limit
+
+Test the request token bucket, the rolling LLM token quota (bounded in memory), the role policies
+and that the SQLite backend shares the limits between limiter instances (as between workers), used by default
+with several workers
+"""
+
+import asyncio
+import time
+
+from devops_final_backend.services.rate_limit import RateLimiter, RateLimitPolicy
+from devops_final_backend.services.rate_limit.backends import MemoryBackend, SQLiteBackend
+from devops_final_backend.services.telemetry import logger
+from devops_final_backend.settings import settings
+
+USER = {"sub": "user-1", "realm_access": {"roles": ["default-roles"]}}
+
+
+def test_01_request_bucket() -> None:
+    """Check that the burst is allowed and the next request is rejected with a retry delay"""
+
+    limiter = RateLimiter(MemoryBackend(), RateLimitPolicy(2, 60, 1000), {}, 3600)
+
+    assert limiter.check(USER).allowed
+    assert limiter.check(USER).allowed
+
+    result = limiter.check(USER)
+    assert not result.allowed
+    assert 0 < result.retry_after <= 60
+    assert result.headers()["X-RateLimit-Remaining"] == "0"
+    assert "Retry-After" in result.headers()
+
+
+def test_02_token_quota() -> None:
+    """Check that once the quota is consumed the requests are rejected until the usage leaves the window"""
+
+    limiter = RateLimiter(MemoryBackend(), RateLimitPolicy(10, 1, 1000), {}, 3600)
+
+    assert limiter.check(USER).tokens_remaining == 1000
+    limiter.consume_tokens(USER, 600)
+    assert limiter.check(USER).tokens_remaining == 400
+    limiter.consume_tokens(USER, 600)
+
+    result = limiter.check(USER)
+    assert not result.allowed
+    assert 3500 < result.retry_after <= 3600
+
+
+def test_03_role_policy() -> None:
+    """Check that the most generous policy of the user's roles applies"""
+
+    roles = {"premium": RateLimitPolicy(100, 1, 10_000), "trial": RateLimitPolicy(1, 60, 100)}
+    limiter = RateLimiter(MemoryBackend(), RateLimitPolicy(10, 1, 1000), roles, 3600)
+
+    assert limiter.policy(USER).requests == 10
+    assert limiter.policy({"sub": "u", "realm_access": {"roles": ["trial", "premium"]}}).requests == 100
+
+
+def test_04_sqlite_shared_between_workers(tmp_path) -> None:
+    """Check that two limiters on the same database file share the user's bucket and quota
+
+    Args:
+        tmp_path (Path): pytest temporary directory
+    """
+
+    path = str(tmp_path / "limits.sqlite3")
+    worker_1 = RateLimiter(SQLiteBackend(path), RateLimitPolicy(2, 60, 1000), {}, 3600)
+    worker_2 = RateLimiter(SQLiteBackend(path), RateLimitPolicy(2, 60, 1000), {}, 3600)
+
+    assert worker_1.check(USER).allowed
+    assert worker_2.check(USER).allowed
+    assert not worker_1.check(USER).allowed
+
+    worker_1.consume_tokens(USER, 300)
+    assert worker_2.backend.get_usage("user-1", 0)[0][1] == 300
+
+
+def test_05_usage_bounded(monkeypatch) -> None:
+    """Check that the usage events leaving the window are dropped on write, that nothing is recorded
+    when rate limiting is disabled, and that the async charge records the tokens
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    backend = MemoryBackend()
+    limiter = RateLimiter(backend, RateLimitPolicy(10, 1, 1000), {}, 3600)
+    backend.add_usage("user-1", 100, time.time() - 7200, 0)
+
+    asyncio.run(limiter.charge(USER, 50))
+    assert [tokens for _, tokens in backend.get_usage("user-1", 0)] == [50]
+
+    monkeypatch.setattr(settings, "rate_limit", False)
+    limiter.consume_tokens(USER, 50)
+    assert len(backend.get_usage("user-1", 0)) == 1
+
+
+def test_06_backend_follows_workers(tmp_path, monkeypatch) -> None:
+    """Check that the limits are shared in SQLite by default when the server runs several workers,
+    and that the in-memory limits of several workers are reported
+
+    Args:
+        tmp_path (Path): temporary folder of the database
+        monkeypatch (Any): instance
+    """
+
+    warnings = []
+    monkeypatch.setattr(logger, "warning", lambda message, *args: warnings.append(message % args))
+    monkeypatch.setattr(settings, "rate_limit_sqlite_path", str(tmp_path / "limits.sqlite3"))
+    monkeypatch.setattr(settings, "rate_limit_backend", None)
+    monkeypatch.setattr(settings, "debug", False)
+    monkeypatch.setattr(settings, "app_workers", 4)
+    assert isinstance(RateLimiter.from_settings().backend, SQLiteBackend)
+
+    monkeypatch.setattr(settings, "app_workers", 1)
+    assert isinstance(RateLimiter.from_settings().backend, MemoryBackend)
+    assert not warnings
+
+    monkeypatch.setattr(settings, "app_workers", 4)
+    monkeypatch.setattr(settings, "rate_limit_backend", "memory")
+    assert isinstance(RateLimiter.from_settings().backend, MemoryBackend)
+    assert warnings == ["in-memory rate limits are applied per worker, multiplied by the 4 workers"]
@@ -0,0 +1,103 @@
+"""Test 07: Multi-Artifact Pipeline
+
+Test the validation of the Helm and Terraform files and that a failing pipeline stage
+does not affect the other stages
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from yaml import safe_dump
+
+from devops_final_backend.services.llm_generator import (
+    ComposeGenerator,
+    GenerationContext,
+    HelmGenerator,
+    Pipeline,
+    TerraformGenerator,
+    compose_generator,
+    errors,
+    models,
+)
+from devops_final_backend.services.llm_generator import pipeline as shared_pipeline
+
+PARAMS = {
+    "services": ["redis"],
+    "network_name": "net",
+    "network_exists": False,
+    "volume_mount": False,
+}
+
+HELM_FILES = {
+    "Chart.yaml": "apiVersion: v2\nname: demo\nversion: 0.1.0\n",
+    "values.yaml": "redis:\n  image: redis:7\n",
+    "templates/redis-deployment.yaml": "kind: Deployment\n",
+}
+
+TERRAFORM_FILES = {
+    "main.tf": 'resource "docker_network" "net" {\n  name = "net"\n}\n'
+    'resource "docker_container" "redis" {\n  image = "redis:7"\n}\n',
+}
+
+
+def test_01_helm_validation() -> None:
+    """Check that a chart without templates or with an incomplete Chart.yaml is rejected"""
+
+    generator = HelmGenerator(dry_run=True)
+    generator.validate_files(HELM_FILES, PARAMS)
+
+    with pytest.raises(errors.ValidationError):
+        generator.validate_files({**HELM_FILES, "Chart.yaml": "name: demo\n"}, PARAMS)
+
+    with pytest.raises(errors.ValidationError):
+        generator.validate_files({"Chart.yaml": HELM_FILES["Chart.yaml"], "values.yaml": "{}"}, PARAMS)
+
+
+def test_02_terraform_validation() -> None:
+    """Check that unbalanced braces and a missing network are rejected"""
+
+    generator = TerraformGenerator(dry_run=True)
+    generator.validate_files(TERRAFORM_FILES, PARAMS)
+
+    with pytest.raises(errors.ValidationError):
+        generator.validate_files({"main.tf": TERRAFORM_FILES["main.tf"] + "{"}, PARAMS)
+
+    with pytest.raises(errors.ValidationError):
+        generator.validate_files(TERRAFORM_FILES, {**PARAMS, "network_name": "other"})
+
+
+def test_03_stage_failure_is_isolated(monkeypatch) -> None:
+    """Check that a failing stage is reported without affecting the successful stage
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    pipeline = Pipeline()
+    resp = MagicMock(text=lambda: safe_dump(HELM_FILES), usage_metadata={"input_tokens": 10, "output_tokens": 5})
+    monkeypatch.setattr(
+        pipeline.generators["helm"], "get_chain", lambda *_args: MagicMock(ainvoke=AsyncMock(return_value=resp))
+    )
+    monkeypatch.setattr(
+        pipeline.generators["terraform"],
+        "get_chain",
+        lambda *_args: MagicMock(ainvoke=AsyncMock(side_effect=RuntimeError("boom"))),
+    )
+
+    contexts = {"helm": GenerationContext(), "terraform": GenerationContext()}
+    helm, terraform = asyncio.run(pipeline.run(PARAMS, contexts))
+
+    assert helm.status == models.StageStatus.OK
+    assert helm.tokens == contexts["helm"].usage.total_tokens == 15
+    assert {file.name for file in helm.files} == set(HELM_FILES)
+    assert terraform.status == models.StageStatus.FAILED
+    assert terraform.error is not None
+    assert not terraform.files
+
+
+def test_04_shared_compose_generator() -> None:
+    """Check that the shared pipeline reuses the shared compose generator"""
+
+    assert shared_pipeline.generators["compose"] is compose_generator
+    assert isinstance(Pipeline().generators["compose"], ComposeGenerator)
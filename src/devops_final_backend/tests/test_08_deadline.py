@@ -0,0 +1,106 @@
+"""Test 08: Request Deadlines
+
+Test the client time budget parsing and that the remaining budget bounds the token introspection,
+the generation attempts and the regeneration decision
+"""
+
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from devops_final_backend.services import auth
+from devops_final_backend.services.deadline import Deadline, DeadlineExceeded, request_deadline
+from devops_final_backend.services.llm_generator import ComposeGenerator, GenerationContext
+from devops_final_backend.services.llm_generator.routing import backend_pool
+from devops_final_backend.settings import settings
+
+PARAMS = {"services": ["redis"], "network_name": "net", "network_exists": False, "volume_mount": False}
+
+
+def test_01_request_deadline(monkeypatch) -> None:
+    """Check the server default, the header precedence and the server cap
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    monkeypatch.setattr(settings, "request_timeout_default", 30)
+    monkeypatch.setattr(settings, "request_timeout_max", 60)
+
+    assert request_deadline(None, None).timeout == 30
+    assert request_deadline(10, 20).timeout == 10
+    assert request_deadline(None, 20).timeout == 20
+    assert request_deadline(600, None).timeout == 60
+    assert 59 < request_deadline(600, None).remaining() <= 60
+
+
+def test_02_auth_bounded(monkeypatch) -> None:
+    """Check that a slow introspection is cancelled with a deadline error instead of an auth error
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    async def slow_introspect(_token):
+        await asyncio.sleep(10)
+
+    async def introspect(_token):
+        return {"sub": "user"}
+
+    monkeypatch.setattr(auth.keycloak_openid, "a_introspect", slow_introspect)
+    with pytest.raises(DeadlineExceeded) as err:
+        asyncio.run(auth.get_current_user("token", Deadline(0.05)))
+
+    assert err.value.stage == "authentication"
+
+    monkeypatch.setattr(auth.keycloak_openid, "a_introspect", introspect)
+    assert asyncio.run(auth.get_current_user("token", Deadline(1))) == {"sub": "user"}
+
+
+def test_03_attempt_bounded(monkeypatch) -> None:
+    """Check that an attempt running past the deadline is cancelled and releases its backend
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator(dry_run=False)
+
+    async def slow_ainvoke(_params):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(gen, "get_chain", lambda *_args: MagicMock(ainvoke=slow_ainvoke))
+
+    with pytest.raises(DeadlineExceeded) as err:
+        asyncio.run(gen.run(PARAMS, GenerationContext(deadline=Deadline(0.05))))
+
+    assert err.value.stage == "generation"
+    assert all(backend.outstanding == 0 for backend in backend_pool.backends)
+
+
+def test_04_regeneration_skipped(monkeypatch) -> None:
+    """Check that no regeneration starts when the remaining budget is shorter than the first attempt
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator(dry_run=False)
+    calls = {"count": 0}
+
+    async def invalid_ainvoke(_params):
+        calls["count"] += 1
+        await asyncio.sleep(0.1)
+        return MagicMock(text=lambda: "invalid_yaml:", usage_metadata={"input_tokens": 1, "output_tokens": 1})
+
+    monkeypatch.setattr(gen, "get_chain", lambda *_args: MagicMock(ainvoke=invalid_ainvoke))
+    context = GenerationContext(deadline=Deadline(0.15))
+
+    with pytest.raises(DeadlineExceeded) as err:
+        asyncio.run(gen.run(PARAMS, context))
+
+    assert err.value.stage == "regeneration"
+    assert "missing services configuration" in err.value.message
+    assert calls["count"] == 1
+    assert not context.retry
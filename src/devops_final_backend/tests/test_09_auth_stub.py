@@ -0,0 +1,152 @@
+"""Test 09: Auth against the Keycloak stand-in
+
+Test the token flow of the auth service against the in-process OIDC stand-in (see keycloak_stub),
+the cost of concurrent token introspections, the injected latency and failures and the admin role
+"""
+
+import asyncio
+import time
+
+import httpx
+import keycloak
+import pytest
+from fastapi import HTTPException
+from jwcrypto import jwk, jwt  # type: ignore[import-untyped]  # no type hints published
+
+from devops_final_backend.services import auth
+from devops_final_backend.services.deadline import Deadline, DeadlineExceeded
+from devops_final_backend.services.llm_generator.usage import TokenUsage, usage_ledger
+from devops_final_backend.services.telemetry import metrics
+from devops_final_backend.settings import settings
+
+from .keycloak_stub import KeycloakStub, StubRealm
+
+
+@pytest.fixture(name="stub", scope="module")
+def fixture_stub():
+    """Keycloak stand-in installed in the auth service for the tests of the module
+
+    Yields:
+        KeycloakStub: the running stand-in
+    """
+
+    realm = StubRealm.from_settings()
+    realm.roles = {username: ["premium"] for username in realm.users}
+    with KeycloakStub(realm).install(auth.keycloak_openid) as stub:
+        yield stub
+
+
+def login(stub: KeycloakStub) -> str:
+    """Obtain an access token of the stand-in test user through the auth service
+
+    Args:
+        stub (KeycloakStub): the running stand-in
+
+    Returns:
+        str: the access token
+    """
+
+    username, password = next(iter(stub.realm.users.items()))
+    return auth.get_user_tokens(username, password)["access_token"]
+
+
+def test_01_token_flow(stub: KeycloakStub) -> None:
+    """Check the password grant, the introspection of valid and invalid tokens and the JWKS signature check
+
+    Args:
+        stub (KeycloakStub): the running stand-in
+    """
+
+    token = login(stub)
+    user_info = asyncio.run(auth.get_current_user(token, Deadline(5)))
+    assert user_info["active"] is True
+    assert user_info["preferred_username"] in stub.realm.users
+    assert user_info["realm_access"]["roles"] == ["premium"]
+
+    with pytest.raises(HTTPException) as err:
+        asyncio.run(auth.get_current_user(token[:-4] + "AAAA", Deadline(5)))
+    assert err.value.status_code == 401
+
+    with pytest.raises(keycloak.exceptions.KeycloakAuthenticationError):
+        auth.get_user_tokens("user", "pass")
+
+    certs = httpx.get(f"{stub.issuer}/protocol/openid-connect/certs").json()
+    key = jwk.JWK(**certs["keys"][0])
+    assert jwt.JWT(key=key, jwt=token).claims
+
+
+def test_02_concurrent_introspection(stub: KeycloakStub) -> None:
+    """Check that concurrent introspections overlap instead of queueing behind each other
+
+    Args:
+        stub (KeycloakStub): the running stand-in
+    """
+
+    token = login(stub)
+
+    async def authenticate(count: int) -> list[dict]:
+        return await asyncio.gather(*[auth.get_current_user(token, Deadline(5)) for _ in range(count)])
+
+    stub.latency, introspections = 0.2, stub.calls["introspect"]
+    try:
+        start = time.monotonic()
+        results = asyncio.run(authenticate(50))
+        elapsed = time.monotonic() - start
+    finally:
+        stub.latency = 0
+
+    assert len({user_info["sub"] for user_info in results}) == 1
+    assert stub.calls["introspect"] - introspections == 50
+    assert elapsed < 50 * 0.2 / 5
+
+
+def test_03_failure_injection(stub: KeycloakStub) -> None:
+    """Check that provider failures are rejected as invalid tokens and a slow provider as an expired deadline
+
+    Args:
+        stub (KeycloakStub): the running stand-in
+    """
+
+    token = login(stub)
+
+    stub.failure_rate = 1
+    try:
+        with pytest.raises(HTTPException) as err:
+            asyncio.run(auth.get_current_user(token, Deadline(5)))
+    finally:
+        stub.failure_rate = 0
+    assert err.value.status_code == 401
+
+    stub.latency = 1
+    try:
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(auth.get_current_user(token, Deadline(0.1)))
+    finally:
+        stub.latency = 0
+
+    assert settings.keycloak_realm in stub.issuer
+
+
+def test_04_admin_role(stub: KeycloakStub) -> None:
+    """Check that the per user usage is only exposed to the users holding the admin realm role
+
+    Args:
+        stub (KeycloakStub): the running stand-in
+    """
+
+    user_info = asyncio.run(auth.get_current_user(login(stub), Deadline(5)))
+    with pytest.raises(HTTPException) as err:
+        auth.require_admin(user_info)
+    assert err.value.status_code == 403
+
+    usage_ledger.record(user_info["sub"], "ComposeGenerator", "services=1", TokenUsage(attempts=1, prompt_tokens=3))
+    assert "user" not in metrics.snapshot()["llm_usage"]
+    assert usage_ledger.stats(("user",))["user"][user_info["sub"]]["prompt_tokens"] >= 3
+
+    roles = dict(stub.realm.roles)
+    stub.realm.roles = {username: ["premium", settings.keycloak_admin_role] for username in stub.realm.users}
+    try:
+        admin_info = asyncio.run(auth.get_current_user(login(stub), Deadline(5)))
+    finally:
+        stub.realm.roles = roles
+    assert auth.require_admin(admin_info) is admin_info
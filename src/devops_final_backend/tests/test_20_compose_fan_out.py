@@ -0,0 +1,198 @@
+"""Test 20: Compose Fan-Out Generation
+
+Test that the requested services are generated by concurrent per-service generations and that the blocks are
+merged with the shared dependencies kept once, the conflicting or invalid blocks being regenerated
+"""
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from yaml import safe_dump, safe_load
+
+from devops_final_backend.services.llm_generator import ComposeGenerator, GenerationContext, errors
+from devops_final_backend.services.llm_generator.compose_merger import compose_merger
+from devops_final_backend.services.llm_generator.compose_validator import compose_validator
+from devops_final_backend.services.llm_generator.offload import yaml_offload
+from devops_final_backend.settings import settings
+
+
+def test_01_fan_out_merge(monkeypatch) -> None:
+    """Check that the services are generated concurrently and merged with the shared dependency kept once
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator(dry_run=False)
+    blocks = {
+        "[ web ]": (
+            0.3,
+            {
+                "services": {
+                    "web": {"image": "nginx:1.27", "depends_on": ["cache"], "networks": ["net"]},
+                    "cache": {"image": "redis:7", "networks": ["net"]},
+                    "database": {"image": "postgres:16", "environment": {"POSTGRES_DB": "web"}},
+                },
+                "networks": {"net": None},
+            },
+        ),
+        "[ api ]": (
+            0.2,
+            {
+                "services": {
+                    "api": {"image": "node:22", "depends_on": ["redis"], "environment": {"REDIS_HOST": "redis"}},
+                    "redis": {"image": "redis:7", "networks": ["net"]},
+                    "db": {"image": "postgres:16", "environment": {"POSTGRES_DB": "api"}},
+                },
+                "networks": {"net": None},
+                "volumes": {"data": None},
+            },
+        ),
+    }
+
+    def get_chain(*_args):
+        async def ainvoke(params):
+            delay, block = blocks[params["services"]]
+            await asyncio.sleep(delay)
+            return MagicMock(
+                text=lambda: safe_dump(block, sort_keys=False), usage_metadata={"input_tokens": 1, "output_tokens": 1}
+            )
+
+        return MagicMock(ainvoke=ainvoke)
+
+    monkeypatch.setattr(gen, "get_chain", get_chain)
+    monkeypatch.setattr(settings, "llm_fan_out_min_services", 2)
+    params = {"services": ["web", "api"], "network_name": "net", "network_exists": False, "volume_mount": False}
+    context = GenerationContext()
+
+    start = time.monotonic()
+    files = asyncio.run(gen.run(params, context))
+
+    assert time.monotonic() - start < 0.45
+    data = safe_load(files[-1].data)
+    assert list(data["services"]) == ["web", "cache", "database", "api", "db"]
+    assert data["services"]["api"]["depends_on"] == ["cache"]
+    assert data["services"]["cache"]["networks"] == {"net": {"aliases": ["redis"]}}
+    assert data["volumes"] == {"data": {}}
+    assert [file.name for file in files] == [".env.database", ".env.api", ".env.db", "compose.yml"]
+    assert context.usage.attempts == 2
+    assert gen.fan_out_enabled(["web"], context) is False
+
+
+def test_02_fan_out_regenerates_the_invalid_blocks(monkeypatch) -> None:
+    """Check that the blocks are merged without rendering them, and that a merged configuration violation
+    regenerates only the block of the invalid service (with the violation) before merging again
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator(dry_run=False)
+    blocks = {
+        "[ web ]": {"services": {"web": {"image": "nginx:1.27"}}, "networks": {"net": None}},
+        "[ api ]": {"services": {"api": {"image": "node:22"}}, "networks": {"net": None}},
+    }
+    prompts = []
+
+    def get_chain(*_args):
+        async def ainvoke(params):
+            prompts.append((params["services"], params["additional_instructions"]))
+            block = blocks[params["services"]]
+            if params["additional_instructions"] and params["services"] == "[ api ]":
+                block = {**block, "services": {"api": {"image": "node:22-slim"}}}
+            return MagicMock(text=lambda: safe_dump(block), usage_metadata={"input_tokens": 1, "output_tokens": 1})
+
+        return MagicMock(ainvoke=ainvoke)
+
+    validate, merged = compose_validator.validate, [False]
+
+    def validate_merged(data, params):
+        # the api block conflicts with the web block once merged, until regenerated with another image
+        merged.append(merged[-1] or {"web", "api"} <= set(data["services"]))
+        if merged[-1] and data["services"].get("api", {}).get("image") == "node:22":
+            return ["invalid services.api.ports"]
+
+        return validate(data, params)
+
+    dump_all = AsyncMock(return_value=[])
+    monkeypatch.setattr(gen, "get_chain", get_chain)
+    monkeypatch.setattr(compose_validator, "validate", validate_merged)
+    monkeypatch.setattr(yaml_offload, "dump_all", dump_all)
+    monkeypatch.setattr(settings, "llm_fan_out_min_services", 2)
+    params = {"services": ["web", "api"], "network_name": "net", "network_exists": False, "volume_mount": False}
+    context = GenerationContext()
+
+    data = asyncio.run(gen.generate(params, gen.assign_param_defaults(params, context), context))
+    assert data["services"] == {"web": {"image": "nginx:1.27"}, "api": {"image": "node:22-slim"}}
+    assert not dump_all.called
+    assert sorted(prompts[:2]) == [("[ api ]", ""), ("[ web ]", "")]
+    assert prompts[2][0] == "[ api ]" and "invalid services.api.ports" in prompts[2][1] and len(prompts) == 3
+    assert context.usage.attempts == 3
+
+    # a violation not specific to a service regenerates all the blocks, once
+    prompts[:] = []
+    monkeypatch.setattr(
+        compose_validator,
+        "validate",
+        lambda data, params: ["missing network configuration"] if len(data["services"]) > 1 else [],
+    )
+    with pytest.raises(errors.InvalidModelResponse):
+        asyncio.run(gen.generate(params, gen.assign_param_defaults(params, context), GenerationContext()))
+    assert sorted(services for services, _ in prompts) == ["[ api ]", "[ api ]", "[ web ]", "[ web ]"]
+
+
+def test_03_fan_out_keeps_the_owned_definition(monkeypatch) -> None:
+    """Check that of two different definitions of a service name, the one of the block generating the requested
+    service is kept with its environment, and that the other block is regenerated with the conflicts
+    (of the service and of a volume) instead of being aliased
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator(dry_run=False)
+    database = {"image": "postgres:13", "environment": {"POSTGRES_DB": "app"}, "volumes": ["data:/var/lib/data"]}
+    blocks = {
+        "[ nginx ]": {
+            "services": {
+                "nginx": {"image": "nginx:1.27", "depends_on": ["db"]},
+                "db": {"image": "postgres:16", "environment": {"POSTGRES_DB": "web"}, "volumes": ["data:/data"]},
+            },
+            "networks": {"net": None},
+            "volumes": {"data": {"driver": "local"}},
+        },
+        "[ postgres:13 ]": {"services": {"db": database}, "networks": {"net": None}, "volumes": {"data": None}},
+    }
+    prompts = []
+
+    def get_chain(*_args):
+        async def ainvoke(params):
+            prompts.append((params["services"], params["additional_instructions"]))
+            block = blocks[params["services"]]
+            if params["additional_instructions"]:
+                block = {**blocks["[ postgres:13 ]"], "services": {**block["services"], "db": database}}
+            return MagicMock(
+                text=lambda: safe_dump(block, sort_keys=False), usage_metadata={"input_tokens": 1, "output_tokens": 1}
+            )
+
+        return MagicMock(ainvoke=ainvoke)
+
+    monkeypatch.setattr(gen, "get_chain", get_chain)
+    monkeypatch.setattr(settings, "llm_fan_out_min_services", 2)
+    params = {"services": ["nginx", "postgres:13"], "network_name": "net", "network_exists": False}
+    context = GenerationContext()
+    files = asyncio.run(gen.run({**params, "volume_mount": False}, context))
+
+    data = safe_load(files[-1].data)
+    assert list(data["services"]) == ["nginx", "db"] and data["services"]["db"]["image"] == "postgres:13"
+    assert data["volumes"] == {"data": {}}
+    assert {file.name: safe_load(file.data) for file in files[:-1]} == {".env.db": {"POSTGRES_DB": "app"}}
+    assert prompts[2][0] == "[ nginx ]" and len(prompts) == 3
+    assert "services.db conflicts" in prompts[2][1] and "volumes.data conflicts" in prompts[2][1]
+
+    # without an owner, the first definition is kept and the later document reported
+    first = {"services": {"db": {"image": "postgres:16"}}}
+    _, _, conflicts = compose_merger.merge([(first, {}), ({"services": {"db": {"image": "mysql:8"}}}, {})], "net")
+    assert list(conflicts) == [1]
@@ -0,0 +1,53 @@
+"""Test 22: Image Catalog
+
+Test the image normalization and tag lookup of the offline image catalog and the image violations
+of the compose validator
+"""
+
+from devops_final_backend.services.image_catalog import CATALOG_PATH, ImageCatalog
+from devops_final_backend.services.llm_generator.compose_validator import compose_validator
+from devops_final_backend.settings import settings
+
+
+def test_01_image_catalog(tmp_path, monkeypatch) -> None:
+    """Check the image normalization, the semver tag lookup and that the images missing from the catalog
+    (unknown tags included, like releases newer than the catalog) are violations only in strict mode
+
+    Args:
+        tmp_path (Path): temporary folder of the index
+        monkeypatch (Any): instance
+    """
+
+    catalog = ImageCatalog(CATALOG_PATH, tmp_path / "index.sqlite3")
+
+    assert catalog.normalize("docker.io/library/redis:7") == "redis:7"
+    assert catalog.normalize("keycloak/keycloak:26.3.2") == "quay.io/keycloak/keycloak:26.3.2"
+    for image in ("redis", "redis:7", "redis:7.2.5", "redis:7-alpine", "redis:alpine", "postgres:16.4-alpine"):
+        assert catalog.check(image) is None, image
+
+    for image in ("redis:7.1", "redis:7.2.99", "postgres:16-foo", "redis:banana"):
+        assert (error := catalog.check(image)) and error.startswith("unknown tag"), image
+
+    assert catalog.check("bitnami/redis:7") == "unknown image bitnami/redis, did you mean bitnami/kafka or redis"
+
+    params = {"services": "[ redis ]", "network_name": "net", "network_exists": "", "volume_mount": ""}
+    monkeypatch.setattr("devops_final_backend.services.llm_generator.compose_validator.image_catalog", catalog)
+    for image in (
+        "mariadb:12",
+        "postgres:18",
+        "postgres:17.6",
+        "redis:8.2",
+        "redis:7.1",
+        "nginx:1.29.1",
+        "postgres:16-alpine3.20",
+        "quay.io/keycloak/keycloak:26.4",
+        "bitnami/redis:7",
+    ):
+        config = {"services": {"db": {"image": image}}, "networks": {"net": {}}}
+        assert compose_validator.validate(config, params) == [], image
+
+    monkeypatch.setattr(settings, "image_catalog_strict", True)
+    config = {"services": {"redis": {"image": "redis:7.1"}}, "networks": {"net": {}}}
+    assert compose_validator.validate(config, params) == [
+        "unknown tag 7.1 for image redis (known versions: 8.0.2, 7.4.2, 7.2.7) for service redis"
+    ]
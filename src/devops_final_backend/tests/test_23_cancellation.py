@@ -0,0 +1,55 @@
+"""Test 23: Generation Cancellation
+
+Test that a client disconnect cancels the in-flight generation
+"""
+
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from devops_final_backend.services.llm_generator import (
+    ComposeGenerator,
+    GenerationContext,
+    cancel_on_disconnect,
+    errors,
+)
+from devops_final_backend.services.llm_generator.routing import backend_pool
+from devops_final_backend.services.telemetry import metrics
+
+
+def test_01_cancel_on_disconnect(monkeypatch) -> None:
+    """Check that a client disconnect cancels the provider call without a retry and releases the backend
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator(dry_run=False)
+    provider = {"calls": 0, "cancelled": 0}
+
+    async def fake_ainvoke(_params):
+        provider["calls"] += 1
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            provider["cancelled"] += 1
+            raise
+
+    monkeypatch.setattr(gen, "get_chain", lambda *_args: MagicMock(ainvoke=fake_ainvoke))
+    params = {"services": ["redis"], "network_name": "net", "network_exists": False, "volume_mount": False}
+    checks = iter([False, False, True])
+    key = metrics.key("llm_generation_cancelled_total", {"generator": "ComposeGenerator"})
+    cancelled = metrics.snapshot()["counters"].get(key, 0)
+
+    async def is_disconnected() -> bool:
+        return next(checks)
+
+    with pytest.raises(errors.GenerationCancelled):
+        asyncio.run(
+            cancel_on_disconnect(gen.run(params, GenerationContext()), is_disconnected, "ComposeGenerator", 0.01)
+        )
+
+    assert provider == {"calls": 1, "cancelled": 1}
+    assert all(backend.outstanding == 0 for backend in backend_pool.backends)
+    assert metrics.snapshot()["counters"][key] == cancelled + 1
@@ -0,0 +1,64 @@
+"""Test 24: Record and Replay
+
+Test that the recorded model calls are replayed by the replay provider
+"""
+
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from langchain_core.messages import AIMessage
+from yaml import safe_dump
+
+from devops_final_backend.services.llm_generator import ComposeGenerator, GenerationContext, errors
+from devops_final_backend.services.llm_generator.abstract_generator import AbstractGenerator
+from devops_final_backend.services.llm_generator.cassette import Cassette
+from devops_final_backend.settings import settings
+
+
+def test_01_record_replay(tmp_path, monkeypatch) -> None:
+    """Check that a recorded generation is replayed with the same output, usage and scaled latency,
+    and that an unrecorded prompt or model fails like an unavailable model
+
+    Args:
+        tmp_path (Path): temporary folder of the cassette
+        monkeypatch (Any): instance
+    """
+
+    cassette = Cassette(tmp_path / "cassette.jsonl.gz")
+    monkeypatch.setattr("devops_final_backend.services.llm_generator.abstract_generator.cassette", cassette)
+    monkeypatch.setattr(settings, "llm_record", True)
+    content = safe_dump({"services": {"redis": {"image": "redis:7"}}, "networks": {"net": None}})
+
+    async def fake_ainvoke(_params):
+        await asyncio.sleep(0.2)
+        return AIMessage(content=content, usage_metadata={"input_tokens": 7, "output_tokens": 3, "total_tokens": 10})
+
+    recorder = ComposeGenerator(dry_run=False)
+    monkeypatch.setattr(recorder, "get_chain", lambda *_args: MagicMock(ainvoke=fake_ainvoke))
+    params = {"services": ["redis"], "network_name": "net", "network_exists": False, "volume_mount": False}
+    recorded = asyncio.run(recorder.run(params))
+    assert len(cassette.load()) == 1
+
+    monkeypatch.setattr(settings, "llm_provider", "replay")
+    monkeypatch.setattr(settings, "llm_replay_latency_scale", 0.25)
+    monkeypatch.setattr(AbstractGenerator, "_models", {})
+    monkeypatch.setattr(AbstractGenerator, "_chains", {})
+    context = GenerationContext()
+    start = time.monotonic()
+    replayed = asyncio.run(ComposeGenerator(dry_run=False).run(params, context))
+
+    assert 0.05 <= time.monotonic() - start < 0.2
+    assert replayed == recorded
+    assert context.usage.total_tokens == 10
+
+    with pytest.raises(errors.ModelFailedToRespond):
+        asyncio.run(ComposeGenerator(dry_run=False).run({**params, "services": ["postgres"]}))
+
+    # the same prompt sent to another model (or with another budget or output mode) is not replayed
+    monkeypatch.setattr(settings, "llm_model_tiers", ["other"])
+    monkeypatch.setattr(AbstractGenerator, "_models", {})
+    monkeypatch.setattr(AbstractGenerator, "_chains", {})
+    with pytest.raises(errors.ModelFailedToRespond):
+        asyncio.run(ComposeGenerator(dry_run=False).run(params))
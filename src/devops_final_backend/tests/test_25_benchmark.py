@@ -0,0 +1,92 @@
+"""Test 25: Benchmark
+
+Test the benchmark runner, its report and the comparison with a baseline
+"""
+
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+from yaml import safe_dump
+
+from devops_final_backend.benchmark import BenchmarkRunner, compare, render
+from devops_final_backend.services.llm_generator import ComposeGenerator
+from devops_final_backend.settings import settings
+
+
+def test_01_benchmark_report(monkeypatch) -> None:
+    """Check that the benchmark runs the corpus cases and reports comparable outcomes, attempts and tokens
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator(dry_run=False)
+
+    async def ainvoke(params):
+        if "[ redis:7 ]" in params["services"]:
+            content = safe_dump({"services": {"redis": {"image": "redis:7"}}, "networks": {"cache_net": None}})
+        elif params["additional_instructions"]:
+            content = "invalid_yaml:"
+        else:
+            content = safe_dump({"services": {"db": {"image": "postgres:16"}}})
+        return MagicMock(text=lambda: content, usage_metadata={"input_tokens": 10, "output_tokens": 5})
+
+    monkeypatch.setattr(gen, "get_chain", lambda *_args: MagicMock(ainvoke=ainvoke))
+    runner = BenchmarkRunner(gen, concurrency=2)
+    corpus = runner.load_corpus(names=["single-redis", "single-postgres-local-volumes"])
+    report = asyncio.run(runner.run(corpus))
+
+    valid, invalid = report["cases"]
+    assert (valid["case"], valid["outcome"], valid["reason"]) == ("single-redis", "valid", None)
+    assert valid["usage"] == {
+        "attempts": 1,
+        "prompt_tokens": 10,
+        "completion_tokens": 5,
+        "retry_tokens": 0,
+        "total_tokens": 15,
+    }
+    assert (invalid["outcome"], invalid["usage"]["attempts"], invalid["usage"]["retry_tokens"]) == ("invalid", 2, 15)
+    assert "missing services configuration" in invalid["reason"]
+    assert report["summary"]["outcomes"] == {"invalid": 1, "valid": 1}
+    assert report["summary"]["valid_rate"] == 0.5 and report["summary"]["tokens_mean"] == 22.5
+    assert report["metadata"]["prompt_fingerprint"] and "single-redis" in render(report)
+
+    baseline = {**report, "summary": {**report["summary"], "valid_rate": 1.0}, "metadata": {"provider": "other"}}
+    comparison = compare(baseline, report)
+    assert "-0.500" in comparison and "changed provider" in comparison
+    with pytest.raises(KeyError):
+        runner.load_corpus(names=["missing"])
+
+
+def test_02_regeneration_reason(monkeypatch) -> None:
+    """Check that a case regenerated several times reports the error of its first attempt, not of its last one
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    gen = ComposeGenerator(dry_run=False)
+    # model tier: response, the first two tiers fail differently
+    responses = {
+        0: "invalid_yaml:",
+        1: safe_dump({"services": {"db": {"image": "postgres:16"}}}),
+        2: safe_dump({"services": {"redis": {"image": "redis:7"}}, "networks": {"cache_net": None}}),
+    }
+
+    def get_chain(_url, _structured, _max_tokens, _candidate=0, tier=0):
+        async def ainvoke(_params):
+            content = responses[tier]
+            return MagicMock(text=lambda: content, usage_metadata={"input_tokens": 10, "output_tokens": 5})
+
+        return MagicMock(ainvoke=ainvoke)
+
+    monkeypatch.setattr(gen, "get_chain", get_chain)
+    monkeypatch.setattr(settings, "llm_model_tiers", ["small", "medium", "big"])
+    runner = BenchmarkRunner(gen)
+    report = asyncio.run(runner.run(runner.load_corpus(names=["single-redis"])))
+
+    (result,) = report["cases"]
+    assert (result["outcome"], result["usage"]["attempts"]) == ("regenerated", 3)
+    # only the response of the first tier has no services
+    assert "missing services configuration" in result["reason"]
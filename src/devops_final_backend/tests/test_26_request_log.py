@@ -0,0 +1,65 @@
+"""Test 26: Structured Logging
+
+Test the request log middleware and the non-blocking JSON log pipeline
+"""
+
+import io
+import json
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from devops_final_backend.api.request_log import RequestLogMiddleware
+from devops_final_backend.services.telemetry import bind, log_pipeline, logger, timing
+from devops_final_backend.settings import settings
+
+
+def test_01_structured_request_log(monkeypatch) -> None:
+    """Check that the request log records carry the request context and that only the failed requests
+    are logged when the successful ones are not sampled
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    app = FastAPI()
+    app.add_middleware(RequestLogMiddleware)
+
+    @app.get("/ok")
+    async def ok() -> str:
+        bind(user="user-1")
+        timing("generation", 0.25)
+        timing("generation", 0.25)
+        logger.info("generation completed", extra={"attempt": 1})
+        return "ok"
+
+    @app.get("/fail")
+    async def fail() -> str:
+        raise HTTPException(status_code=424)
+
+    stream = io.StringIO()
+    log_pipeline.start(stream)
+    try:
+        with TestClient(app) as client:
+            resp = client.get("/ok", headers={"X-Request-ID": "req-1"})
+            monkeypatch.setattr(settings, "log_sample_rate", 0)
+            client.get("/ok")
+            failed = client.get("/fail", headers={"X-Request-ID": "bad id"})
+    finally:
+        log_pipeline.stop()
+
+    generation, request, failure = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert resp.headers["X-Request-ID"] == "req-1" and len(failed.headers["X-Request-ID"]) == 32
+    assert (generation["message"], generation["request_id"], generation["attempt"]) == (
+        "generation completed",
+        "req-1",
+        1,
+    )
+    assert generation["user"] == "user-1" and generation["timings"] == {"generation": 0.5}
+    assert (request["level"], request["status"], request["path"], request["user"]) == ("INFO", 200, "/ok", "user-1")
+    assert (failure["level"], failure["status"], failure["request_id"]) == (
+        "WARNING",
+        424,
+        failed.headers["X-Request-ID"],
+    )
+    assert "sampled" not in request and request["seconds"] >= 0
@@ -0,0 +1,116 @@
+"""Test 27: YAML Offload
+
+Test that the large YAML documents are parsed and dumped in the worker pool with the inline results
+"""
+
+import asyncio
+import subprocess
+import sys
+from typing import Any
+
+from yaml import safe_load
+
+from devops_final_backend.services.llm_generator import ComposeGenerator, GenerationContext
+from devops_final_backend.services.llm_generator.offload import estimated_size, yaml_offload
+from devops_final_backend.services.telemetry import metrics
+from devops_final_backend.settings import settings
+from devops_final_backend.yaml_worker import dump_all
+
+
+def test_01_yaml_offload(monkeypatch) -> None:
+    """Test that the large documents are processed in the pool with the same output as inline"""
+
+    context = GenerationContext(env_store={f"app{i}": {"KEY": f"value {i}", "PORT": 8000 + i} for i in range(20)})
+    parsed_data = {
+        "services": {f"app{i}": {"image": "nginx:1.27", "env_file": f".env.app{i}"} for i in range(20)},
+        "networks": {"demo_network": {"external": True}},
+    }
+
+    def generate(threshold: int, executor: str) -> tuple[list, Any]:
+        monkeypatch.setattr(settings, "yaml_offload_threshold", threshold)
+        monkeypatch.setattr(settings, "yaml_offload_executor", executor)
+
+        async def render_and_load() -> tuple[list, Any]:
+            files = await ComposeGenerator.build_result(parsed_data, context)
+            return files, await yaml_offload.load(files[-1].data)
+
+        try:
+            return asyncio.run(render_and_load())
+        finally:
+            yaml_offload.shutdown()
+
+    def counters() -> dict[str, float]:
+        return metrics.snapshot()["counters"]
+
+    before = counters()
+    inline = generate(0, "thread")
+    assert counters().get(metrics.key("yaml_offload_total", {"op": "dump_all", "mode": "inline"}), 0) == (
+        before.get(metrics.key("yaml_offload_total", {"op": "dump_all", "mode": "inline"}), 0) + 1
+    )
+
+    for executor in ("thread", "process"):
+        key = metrics.key("yaml_offload_total", {"op": "load", "mode": executor})
+        before = counters()
+        assert generate(1, executor) == inline
+        assert counters()[key] == before.get(key, 0) + 1
+
+    files, loaded = inline
+    assert [file.name for file in files] == [*[f".env.app{i}" for i in range(20)], "compose.yml"]
+    assert loaded == parsed_data and safe_load(files[0].data) == context.env_store["app0"]
+    assert any(key.startswith("yaml_offload_queue_seconds") for key in metrics.snapshot()["timings"])
+
+    # the process pool workers only import the minimal worker module, not the app
+    imported = subprocess.run(
+        [sys.executable, "-c", "import sys, devops_final_backend.yaml_worker; print('fastapi' in sys.modules)"],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    assert imported.stdout.strip() == "False"
+
+
+def test_02_dump_size_estimate(monkeypatch) -> None:
+    """Check that the estimated size of a realistic stack follows its YAML size, so that a stack just above
+    the threshold is offloaded, and that the estimate stops at the threshold
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    def service(index: int) -> dict[str, Any]:
+        return {
+            "image": "postgres:16-alpine",
+            "container_name": f"db{index}",
+            "env_file": f".env.db{index}",
+            "ports": [f"{5432 + index}:5432"],
+            "volumes": [f"db{index}_data:/var/lib/postgresql/data", "./init.sql:/docker-entrypoint-initdb.d/init.sql"],
+            "healthcheck": {"test": ["CMD-SHELL", "pg_isready -U app"], "interval": "10s", "retries": 5},
+            "depends_on": {f"cache{index}": {"condition": "service_healthy"}},
+            "networks": ["demo_network"],
+            "restart": "unless-stopped",
+        }
+
+    def stack(services: int) -> list[Any]:
+        return [
+            *[{"POSTGRES_DB": f"app{index}", "POSTGRES_USER": "app"} for index in range(services)],
+            {
+                "services": {f"db{index}": service(index) for index in range(services)},
+                "networks": {"demo_network": {"external": True}},
+                "volumes": {f"db{index}_data": None for index in range(services)},
+            },
+        ]
+
+    documents = stack(60)
+    size = sum(len(document) for document in dump_all(documents))
+    assert 0.9 * size <= estimated_size(documents, size * 2) <= 1.1 * size
+
+    monkeypatch.setattr(settings, "yaml_offload_threshold", int(size * 0.95))
+    key = metrics.key("yaml_offload_total", {"op": "dump_all", "mode": "thread"})
+    before = metrics.snapshot()["counters"].get(key, 0)
+    try:
+        assert asyncio.run(yaml_offload.dump_all(documents)) == dump_all(documents)
+    finally:
+        yaml_offload.shutdown()
+
+    assert metrics.snapshot()["counters"][key] == before + 1
+    assert 1000 <= estimated_size(stack(600), 1000) < 2000
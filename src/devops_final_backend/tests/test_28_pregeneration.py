@@ -0,0 +1,150 @@
+"""Test 28: Stack Pre-Generation
+
+Test that the most requested stacks are pre-generated and served from storage with new secrets,
+and that the stored results are invalidated by the settings changing the output
+"""
+
+import asyncio
+from unittest.mock import MagicMock
+
+from yaml import safe_dump, safe_load
+
+from devops_final_backend.services.llm_generator import ComposeGenerator, compose_generator
+from devops_final_backend.services.pregeneration import canonical_params, pregenerator
+from devops_final_backend.services.telemetry import metrics
+from devops_final_backend.settings import settings
+
+
+def test_01_popular_stack_pregeneration(tmp_path, monkeypatch) -> None:
+    """Check that the popular stacks are pre-generated within the budget, served from storage in any service order,
+    invalidated by a prompt change, and that a live generation makes a running pre-generation yield
+
+    Args:
+        tmp_path (Path): the storage directory
+        monkeypatch (Any): instance
+    """
+
+    delay = {"seconds": 0.0}
+
+    def get_chain(*_args):
+        async def ainvoke(_params):
+            await asyncio.sleep(delay["seconds"])
+            content = safe_dump({"services": {"redis": {"image": "redis:7"}}, "networks": {"net": None}})
+            return MagicMock(text=lambda: content, usage_metadata={"input_tokens": 10, "output_tokens": 5})
+
+        return MagicMock(ainvoke=ainvoke)
+
+    monkeypatch.setattr(compose_generator, "get_chain", get_chain)
+    monkeypatch.setattr(compose_generator, "dry_run", False)
+    monkeypatch.setattr(pregenerator, "_store", None)
+    for name, value in {"path": str(tmp_path / "pregen.sqlite3"), "top_n": 1, "min_requests": 1.5}.items():
+        monkeypatch.setattr(settings, f"pregen_{name}", value)
+    monkeypatch.setattr(settings, "pregen_idle_seconds", 0)
+
+    stack = {"services": ["redis:7", "nginx"], "network_name": "net", "network_exists": False, "volume_mount": False}
+    other = {**stack, "services": ["mongo"]}
+    for params in (stack, other, {**stack, "services": ["nginx", "redis:7", "nginx"]}):
+        assert pregenerator.serve(params) is None
+
+    monkeypatch.setattr(settings, "pregen_token_budget", 0)
+    assert asyncio.run(pregenerator.cycle()) == 0
+
+    monkeypatch.setattr(settings, "pregen_token_budget", 100)
+    assert asyncio.run(pregenerator.cycle()) == 1 and asyncio.run(pregenerator.cycle()) == 0
+    files = pregenerator.serve({**stack, "services": ["nginx", "redis:7"]})
+    assert files and safe_load(files[-1].data)["services"] == {"redis": {"image": "redis:7"}}
+    assert pregenerator.serve(other) is None
+    assert asyncio.run(pregenerator.budget_left()) == 85
+
+    monkeypatch.setattr(ComposeGenerator, "SYSTEM_PROMPT", ComposeGenerator.SYSTEM_PROMPT + " ")
+    assert pregenerator.serve(stack) is None
+
+    async def live_request_during_pregeneration() -> bool:
+        delay["seconds"] = 1
+        key, params = (await pregenerator.candidates())[0]
+        task = asyncio.create_task(pregenerator.pregenerate(key, params))
+        await asyncio.sleep(0.05)
+        with pregenerator.live():
+            assert not pregenerator.idle()
+        return await task
+
+    counters = metrics.snapshot()["counters"]
+    yielded = metrics.key("pregen_generations_total", {"outcome": "yielded"})
+    before = counters.get(yielded, 0)
+    assert not asyncio.run(live_request_during_pregeneration())
+    assert metrics.snapshot()["counters"][yielded] == before + 1
+    assert pregenerator.serve(stack) is None
+
+
+def test_02_pregeneration_fingerprint(monkeypatch) -> None:
+    """Check that the settings changing the generated output invalidate the pre-generated stacks
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    fingerprint = pregenerator.fingerprint()
+    assert pregenerator.fingerprint() == fingerprint
+
+    for name, value in [("llm_structured_output", True), ("llm_fan_out_min_services", 2), ("image_catalog", False)]:
+        with monkeypatch.context() as changed:
+            changed.setattr(settings, name, value)
+            assert pregenerator.fingerprint() != fingerprint
+
+    monkeypatch.setattr(settings, "llm_model_tiers", ["small", "big"])
+    assert pregenerator.fingerprint() != fingerprint
+
+
+def test_03_pregenerated_secrets(tmp_path, monkeypatch) -> None:
+    """Check that each serve of a stored stack replaces its secrets by new random values, consistently across
+    its files, keeping the values also held by variables that are not secrets
+
+    Args:
+        tmp_path (Path): the storage directory
+        monkeypatch (Any): instance
+    """
+
+    stack = {
+        "services": {
+            "db": {"image": "postgres:16", "environment": {"POSTGRES_USER": "app", "POSTGRES_PASSWORD": "s3cret-pw"}},
+            "cache": {
+                "image": "redis:7",
+                "command": ["redis-server", "--requirepass", "s3cret-pw"],
+                "environment": ["REDIS_PASSWORD=s3cret-pw", "ADMIN_PASSWORD=app"],
+            },
+            "web": {"image": "nginx", "environment": {"DATABASE_URL": "postgres://app:s3cret-pw@db/app"}},
+        },
+        "networks": {"net": None},
+    }
+
+    def get_chain(*_args):
+        async def ainvoke(_params):
+            content = safe_dump(stack)
+            return MagicMock(text=lambda: content, usage_metadata={"input_tokens": 10, "output_tokens": 5})
+
+        return MagicMock(ainvoke=ainvoke)
+
+    monkeypatch.setattr(compose_generator, "get_chain", get_chain)
+    monkeypatch.setattr(compose_generator, "dry_run", False)
+    monkeypatch.setattr(pregenerator, "_store", None)
+    monkeypatch.setattr(settings, "pregen_path", str(tmp_path / "pregen.sqlite3"))
+
+    params = canonical_params(
+        {"services": ["postgres:16", "redis:7"], "network_name": "net", "network_exists": False, "volume_mount": False}
+    )
+    assert asyncio.run(pregenerator.pregenerate(pregenerator.key(params), params))
+
+    served = []
+    for _ in range(2):
+        stored = pregenerator.serve(params)
+        assert stored
+        files = {file.name: safe_load(file.data) for file in stored}
+        secret = files[".env.db"]["POSTGRES_PASSWORD"]
+        assert secret != "s3cret-pw" and len(secret) >= 16
+        assert files[".env.cache"] == {"REDIS_PASSWORD": secret, "ADMIN_PASSWORD": "app"}
+        assert files[".env.web"] == {"DATABASE_URL": f"postgres://app:{secret}@db/app"}
+        assert files["compose.yml"]["services"]["cache"]["command"] == ["redis-server", "--requirepass", secret]
+        assert files[".env.db"]["POSTGRES_USER"] == "app"
+        served.append(secret)
+
+    assert served[0] != served[1]
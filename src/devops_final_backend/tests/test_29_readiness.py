@@ -0,0 +1,94 @@
+"""Test 29: Readiness
+
+Test that the workers report themselves as ready only once the model warm-up succeeded,
+retrying the failed warm-ups
+"""
+
+import asyncio
+import time
+from collections.abc import Callable
+from importlib import import_module
+
+from fastapi.testclient import TestClient
+
+from devops_final_backend.api import app
+from devops_final_backend.services.llm_generator import ComposeGenerator, errors
+from devops_final_backend.settings import settings
+
+
+def wait_for(condition: Callable[[], bool]) -> bool:
+    """Wait for a condition updated by the background tasks of the app
+
+    Args:
+        condition (Callable[[], bool]): the condition
+
+    Returns:
+        bool: the condition was met within 2 seconds
+    """
+
+    deadline = time.monotonic() + 2
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    return condition()
+
+
+def test_01_ready_after_warmup(monkeypatch) -> None:
+    """Check that /ready fails until the warm-up succeeds, a failed warm-up being retried, and succeeds afterwards
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    calls = []
+    warm = {"loaded": False}
+
+    async def warmup() -> None:
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise errors.ModelFailedToRespond()
+
+        while not warm["loaded"]:
+            await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(ComposeGenerator, "warmup", warmup)
+    # the package exports the lifespan function under the name of its module
+    monkeypatch.setattr(import_module("devops_final_backend.api.lifespan"), "WARMUP_RETRY_INTERVAL", 0.01)
+    monkeypatch.setattr(settings, "llm_dry_run", False)
+    monkeypatch.setattr(settings, "llm_warmup", True)
+    monkeypatch.setattr(settings, "llm_keep_alive_interval", 0)
+    monkeypatch.setattr(settings, "image_catalog", False)
+
+    with TestClient(app) as client:
+        assert client.get("/ready").status_code == 503
+        assert wait_for(lambda: len(calls) == 2)
+        assert client.get("/ready").status_code == 503
+
+        warm["loaded"] = True
+        assert wait_for(lambda: client.get("/ready").status_code == 200)
+        assert client.get("/ready").json() == "ready"
+
+    assert len(calls) == 2
+
+
+def test_02_ready_without_warmup(monkeypatch) -> None:
+    """Check that with the warm-up disabled the worker is ready right away, without calling the model
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    calls = []
+
+    async def warmup() -> None:
+        calls.append(time.monotonic())
+
+    monkeypatch.setattr(ComposeGenerator, "warmup", warmup)
+    monkeypatch.setattr(settings, "llm_dry_run", False)
+    monkeypatch.setattr(settings, "llm_warmup", False)
+    monkeypatch.setattr(settings, "image_catalog", False)
+
+    with TestClient(app) as client:
+        assert client.get("/ready").status_code == 200
+
+    assert not calls
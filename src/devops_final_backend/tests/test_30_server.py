@@ -0,0 +1,89 @@
+"""Test 30: Server Entry Point
+
+Test the uvicorn arguments built by the entry point in debug and production mode
+"""
+
+import os
+from importlib import import_module
+from typing import Any
+
+import devops_final_backend
+from devops_final_backend.settings import settings
+
+# the package exports the settings instance under the name of its module
+settings_module = import_module("devops_final_backend.settings")
+
+
+def serve(monkeypatch) -> dict[str, Any]:
+    """Run the entry point without starting the server
+
+    Args:
+        monkeypatch (Any): instance
+
+    Returns:
+        dict[str, Any]: the arguments of the uvicorn run
+    """
+
+    calls = []
+    monkeypatch.setattr(devops_final_backend, "run", lambda app, **kwargs: calls.append({"app": app, **kwargs}))
+    devops_final_backend.main()
+    assert len(calls) == 1
+
+    return calls[0]
+
+
+def test_01_debug_server(monkeypatch) -> None:
+    """Check that debug mode starts a single auto-reloading process
+
+    Args:
+        monkeypatch (Any): instance
+    """
+
+    monkeypatch.setattr(settings, "debug", True)
+    monkeypatch.setattr(settings, "app_port", 8080)
+
+    assert serve(monkeypatch) == {"app": "devops_final_backend:app", "host": "0.0.0.0", "port": 8080, "reload": True}
+
+
+def test_02_production_workers(tmp_path, monkeypatch) -> None:
+    """Check that the workers default to the CPUs available to the container, that the worker recycling limit
+    is passed to several workers and ignored with a single one
+
+    Args:
+        tmp_path (Path): temporary folder of the cgroup files
+        monkeypatch (Any): instance
+    """
+
+    cpu_max = tmp_path / "cpu.max"
+    monkeypatch.setattr(settings_module, "CGROUP_CPU_MAX", cpu_max)
+    monkeypatch.setattr(settings_module, "CGROUP_V1_CPU_QUOTA", (tmp_path / "quota", tmp_path / "period"))
+    monkeypatch.setattr(os, "process_cpu_count", lambda: 64)
+    monkeypatch.setattr(settings, "debug", False)
+    monkeypatch.setattr(settings, "app_workers", None)
+    monkeypatch.setattr(settings, "app_limit_max_requests", 10_000)
+    monkeypatch.setattr(settings, "app_backlog", 512)
+
+    # no cgroup limit: the CPUs of the process
+    config = serve(monkeypatch)
+    assert (config["workers"], config["limit_max_requests"], config["backlog"]) == (64, 10_000, 512)
+    assert config["loop"] in ("uvloop", "asyncio") and config["http"] in ("httptools", "h11")
+
+    # a container limited to 1 CPU on a 64 CPUs node runs a single worker, never recycled
+    cpu_max.write_text("100000 100000\n")
+    config = serve(monkeypatch)
+    assert (config["workers"], config["limit_max_requests"]) == (1, None)
+
+    cpu_max.write_text("150000 100000\n")
+    assert serve(monkeypatch)["workers"] == 2
+
+    cpu_max.write_text("max 100000\n")
+    assert serve(monkeypatch)["workers"] == 64
+
+    # cgroup v1 quota, and the configured workers taking precedence
+    cpu_max.unlink()
+    (tmp_path / "quota").write_text("400000\n")
+    (tmp_path / "period").write_text("100000\n")
+    assert serve(monkeypatch)["workers"] == 4
+
+    monkeypatch.setattr(settings, "app_workers", 1)
+    assert serve(monkeypatch)["limit_max_requests"] is None
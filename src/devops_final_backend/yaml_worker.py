@@ -0,0 +1,54 @@
+"""YAML Pool Worker
+
+The functions run by the YAML offload pool (see services/llm_generator/offload.py). The spawned processes of the pool
+import this module to unpickle the calls: it only depends on PyYAML (and the package only imports the settings), so
+that a pool process does not import the app, the generators and their LLM dependencies
+"""
+
+import time
+from collections.abc import Callable
+from typing import Any
+
+from yaml import safe_dump, safe_load
+
+
+def load(content: str) -> Any:
+    """Parse a YAML document
+
+    Args:
+        content (str): the YAML string
+
+    Returns:
+        Any: the parsed document
+    """
+
+    return safe_load(content)
+
+
+def dump_all(documents: list[Any]) -> list[str]:
+    """Dump YAML documents, keeping the key order
+
+    Args:
+        documents (list[Any]): the documents
+
+    Returns:
+        list[str]: the YAML strings
+    """
+
+    return [safe_dump(document, sort_keys=False) for document in documents]
+
+
+def timed_call(func: Callable[..., Any], queued: float, *args: Any) -> tuple[float, Any]:
+    """Run a function in a pool worker, measuring how long it waited for the worker
+    (the wall clock is used as the monotonic clock is not comparable across processes on all platforms)
+
+    Args:
+        func (Callable[..., Any]): the function
+        queued (float): the wall clock time at which the call was submitted
+        *args (Any): the function arguments
+
+    Returns:
+        tuple[float, Any]: the queue time in seconds and the function result
+    """
+
+    return max(time.time() - queued, 0), func(*args)